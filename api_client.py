@@ -0,0 +1,155 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+# Statuses worth retrying; Retry-After is honored for 429 and 503
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# A POST is only re-sent for these, and only when the server says when to retry
+POST_RETRY_STATUSES = (429, 503)
+
+# Seconds the current thread's request spent opening connections (TCP, plus TLS for https)
+connect_times = threading.local()
+
+
+def add_connect_time(started):
+    connect_times.total = getattr(connect_times, 'total', 0.0) + time.perf_counter() - started
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            add_connect_time(started)
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            add_connect_time(started)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedAdapter(HTTPAdapter):
+    # Connections record how long they took to open; a reused keep-alive connection costs nothing
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+
+class ApiRetry(Retry):
+    # Completion POSTs are not idempotent: a 500/502/504 may arrive after the model ran, and
+    # sending the request again would run and bill the generation twice
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method and method.upper() == "POST" and not (status_code in POST_RETRY_STATUSES and has_retry_after):
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class ApiClient:
+    # Pooled HTTP client for the OpenAI-compatible API. One keep-alive session is shared
+    # by all requests, so repeated calls reuse connections instead of new TCP/TLS handshakes.
+    def __init__(self, models_endpoint, completions_endpoint, api_key="", connect_timeout=10,
+                 read_timeout=600, max_retries=3, backoff_factor=0.5, pool_size=10, on_metrics=None,
+                 chat_endpoint=None):
+        self.models_endpoint = models_endpoint
+        self.completions_endpoint = completions_endpoint
+        self.chat_endpoint = chat_endpoint
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.on_metrics = on_metrics
+
+        retry = ApiRetry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,  # A read failure may mean the model already ran; never repeat it
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = TimedAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def auth_headers(self, api_key=None):
+        api_key = self.api_key if api_key is None else api_key
+        if api_key:
+            return {"Authorization": f"Bearer {api_key}"}
+        return {}
+
+    @contextmanager
+    def request(self, method, url, api_key=None, **kwargs):
+        headers = self.auth_headers(api_key)
+        headers.update(kwargs.pop("headers", None) or {})
+        kwargs.setdefault("timeout", self.timeout)
+        started = time.perf_counter()
+        connect_times.total = 0.0
+        response = self.session.request(method, url, headers=headers, **kwargs)
+        response.connect_time = connect_times.total
+        try:
+            yield response
+        finally:
+            response.close()
+            self.report(method, url, response, time.perf_counter() - started)
+
+    def report(self, method, url, response, elapsed):
+        if self.on_metrics is None:
+            return
+        raw = response.raw
+        retries = getattr(raw, "retries", None)
+        self.on_metrics({
+            "method": method,
+            "url": url,
+            "status": response.status_code,
+            "elapsed": elapsed,
+            "connect": response.connect_time,
+            "first_byte": response.elapsed.total_seconds(),
+            "bytes": raw.tell() if raw is not None else len(response.content),
+            "retries": len(retries.history) if retries is not None else 0,
+        })
+
+    def get_models(self, endpoint=None, api_key=None):
+        with self.request("GET", endpoint or self.models_endpoint, api_key=api_key) as response:
+            response.raise_for_status()
+            return [model['id'] for model in response.json().get('data', [])]
+
+    def post_completion(self, payload):
+        # Streams the body so callers can read it incrementally or abort it
+        return self.request("POST", self.completions_endpoint, json=payload, stream=True)
+
+    def post_chat_completion(self, payload):
+        return self.request("POST", self.chat_endpoint, json=payload, stream=True)
+
+    def close(self):
+        self.session.close()
+
+
+def format_metrics(metrics):
+    path = urlsplit(metrics["url"]).path or metrics["url"]
+    return (
+        f"{metrics['method']} {path} {metrics['status']} in {metrics['elapsed']:.2f}s "
+        f"(connect {metrics['connect']:.2f}s, first byte {metrics['first_byte']:.2f}s, {metrics['bytes'] / 1024:.1f} KB, "
+        f"{metrics['retries']} retries)"
+    )
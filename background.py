@@ -0,0 +1,43 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+# Tasks are kept alive here until their results have been delivered on the GUI thread
+active_tasks = set()
+
+
+class TaskSignals(QObject):
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    done = pyqtSignal()
+
+
+class BackgroundTask(QRunnable):
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = TaskSignals()
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.done.emit()
+
+
+def run_in_background(fn, *args, on_result=None, on_error=None, pool=None, **kwargs):
+    # Runs fn(*args, **kwargs) on a worker thread and calls on_result / on_error on the GUI thread
+    task = BackgroundTask(fn, *args, **kwargs)
+    if on_result is not None:
+        task.signals.result.connect(on_result)
+    if on_error is not None:
+        task.signals.error.connect(on_error)
+    task.signals.done.connect(lambda: active_tasks.discard(task))
+    active_tasks.add(task)
+    (pool or QThreadPool.globalInstance()).start(task)
+    return task
@@ -0,0 +1,231 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api_client import ApiClient
+from context_packer import ContextPacker
+from file_ops import recover_journal
+from generation import DEFAULT_MAIN_PROMPT, apply_response, build_payload, build_prompt, request_completion
+
+CONFIG_FILE = "config.json"
+
+# Runs tasks from a JSONL file without the GUI, e.g.
+#   python batch_runner.py requests.jsonl --workspace ws1 --workspace ws2 --concurrency 4 --output results.jsonl
+# Each line is a JSON object with the task under 'prompt', or 'title' and 'body' (as in
+# requests.jsonl). Optional keys: 'request_id', 'workspace' and 'model'. Tasks without a
+# workspace are spread over the --workspace directories in turn. One JSON result per task is
+# written as soon as the task finishes, so the output is in completion order.
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Workspace:
+    # Workers share a workspace. Context is packed and replies are applied under its lock, so
+    # file operations of concurrent tasks never interleave; the completion calls run in parallel.
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.lock = threading.Lock()
+        self.packer = ContextPacker()
+        os.makedirs(self.path, exist_ok=True)
+        recover_journal(self.path)
+
+
+class BatchRunner:
+    def __init__(self, client, workspaces, model, max_tokens=1500, main_prompt=DEFAULT_MAIN_PROMPT,
+                 stream=False, context_budget=4000, include_context=True, apply=True, output=None,
+                 keep_replies=False):
+        self.client = client
+        self.workspaces = {workspace.path: workspace for workspace in workspaces}
+        self.next_workspace = itertools.cycle(workspaces)
+        self.model = model
+        self.max_tokens = max_tokens
+        self.main_prompt = main_prompt
+        self.stream = stream
+        self.context_budget = context_budget
+        self.include_context = include_context
+        self.apply = apply
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.keep_replies = keep_replies  # Include applied replies in the results too
+
+    @staticmethod
+    def task_text(task):
+        if task.get('prompt'):
+            return task['prompt']
+        return "\n\n".join(part for part in (task.get('title'), task.get('body')) if part)
+
+    def workspace_for(self, task):
+        path = task.get('workspace')
+        if not path:
+            return next(self.next_workspace)
+        path = os.path.abspath(path)
+        if path not in self.workspaces:
+            self.workspaces[path] = Workspace(path)
+        return self.workspaces[path]
+
+    def run_task(self, index, task, workspace, on_text=None, cancelled=None):
+        # on_text(text) receives streamed text; cancelled() turning true ends the task as "cancelled"
+        text = self.task_text(task)
+        model = task.get('model') or self.model
+        result = {'task': task.get('request_id', index), 'workspace': workspace.path, 'model': model}
+        timings = {}
+        started = time.perf_counter()
+        try:
+            if not text:
+                raise ValueError("task has no 'prompt', 'title' or 'body'")
+            context_text = ""
+            if self.include_context:
+                with workspace.lock:
+                    context_text = workspace.packer.pack(workspace.path, text, self.context_budget)
+            prompt = build_prompt(self.main_prompt, workspace.path, text, context_text=context_text)
+            timings['prompt'] = time.perf_counter() - started
+
+            request_started = time.perf_counter()
+            first_byte = []
+            reply = request_completion(
+                self.client, build_payload(model, prompt, self.max_tokens, self.stream),
+                on_text=on_text, cancelled=cancelled,
+                on_response=lambda response: first_byte.append(time.perf_counter())
+            )
+            if reply is None:
+                raise TaskCancelled()
+            reply = reply.strip()
+            timings['first_byte'] = first_byte[0] - request_started
+            timings['completion'] = time.perf_counter() - request_started
+            result['prompt_chars'] = len(prompt)
+            result['reply_chars'] = len(reply)
+
+            if self.apply:
+                apply_started = time.perf_counter()
+                with workspace.lock:
+                    created_dirs, changes = apply_response(workspace.path, reply)
+                timings['apply'] = time.perf_counter() - apply_started
+                result['directories'] = [os.path.relpath(path, workspace.path) for path in created_dirs]
+                result['files'] = [{'path': change.path, 'action': change.action} for change in changes]
+            if self.keep_replies or not self.apply:
+                result['reply'] = reply
+            result['status'] = "ok"
+        except TaskCancelled:
+            result['status'] = "cancelled"
+        except Exception as e:
+            result['status'] = "error"
+            result['error'] = str(e)
+        timings['total'] = time.perf_counter() - started
+        result['timings'] = {name: round(seconds, 4) for name, seconds in timings.items()}
+        self.write_result(result)
+        return result
+
+    def write_result(self, result):
+        if self.output is None:
+            return
+        with self.output_lock:
+            self.output.write(json.dumps(result) + "\n")
+            self.output.flush()
+
+    def run(self, tasks, concurrency=1):
+        # Workspaces are assigned up front, so the spread does not depend on completion order
+        assigned = [(index, task, self.workspace_for(task)) for index, task in enumerate(tasks)]
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            return list(pool.map(lambda item: self.run_task(*item), assigned))
+
+
+def read_tasks(path):
+    tasks = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                tasks.append(json.loads(line))
+            except ValueError as e:
+                raise SystemExit(f"{path}:{line_number}: invalid JSON: {e}")
+    return tasks
+
+
+def load_config(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run generation tasks from a JSONL file without the GUI.")
+    parser.add_argument("tasks", help="JSONL file with one task per line")
+    parser.add_argument("--workspace", action="append", default=[],
+                        help="workspace directory; repeat to spread tasks over several workspaces")
+    parser.add_argument("--concurrency", type=int, default=4, help="tasks running at the same time (default 4)")
+    parser.add_argument("--output", default="-", help="JSONL file for per-task results (default stdout)")
+    parser.add_argument("--config", default=CONFIG_FILE, help="configuration file (default config.json)")
+    parser.add_argument("--endpoint", help="completions endpoint (default from the configuration)")
+    parser.add_argument("--model", help="model (default selected_model from the configuration)")
+    parser.add_argument("--max-tokens", type=int, help="max_tokens per request")
+    parser.add_argument("--main-prompt", default=DEFAULT_MAIN_PROMPT, help="main prompt placed before each task")
+    parser.add_argument("--stream", action="store_true", help="request streamed responses")
+    parser.add_argument("--no-context", action="store_true", help="leave workspace context out of the prompt")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="do not apply replies; include them in the results instead")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    models_endpoint = config.get('api_endpoint_models', "https://api.openai.com/v1/models")
+    endpoint = args.endpoint or models_endpoint.replace("/v1/models", "/v1/completions")
+    model = args.model or config.get('selected_model', "")
+    if not model:
+        parser.error("no model given and none selected in the configuration")
+    tasks = read_tasks(args.tasks)
+    if not args.workspace and any(not task.get('workspace') for task in tasks):
+        parser.error("tasks without a 'workspace' need at least one --workspace")
+
+    client = ApiClient(
+        models_endpoint,
+        endpoint,
+        api_key=config.get('api_key', ""),
+        connect_timeout=config.get('connect_timeout', 10),
+        read_timeout=config.get('read_timeout', 600),
+        max_retries=config.get('max_retries', 3),
+        backoff_factor=config.get('retry_backoff', 0.5),
+        pool_size=max(10, args.concurrency)  # One kept-alive connection per worker
+    )
+    output = sys.stdout if args.output == "-" else open(args.output, 'w', encoding='utf-8')
+    runner = BatchRunner(
+        client,
+        [Workspace(path) for path in args.workspace],
+        model,
+        max_tokens=args.max_tokens or config.get('max_tokens', 1500),
+        main_prompt=args.main_prompt,
+        stream=args.stream,
+        context_budget=config.get('model_context_budgets', {}).get(model, config.get('context_token_budget', 4000)),
+        include_context=config.get('include_workspace_context', True) and not args.no_context,
+        apply=not args.dry_run,
+        output=output
+    )
+
+    started = time.perf_counter()
+    try:
+        results = runner.run(tasks, args.concurrency)
+    finally:
+        client.close()
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for result in results if result['status'] != "ok")
+    print(
+        f"{len(results)} tasks ({failed} failed) in {elapsed:.2f}s with {args.concurrency} workers, "
+        f"{len(results) / elapsed if elapsed else 0:.2f} tasks/s",
+        file=sys.stderr
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,373 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtCore import PYQT_VERSION_STR, QT_VERSION_STR
+from PyQt6.QtWidgets import QApplication, QMessageBox
+
+from benchmarks.mock_server import MockServer
+from generation import parse_response
+from prompt_library import PromptLibrary
+from workflow_store import WorkflowWriter, read_workflow
+
+RESULTS_VERSION = 1
+
+# Measures the paths a user waits on, against a local mock API, and prints the results as
+# JSON (one entry per benchmark and parameter set) for comparing runs:
+#   python benchmarks/app_benchmark.py --output before.json
+#   python benchmarks/app_benchmark.py --compare before.json
+# The window is never shown; it runs on the offscreen platform unless QT_QPA_PLATFORM is set.
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def summarize(seconds):
+    if not seconds:
+        return {}
+    return {
+        "mean_ms": sum(seconds) / len(seconds) * 1000,
+        "p50_ms": percentile(seconds, 0.5) * 1000,
+        "p95_ms": percentile(seconds, 0.95) * 1000,
+        "max_ms": max(seconds) * 1000,
+    }
+
+
+def pump(app, condition, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("benchmark step did not finish in time")
+        app.processEvents()
+        time.sleep(0.0005)
+
+
+def synthetic_reply(files, lines=40, directories=10):
+    # A reply in the response grammar: a few directories, then `files` "# File:" blocks
+    parts = [f"mkdir pkg{index}" for index in range(min(directories, files))]
+    for index in range(files):
+        parts.append(f"# File: pkg{index % directories}/module_{index}.py")
+        for line in range(lines):
+            parts.append(f"VALUE_{line} = {line} * {index}  # generated line {line} of module {index}")
+    return "\n".join(parts) + "\n"
+
+
+def prompt_nodes(count, fanout):
+    # `count` prompts grouped into nested folders of `fanout` entries each
+    nodes = [{'text': f"Prompt {index}: write a function that handles case {index}"} for index in range(count)]
+    level = 0
+    while len(nodes) > fanout:
+        level += 1
+        nodes = [
+            {'text': f"Folder {level}.{start // fanout}", 'children': nodes[start:start + fanout]}
+            for start in range(0, len(nodes), fanout)
+        ]
+    return nodes
+
+
+def make_window(directory, server, stream, api_mode="completions"):
+    import main
+    with open(os.path.join(directory, main.CONFIG_FILE), 'w') as f:
+        json.dump({
+            'api_endpoint_models': f"{server.url}/v1/models",
+            'selected_model': server.models[0],
+            'stream_responses': stream,
+            'api_mode': api_mode,
+            'use_response_cache': False,
+            'preview_changes': False,
+            'include_workspace_context': True,
+            'workflow_autosave_interval': 0,
+            'max_retries': 0,
+        }, f)
+    window = main.MainWindow()
+    open_workspace(window, os.path.join(directory, "workspace"))
+    return window
+
+
+def open_workspace(window, path):
+    os.makedirs(path, exist_ok=True)
+    window.workspace_path = path
+    window.set_tree_root(path)
+    window.prepare_workspace()
+
+
+def bench_send_command(app, directory, server, requests, stream, api_mode="completions"):
+    # From send_command() until the reply is applied (or the request failed). Every run uses a
+    # new workspace, so the chat history starts empty and the prefix cache has nothing of it yet.
+    window = make_window(directory, server, stream, api_mode)
+    open_workspace(window, os.path.join(directory, f"send-{api_mode}-{int(stream)}"))
+    cached_tokens, prefill_tokens = server.cached_tokens, server.prefill_tokens
+    done = {}
+    first_chunk = {}
+    window.completion_engine.chunk.connect(lambda job_id, text: first_chunk.setdefault(job_id, time.perf_counter()))
+    # Connected after the window's own slots, so these run once the reply has been applied
+    window.completion_engine.finished.connect(lambda job_id, reply: done.setdefault(job_id, (time.perf_counter(), True)))
+    window.completion_engine.failed.connect(lambda job_id, error: done.setdefault(job_id, (time.perf_counter(), False)))
+    latencies = []
+    first_chunks = []
+    failed = 0
+    try:
+        for index in range(requests):
+            window.text_input_window.setPlainText(f"Write generated module number {index}")
+            started = time.perf_counter()
+            count = len(done)
+            window.send_command()
+            pump(app, lambda: len(done) > count)
+            job_id = max(done, key=lambda key: done[key][0])
+            finished, ok = done[job_id]
+            if not ok:
+                failed += 1
+                continue
+            latencies.append(finished - started)
+            if job_id in first_chunk:
+                first_chunks.append(first_chunk[job_id] - started)
+            window.code_tabs.clear_pages()
+    finally:
+        window.close()
+    metrics = dict(summarize(latencies), requests=requests, failed=failed,
+                   cached_prompt_tokens=server.cached_tokens - cached_tokens,
+                   prefilled_prompt_tokens=server.prefill_tokens - prefill_tokens)
+    if first_chunks:
+        metrics["first_chunk_p50_ms"] = percentile(first_chunks, 0.5) * 1000
+    if len(first_chunks) > 1:
+        metrics["follow_up_first_chunk_p50_ms"] = percentile(first_chunks[1:], 0.5) * 1000
+    return {
+        "benchmark": "send_command",
+        "params": {
+            "stream": stream,
+            "api_mode": api_mode,
+            "latency_ms": server.latency * 1000,
+            "tokens_per_second": server.tokens_per_second,
+            "prefill_tokens_per_second": server.prefill_tokens_per_second,
+            "error_rate": server.error_rate,
+            "reply_chars": len(server.reply("")),
+        },
+        "metrics": metrics,
+    }
+
+
+def bench_process_ai_response(app, directory, server, files, repeat):
+    # Parsing a whole reply, then applying it: the steps of process_ai_response with the preview off
+    text = synthetic_reply(files)
+    window = make_window(directory, server, False)
+    parse_seconds = []
+    apply_seconds = []
+    try:
+        for run in range(repeat):
+            open_workspace(window, os.path.join(directory, f"apply-{files}-{run}"))
+            started = time.perf_counter()
+            plan = parse_response(text)
+            parsed = time.perf_counter()
+            window.apply_operation_plan(plan)
+            applied = time.perf_counter()
+            parse_seconds.append(parsed - started)
+            apply_seconds.append(applied - parsed)
+            window.code_tabs.clear_pages()
+            app.processEvents()
+    finally:
+        window.close()
+    best = min(parse + apply for parse, apply in zip(parse_seconds, apply_seconds))
+    return {
+        "benchmark": "process_ai_response",
+        "params": {"files": files, "bytes": len(text.encode('utf-8'))},
+        "metrics": {
+            "parse_ms": min(parse_seconds) * 1000,
+            "apply_ms": min(apply_seconds) * 1000,
+            "total_ms": best * 1000,
+            "files_per_second": files / best,
+        },
+    }
+
+
+def bench_workflow(app, directory, server, tabs, repeat):
+    # save_workflow_as and load_workflow without their file dialogs: gathering and writing the
+    # sections, then reading the file and applying it to the window
+    window = make_window(directory, server, False)
+    workspace = window.workspace_path
+    paths = []
+    for index in range(tabs):
+        path = os.path.join(workspace, f"tab_{index}.py")
+        with open(path, 'w') as f:
+            f.write("".join(f"VALUE_{line} = {line} * {index}\n" for line in range(200)))
+        paths.append(path)
+    window.set_open_tabs([{'path': path, 'title': os.path.basename(path)} for path in paths])
+    workflow_path = os.path.join(directory, f"workflow-{tabs}.json")
+    information = QMessageBox.information
+    QMessageBox.information = lambda *args: QMessageBox.StandardButton.Ok  # apply_workflow reports success
+    save_seconds = []
+    load_seconds = []
+    try:
+        for run in range(repeat):
+            if os.path.exists(workflow_path):
+                os.remove(workflow_path)
+            started = time.perf_counter()
+            WorkflowWriter(workflow_path).write(window.workflow_sections())
+            save_seconds.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            window.apply_workflow(read_workflow(workflow_path))
+            load_seconds.append(time.perf_counter() - started)
+            app.processEvents()
+    finally:
+        QMessageBox.information = information
+        window.close()
+    return {
+        "benchmark": "workflow",
+        "params": {"tabs": tabs},
+        "metrics": {
+            "save_ms": min(save_seconds) * 1000,
+            "load_ms": min(load_seconds) * 1000,
+            "bytes": os.path.getsize(workflow_path),
+        },
+    }
+
+
+def bench_prompt_tree(app, directory, prompts, fanout):
+    import main
+    data = prompt_nodes(prompts, fanout)
+    library = PromptLibrary(os.path.join(directory, f"prompts-{prompts}.sqlite3"))
+    tree = main.PromptTree(library)
+    try:
+        started = time.perf_counter()
+        tree.load_from_json(data)
+        first = time.perf_counter() - started
+        # Loading the same workflow again only merges, adding nothing
+        started = time.perf_counter()
+        tree.load_from_json(data)
+        again = time.perf_counter() - started
+        started = time.perf_counter()
+        tree.save_to_json()
+        export = time.perf_counter() - started
+        started = time.perf_counter()
+        tree.filter("case 123")
+        search = time.perf_counter() - started
+    finally:
+        tree.deleteLater()
+        library.close()
+    return {
+        "benchmark": "prompt_tree",
+        "params": {"prompts": prompts, "fanout": fanout},
+        "metrics": {
+            "load_ms": first * 1000,
+            "reload_ms": again * 1000,
+            "export_ms": export * 1000,
+            "search_ms": search * 1000,
+        },
+    }
+
+
+def run(args):
+    app = QApplication.instance() or QApplication(sys.argv)
+    server = MockServer(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                        error_rate=args.error_rate, error_status=args.error_status, seed=0,
+                        reply=lambda prompt: synthetic_reply(args.reply_files),
+                        prefill_tokens_per_second=args.prefill_tokens_per_second).start()
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # The window keeps its configuration, caches and prompt library in the working directory
+        os.chdir(directory)
+        try:
+            for api_mode in ("completions", "chat"):
+                for stream in (False, True):
+                    results.append(bench_send_command(app, directory, server, args.requests, stream, api_mode))
+            for files in args.files:
+                results.append(bench_process_ai_response(app, directory, server, files, args.repeat))
+            for tabs in args.tabs:
+                results.append(bench_workflow(app, directory, server, tabs, args.repeat))
+            for prompts in args.prompts:
+                results.append(bench_prompt_tree(app, directory, prompts, args.fanout))
+        finally:
+            os.chdir(cwd)
+            server.stop()
+    return {
+        "version": RESULTS_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "qt": QT_VERSION_STR,
+            "pyqt": PYQT_VERSION_STR,
+        },
+        "results": results,
+    }
+
+
+def result_key(result):
+    return result["benchmark"], json.dumps(result["params"], sort_keys=True)
+
+
+def compare(report, baseline, threshold):
+    # Timing metrics (*_ms) that changed by more than threshold, as lines of text
+    previous = {result_key(result): result["metrics"] for result in baseline["results"]}
+    lines = []
+    for result in report["results"]:
+        before = previous.get(result_key(result))
+        if before is None:
+            continue
+        for name, value in result["metrics"].items():
+            old = before.get(name)
+            if not name.endswith("_ms") or not old:
+                continue
+            change = (value - old) / old
+            if abs(change) >= threshold:
+                label = "slower" if change > 0 else "faster"
+                lines.append(f"{result['benchmark']} {result['params']} {name}: "
+                             f"{old:.1f} -> {value:.1f} ms ({change:+.0%}, {label})")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure request, apply, workflow and prompt tree performance.")
+    parser.add_argument("--output", default="-", help="JSON file for the results (default stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative change reported by --compare (default 0.1)")
+    parser.add_argument("--quick", action="store_true", help="small sizes, for a fast check")
+    parser.add_argument("--requests", type=int, help="requests per send_command run (default 20)")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock server delay before the first byte, in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=0,
+                        help="mock server token rate (default 0: the whole reply at once)")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=2000,
+                        help="mock server prompt processing rate, after its prefix cache (0 = no prefill time)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of completions the mock server fails")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--reply-files", type=int, default=3, help="files in each mock reply")
+    parser.add_argument("--files", type=int, action="append", help="files per synthetic reply (repeatable)")
+    parser.add_argument("--tabs", type=int, action="append", help="open tabs per workflow (repeatable)")
+    parser.add_argument("--prompts", type=int, action="append", help="prompts per tree (repeatable)")
+    parser.add_argument("--fanout", type=int, default=50, help="entries per prompt folder")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size; the fastest is reported")
+    args = parser.parse_args()
+    args.requests = args.requests or (5 if args.quick else 20)
+    args.files = args.files or ([10, 100] if args.quick else [10, 100, 1000])
+    args.tabs = args.tabs or ([10, 100] if args.quick else [10, 100, 1000])
+    args.prompts = args.prompts or ([1000] if args.quick else [1000, 10000, 50000])
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            lines = compare(report, json.load(f), args.threshold)
+        for line in lines or [f"No timing changed by {args.threshold:.0%} or more."]:
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
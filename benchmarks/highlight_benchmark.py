@@ -0,0 +1,118 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtGui import QTextCursor, QTextDocument
+from PyQt6.QtWidgets import QApplication
+
+from syntax import LANGUAGES, RULES, SyntaxHighlighter
+
+SAMPLES = {
+    "python": '''@decorator
+def handler(request, retries=3):
+    """Docstring that spans
+    two lines."""
+    value = request.get("key", 'default')  # trailing comment
+    for i in range(retries):
+        if value is None or i > 0x1F:
+            return 1.5e3
+''',
+    "javascript": '''/* Block comment
+   over two lines */
+function handler(request) {
+    const value = request.key || "default"; // comment
+    for (let i = 0; i < 10; i++) { console.log(`item ${i}`, 42); }
+    return value === null ? undefined : this.value;
+}
+''',
+    "html": '''<!-- comment
+     spanning lines -->
+<div class="row" id='main'>
+  <a href="https://example.com">Link &amp; text</a>
+</div>
+''',
+    "json": '''{
+  "name": "value",
+  "count": 42,
+  "enabled": true,
+  "items": [1.5, -2e3, null]
+},
+''',
+    "shell": '''#!/bin/sh
+# Comment
+for f in "$@"; do
+  if [ -f "${f}" ]; then echo 'found' $f 1; fi
+done
+''',
+}
+
+
+def build_text(language, lines):
+    sample = SAMPLES[language].splitlines()
+    return "\n".join(sample[i % len(sample)] for i in range(lines))
+
+
+def measure(app, language, lines):
+    text = build_text(language, lines)
+
+    # Tokenizing alone, without applying formats to a document
+    rules = LANGUAGES[language]
+    state = 0
+    started = time.perf_counter()
+    for line in text.split("\n"):
+        spans, state = rules.highlight(line, state)
+    tokenize = time.perf_counter() - started
+
+    # Highlighting a loaded document, as an editor sees it: a time slice per event loop tick
+    document = QTextDocument()
+    document.setPlainText(text)
+    started = time.perf_counter()
+    highlighter = SyntaxHighlighter(document, language)
+    ticks = 0
+    longest_tick = 0.0
+    while highlighter.is_pending():
+        tick_started = time.perf_counter()
+        app.processEvents()
+        longest_tick = max(longest_tick, time.perf_counter() - tick_started)
+        ticks += 1
+    document_seconds = time.perf_counter() - started
+
+    # A single-character edit in the middle only rehighlights the edited block
+    cursor = QTextCursor(document.findBlockByNumber(lines // 2))
+    started = time.perf_counter()
+    cursor.insertText("x")
+    edit = time.perf_counter() - started
+
+    return {
+        "language": language,
+        "lines": lines,
+        "tokenize_lines_per_second": lines / tokenize,
+        "document_lines_per_second": lines / document_seconds,
+        "ticks": ticks,
+        "longest_tick_ms": longest_tick * 1000,
+        "edit_ms": edit * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure syntax highlighting throughput.")
+    parser.add_argument("--lines", type=int, default=50000)
+    parser.add_argument("--language", choices=sorted(RULES), action="append")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    for language in args.language or sorted(RULES):
+        result = measure(app, language, args.lines)
+        print(
+            f"{result['language']:<11} {result['lines']} lines: "
+            f"tokenize {result['tokenize_lines_per_second']:,.0f} lines/s, "
+            f"document {result['document_lines_per_second']:,.0f} lines/s in {result['ticks']} ticks "
+            f"(longest {result['longest_tick_ms']:.1f} ms), edit {result['edit_ms']:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from werkzeug.serving import make_server
+
+from benchmarks.mock_server import MockServer, default_reply
+from flask_app import build_service, create_app
+from tracing import percentile
+
+# Load test of the job service in flask_app.py against the mock API. `--clients` users submit
+# `--jobs` jobs over `--workspaces` workspaces and poll each job until it finishes. A share
+# `--slow-share` of the tasks takes `--slow-seconds` longer to generate, which shows whether
+# slow generations hold up the others:
+#   python benchmarks/load_service.py --jobs 200 --clients 40 --workers 16
+FINISHED_STATUSES = ("ok", "error", "cancelled")
+
+
+def slow_reply(slow_seconds):
+    def reply(prompt):
+        if "slow task" in prompt:
+            time.sleep(slow_seconds)
+        return default_reply(prompt)
+    return reply
+
+
+def summarize(values):
+    if not values:
+        return {}
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 0.5) * 1000,
+        "p95_ms": percentile(values, 0.95) * 1000,
+        "max_ms": max(values) * 1000,
+    }
+
+
+def run_client(url, client, jobs, args, results):
+    # One user: submits its share of the jobs, then polls until each has finished
+    session = requests.Session()
+    headers = {"X-User": f"user{client}"}
+    submitted = []
+    for index in jobs:
+        slow = index % round(1 / args.slow_share) == 0 if args.slow_share else False
+        task = f"{'slow task' if slow else 'task'} {index}: write module number {index}"
+        started = time.perf_counter()
+        while True:
+            response = session.post(f"{url}/jobs", headers=headers, timeout=30,
+                                    json={"workspace": f"ws{index % args.workspaces}", "task": task})
+            if response.status_code != 429:
+                break
+            time.sleep(float(response.headers.get("Retry-After", 1)))
+        response.raise_for_status()
+        submitted.append((response.json()["id"], slow, started, time.perf_counter() - started))
+    for job_id, slow, started, submit_seconds in submitted:
+        while True:
+            job = session.get(f"{url}/jobs/{job_id}", timeout=30).json()
+            if job["status"] in FINISHED_STATUSES:
+                break
+            time.sleep(args.poll_interval)
+        results.append({
+            "slow": slow,
+            "status": job["status"],
+            "submit": submit_seconds,
+            "queue_wait": job["started"] - job["created"],
+            "total": time.perf_counter() - started,
+            "run": job["finished"] - job["started"],
+        })
+    session.close()
+
+
+def run(args):
+    mock = MockServer(latency=args.latency, tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+                      reply=slow_reply(args.slow_seconds), seed=0).start()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        config = {
+            'api_endpoint_models': f"{mock.url}/v1/models",
+            'selected_model': mock.models[0],
+            'stream_responses': args.stream,
+            'max_retries': 0,
+        }
+        service = build_service(config, args.workers, os.path.join(directory, "workspaces"),
+                                os.path.join(directory, "jobs.sqlite3"), args.max_queued).start()
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)  # No line per request
+        server = make_server("127.0.0.1", 0, create_app(service), threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = f"http://127.0.0.1:{server.server_port}"
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=args.clients) as pool:
+                futures = [
+                    pool.submit(run_client, url, client, range(client, args.jobs, args.clients), args, results)
+                    for client in range(args.clients)
+                ]
+                for future in futures:
+                    future.result()
+            elapsed = time.perf_counter() - started
+        finally:
+            server.shutdown()
+            service.stop()
+            service.runner.client.close()
+            service.store.close()
+            mock.stop()
+
+    fast = [result for result in results if not result["slow"]]
+    slow = [result for result in results if result["slow"]]
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "params": {
+            "jobs": args.jobs, "clients": args.clients, "workers": args.workers, "workspaces": args.workspaces,
+            "latency_ms": args.latency * 1000, "tokens_per_second": args.tokens_per_second, "stream": args.stream,
+            "slow_share": args.slow_share, "slow_seconds": args.slow_seconds, "error_rate": args.error_rate,
+        },
+        "metrics": {
+            "elapsed_s": elapsed,
+            "jobs_per_second": len(results) / elapsed if elapsed else 0,
+            "failed": sum(1 for result in results if result["status"] != "ok"),
+            "submit": summarize([result["submit"] for result in results]),
+            "queue_wait": summarize([result["queue_wait"] for result in results]),
+            "fast_jobs_total": summarize([result["total"] for result in fast]),
+            "slow_jobs_total": summarize([result["total"] for result in slow]),
+            "run": summarize([result["run"] for result in results]),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the job service against a mock API.")
+    parser.add_argument("--output", default="-", help="JSON file for the results (default stdout)")
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--clients", type=int, default=20, help="users submitting and polling at once")
+    parser.add_argument("--workers", type=int, default=16, help="service worker threads")
+    parser.add_argument("--workspaces", type=int, default=5)
+    parser.add_argument("--max-queued", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.2, help="mock server delay before the first byte, in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--stream", action="store_true", help="request streamed responses")
+    parser.add_argument("--slow-share", type=float, default=0.1, help="share of tasks that generate slowly")
+    parser.add_argument("--slow-seconds", type=float, default=3.0, help="extra generation time of a slow task")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of completions the mock server fails")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="seconds between status polls")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    return 1 if report["metrics"]["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
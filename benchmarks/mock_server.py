@@ -0,0 +1,219 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHARS_PER_TOKEN = 4
+PREFIX_CACHE_SIZE = 16  # Earlier prompts the simulated prefix cache keeps
+
+
+def default_reply(prompt):
+    return "mkdir src\n# File: src/generated.py\ndef generated():\n    return 42\n"
+
+
+def render_messages(messages):
+    # Flattens chat messages into one prompt, the way a chat template does before tokenizing
+    return "".join(f"<|{message.get('role')}|>\n{message.get('content') or ''}\n" for message in messages)
+
+
+def common_prefix(a, b):
+    length = min(len(a), len(b))
+    for index in range(length):
+        if a[index] != b[index]:
+            return index
+    return length
+
+
+class MockServer:
+    # Local stand-in for an OpenAI-compatible API: GET /v1/models, POST /v1/completions and
+    # POST /v1/chat/completions. Each completion waits `latency` seconds before the first byte,
+    # then produces the reply at `tokens_per_second` (0 means instantly), streamed as
+    # server-sent events when the request asks for it. A share `error_rate` of completions fails
+    # with `error_status`. With `prefill_tokens_per_second`, the prompt is also processed
+    # before the first byte, except for the longest prefix it shares with a recent prompt,
+    # like the prefix cache of llama.cpp or vLLM.
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, tokens_per_second=0, error_rate=0.0,
+                 error_status=500, models=("mock-model",), reply=default_reply, seed=None,
+                 prefill_tokens_per_second=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        self.prefix_cache = []
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.models = list(models)
+        self.reply = reply
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.cached_tokens = 0
+        self.prefill_tokens = 0
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def should_fail(self):
+        with self.lock:
+            self.requests += 1
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            return failed
+
+    def prefill(self, prompt):
+        # Seconds to process the part of the prompt not already in the prefix cache
+        with self.lock:
+            cached = max((common_prefix(prompt, earlier) for earlier in self.prefix_cache), default=0)
+            uncached = (len(prompt) - cached) // CHARS_PER_TOKEN
+            self.cached_tokens += cached // CHARS_PER_TOKEN
+            self.prefill_tokens += uncached
+        return uncached / self.prefill_tokens_per_second if self.prefill_tokens_per_second else 0
+
+    def remember(self, text):
+        # A server keeps the generated tokens cached too, so the prompt is stored with its reply
+        with self.lock:
+            self.prefix_cache.append(text)
+            del self.prefix_cache[:-PREFIX_CACHE_SIZE]
+
+    def make_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like a real API server
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, data, headers=None):
+                body = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/v1/models":
+                    self.send_json(404, {"error": {"message": "not found"}})
+                    return
+                data = {"object": "list", "data": [{"id": model, "object": "model"} for model in mock.models]}
+                etag = f'"{hash(tuple(mock.models)) & 0xffffffff:x}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_json(200, data, {"ETag": etag})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                path = self.path.rstrip("/")
+                if path not in ("/v1/completions", "/v1/chat/completions"):
+                    self.send_json(404, {"error": {"message": "not found"}})
+                    return
+                chat = path == "/v1/chat/completions"
+                time.sleep(mock.latency)
+                if mock.should_fail():
+                    headers = {"Retry-After": "0"} if mock.error_status in (429, 503) else {}
+                    self.send_json(mock.error_status, {"error": {"message": "injected error"}}, headers)
+                    return
+
+                prompt = render_messages(request.get("messages", [])) if chat else request.get("prompt", "")
+                if mock.prefill_tokens_per_second:
+                    time.sleep(mock.prefill(prompt))
+                reply = mock.reply(prompt)
+                if mock.prefill_tokens_per_second:
+                    mock.remember(prompt + (render_messages([{"role": "assistant", "content": reply}]) if chat else reply))
+                usage = {
+                    "prompt_tokens": len(prompt) // CHARS_PER_TOKEN,
+                    "completion_tokens": len(reply) // CHARS_PER_TOKEN,
+                }
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                if request.get("stream"):
+                    try:
+                        self.stream(request, reply, usage, chat)
+                    except (BrokenPipeError, ConnectionResetError):
+                        self.close_connection = True  # The client cancelled the request
+                    return
+                if mock.tokens_per_second:
+                    time.sleep(usage["completion_tokens"] / mock.tokens_per_second)
+                if chat:
+                    choice = {"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}
+                else:
+                    choice = {"index": 0, "text": reply, "finish_reason": "stop"}
+                self.send_json(200, {
+                    "object": "chat.completion" if chat else "text_completion",
+                    "model": request.get("model"),
+                    "choices": [choice],
+                    "usage": usage,
+                })
+
+            def stream(self, request, reply, usage, chat=False):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                # One event per token-sized piece, paced at the token rate
+                delay = 1 / mock.tokens_per_second if mock.tokens_per_second else 0
+                for start in range(0, len(reply), CHARS_PER_TOKEN):
+                    piece = reply[start:start + CHARS_PER_TOKEN]
+                    choice = {"index": 0, "delta": {"content": piece}} if chat else {"index": 0, "text": piece}
+                    event = {"model": request.get("model"), "choices": [choice]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                    if delay:
+                        time.sleep(delay)
+                choice = {"index": 0, "delta": {}} if chat else {"index": 0, "text": ""}
+                final = {"model": request.get("model"), "choices": [dict(choice, finish_reason="stop")], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock OpenAI-compatible API for manual testing.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first byte")
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=0,
+                        help="prompt processing rate; prefixes of recent prompts are free (0 = no prefill time)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--model", action="append", help="model id to list (repeatable)")
+    args = parser.parse_args()
+
+    server = MockServer(port=args.port, latency=args.latency, tokens_per_second=args.tokens_per_second,
+                        error_rate=args.error_rate, error_status=args.error_status,
+                        models=args.model or ["mock-model"], prefill_tokens_per_second=args.prefill_tokens_per_second)
+    print(f"Mock API on {server.url}/v1/models")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import itertools
+import threading
+import time
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from generation import request_completion
+
+
+class CompletionJob(QRunnable):
+    def __init__(self, engine, job_id, client, payload):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.engine = engine
+        self.job_id = job_id
+        self.client = client
+        self.payload = payload
+        self.cancel_event = threading.Event()
+        self.response = None
+        # perf_counter() timestamps of the request, reported through the engine's measured signal
+        self.timings = {'submitted': time.perf_counter()}
+        self.usage = None
+
+    def cancel(self):
+        self.cancel_event.set()
+        # Closing the response from this thread aborts a blocking read in the worker
+        response = self.response
+        if response is not None:
+            response.close()
+
+    def set_response(self, response):
+        self.response = response
+        self.timings['headers'] = time.perf_counter()
+        self.timings['connect'] = getattr(response, 'connect_time', 0.0)
+
+    def set_usage(self, usage):
+        self.usage = usage
+
+    def emit_chunk(self, text):
+        # Text read after a cancel would reach a receiver that already forgot the job
+        if self.cancel_event.is_set():
+            return
+        self.timings.setdefault('first_text', time.perf_counter())
+        self.engine.chunk.emit(self.job_id, text)
+
+    def emit_measured(self):
+        self.timings['finished'] = time.perf_counter()
+        self.engine.measured.emit(self.job_id, dict(self.timings, usage=self.usage))
+
+    def run(self):
+        # A cancelled job stays silent; the engine reports the cancellation itself
+        if self.cancel_event.is_set():
+            return
+
+        self.timings['started'] = time.perf_counter()
+        self.engine.started.emit(self.job_id)
+        try:
+            reply = request_completion(
+                self.client, self.payload, on_text=self.emit_chunk,
+                cancelled=self.cancel_event.is_set, on_response=self.set_response, on_usage=self.set_usage
+            )
+            if reply is not None and not self.cancel_event.is_set():
+                self.emit_measured()
+                self.engine.finished.emit(self.job_id, reply.strip())
+        except Exception as e:
+            if not self.cancel_event.is_set():
+                self.emit_measured()
+                self.engine.failed.emit(self.job_id, str(e))
+        finally:
+            self.response = None
+
+
+class CompletionEngine(QObject):
+    # Signals are emitted from worker threads and delivered on the GUI thread. measured carries
+    # the timings and token usage of a request, right before its finished or failed signal.
+    started = pyqtSignal(int)
+    chunk = pyqtSignal(int, str)
+    finished = pyqtSignal(int, str)
+    failed = pyqtSignal(int, str)
+    cancelled = pyqtSignal(int)
+    measured = pyqtSignal(int, object)
+
+    def __init__(self, parent=None, max_workers=1):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, max_workers))
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+
+        self.finished.connect(self.forget_job)
+        self.failed.connect(self.forget_job)
+        self.cancelled.connect(self.forget_job)
+
+    def set_max_workers(self, max_workers):
+        self.pool.setMaxThreadCount(max(1, max_workers))
+
+    def submit(self, client, payload):
+        job_id = next(self.job_ids)
+        job = CompletionJob(self, job_id, client, payload)
+        self.jobs[job_id] = job
+        self.pool.start(job)
+        return job_id
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return False
+        # A queued job is simply dropped; an in-flight one has its connection closed
+        if not self.pool.tryTake(job):
+            job.cancel()
+        self.jobs.pop(job_id, None)
+        self.cancelled.emit(job_id)
+        return True
+
+    def cancel_all(self):
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+
+    def pending_count(self):
+        return len(self.jobs)
+
+    def forget_job(self, job_id, *args):
+        self.jobs.pop(job_id, None)
+
+    def shutdown(self):
+        self.cancel_all()
+        # Cancelled requests still waiting for headers are not worth blocking exit on
+        self.pool.waitForDone(1000)
@@ -0,0 +1,160 @@
+import os
+import re
+
+from workspace_index import IGNORED_DIRS
+
+CHARS_PER_TOKEN = 4  # Rough average for code and English text
+MAX_READ_BYTES = 256 * 1024  # Larger files only contribute their beginning
+MAX_TREE_LINES = 400
+# Header of a file excerpt. Not "# File:", which the response parser reads as a write
+# instruction: a model echoing its context would overwrite files with (truncated) excerpts.
+CONTEXT_HEADER = "# Context file: "
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def file_section(label, text):
+    return f"{CONTEXT_HEADER}{label}\n{text}"
+
+
+class ContextPacker:
+    # Builds a compact workspace tree plus file excerpts that fit a token budget.
+    # File contents are cached by (mtime, size), so repeated packs only re-read changed files.
+    def __init__(self):
+        self.contents = {}
+
+    def read(self, path):
+        # Files are stat'ed again here, so a stale listing never yields stale content
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self.contents.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read(MAX_READ_BYTES)
+        except OSError:
+            return None
+        # Binary files are remembered as unreadable so they are not opened again
+        text = None if b"\0" in data[:8192] else data.decode('utf-8', errors='replace')
+        self.contents[path] = (signature, text)
+        return text
+
+    def scan(self, workspace_path):
+        # Returns (relative path, size, mtime_ns) for every file outside the ignored directories.
+        # Only used when no workspace index is available yet.
+        files = []
+        for root, dirs, names in os.walk(workspace_path):
+            dirs[:] = sorted(d for d in dirs if d not in IGNORED_DIRS)
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                rel_path = os.path.relpath(path, workspace_path).replace(os.sep, "/")
+                files.append((rel_path, stat.st_size, stat.st_mtime_ns))
+        return files
+
+    def render_tree(self, relative_paths):
+        lines = []
+        seen_dirs = set()
+        for rel_path in relative_paths:
+            parts = rel_path.split("/")
+            for depth in range(len(parts) - 1):
+                directory = tuple(parts[:depth + 1])
+                if directory not in seen_dirs:
+                    seen_dirs.add(directory)
+                    lines.append(f"{'  ' * depth}{parts[depth]}/")
+            lines.append(f"{'  ' * (len(parts) - 1)}{parts[-1]}")
+            if len(lines) >= MAX_TREE_LINES:
+                lines.append("...")
+                break
+        return "\n".join(lines)
+
+    def rank(self, files, task, referenced):
+        words = set(re.findall(r"[\w.-]+", task.lower()))
+
+        def score(item):
+            label, path, size, mtime_ns = item
+            name = os.path.basename(path).lower()
+            value = 0
+            if path in referenced:
+                value += 4
+            if name in words or label.lower() in words:
+                value += 2
+            if os.path.splitext(name)[0] in words:
+                value += 1
+            # Relevant first, then recently modified, then small
+            return (-value, -mtime_ns, size)
+
+        return sorted(files, key=score)
+
+    def pack(self, workspace_path, task, token_budget, referenced_files=(), workspace_files=None, seen=None):
+        # workspace_files: (relative path, size, mtime_ns) entries, e.g. from the workspace index.
+        # seen(label, text): optional check whether the file's text is already in the
+        # conversation; such files are only named, and their budget goes to other files.
+        if workspace_files is None:
+            workspace_files = self.scan(workspace_path) if workspace_path else []
+        sections = []
+        remaining = token_budget
+
+        if workspace_files:
+            tree = self.render_tree([entry[0] for entry in workspace_files])
+            # The tree gets at most a quarter of the budget, cut at a line boundary
+            tree_chars = (token_budget // 4) * CHARS_PER_TOKEN
+            if len(tree) > tree_chars:
+                tree = tree[:tree.rfind("\n", 0, tree_chars) + 1] + "..."
+            sections.append(f"Workspace tree:\n{tree}")
+            remaining -= estimate_tokens(sections[-1])
+
+        # Keyed on absolute path: a referenced file inside the workspace is one candidate,
+        # labelled with its workspace-relative path
+        candidates = {}
+        for rel_path, size, mtime_ns in workspace_files:
+            path = os.path.abspath(os.path.join(workspace_path, rel_path))
+            candidates[path] = (rel_path, path, size, mtime_ns)
+        referenced = [os.path.abspath(path) for path in referenced_files]
+        for path in referenced:
+            if path in candidates:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            candidates[path] = (os.path.basename(path), path, stat.st_size, stat.st_mtime_ns)
+
+        # Forget cached contents of files that no longer exist
+        for path in list(self.contents):
+            if path not in candidates:
+                del self.contents[path]
+
+        shown = []
+        for label, path, size, mtime_ns in self.rank(candidates.values(), task, set(referenced)):
+            if remaining <= 0:
+                break
+            text = self.read(path)
+            if not text:
+                continue
+            available = (remaining - estimate_tokens(file_section(label, ""))) * CHARS_PER_TOKEN
+            if available <= 0:
+                break
+            if len(text) > available:
+                text = text[:available] + "\n... (truncated)"
+            text = text.rstrip("\n")
+            if seen is not None and seen(label, text):
+                shown.append(label)
+                continue
+            section = file_section(label, text)
+            sections.append(section)
+            remaining -= estimate_tokens(section)
+
+        if shown:
+            sections.append("Unchanged files shown earlier in this conversation: " + ", ".join(shown))
+        return "\n\n".join(sections)
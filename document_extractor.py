@@ -0,0 +1,217 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+CHUNK_CHARS = 2000
+MAX_TEXT_BYTES = 8 * 1024 * 1024  # Plain text files are read up to this size
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def extract_pdf(path):
+    # pypdf is optional; without it PDFs are reported as unsupported
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ExtractionError("reading PDF files needs the pypdf package")
+    reader = PdfReader(path)
+    return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def extract_docx(path):
+    # The document body is word/document.xml: paragraphs (w:p) made of runs of text (w:t)
+    try:
+        with zipfile.ZipFile(path) as archive:
+            root = ElementTree.fromstring(archive.read("word/document.xml"))
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+        raise ExtractionError(f"not a valid DOCX file: {e}")
+    paragraphs = []
+    for paragraph in root.iter(f"{WORD_NAMESPACE}p"):
+        parts = []
+        for element in paragraph.iter():
+            if element.tag == f"{WORD_NAMESPACE}t":
+                parts.append(element.text or "")
+            elif element.tag == f"{WORD_NAMESPACE}tab":
+                parts.append("\t")
+            elif element.tag in (f"{WORD_NAMESPACE}br", f"{WORD_NAMESPACE}cr"):
+                parts.append("\n")
+        paragraphs.append("".join(parts))
+    return "\n".join(paragraphs)
+
+
+def extract_plain(path):
+    with open(path, 'rb') as f:
+        data = f.read(MAX_TEXT_BYTES)
+    if b"\0" in data[:8192]:
+        raise ExtractionError("binary file")
+    return data.decode('utf-8', errors='replace')
+
+
+EXTRACTORS = {".pdf": extract_pdf, ".docx": extract_docx}
+
+
+def split_units(text, chunk_chars):
+    # Paragraphs (separated by blank lines); a paragraph that is too long is split into lines,
+    # and a line that is too long into pieces of chunk_chars
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= chunk_chars:
+            if paragraph:
+                yield paragraph
+            continue
+        for line in paragraph.split("\n"):
+            line = line.strip()
+            for start in range(0, len(line), chunk_chars):
+                yield line[start:start + chunk_chars]
+
+
+def chunk_text(text, chunk_chars=CHUNK_CHARS):
+    # Consecutive units joined into chunks of at most chunk_chars
+    chunks = []
+    current = ""
+    for unit in split_units(text, chunk_chars):
+        if current and len(current) + len(unit) + 1 > chunk_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{unit}" if current else unit
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_document(path, cache_directory):
+    # Runs in a worker process. Returns (content hash, chunks, whether the cache had them)
+    content_hash = file_hash(path)
+    cache_path = os.path.join(cache_directory, f"{content_hash}.json")
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return content_hash, json.load(f)['chunks'], True
+    except (OSError, ValueError, KeyError):
+        pass
+    extractor = EXTRACTORS.get(os.path.splitext(path)[1].lower(), extract_plain)
+    chunks = chunk_text(extractor(path))
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'path': path, 'chunks': chunks}, f)
+    os.replace(temp_path, cache_path)
+    return content_hash, chunks, False
+
+
+def select_chunks(chunks, task, max_chars):
+    # The chunks sharing the most words with the task, kept in document order, within max_chars
+    words = {word for word in re.findall(r"\w+", task.lower()) if len(word) > 2}
+    scored = []
+    for index, chunk in enumerate(chunks):
+        chunk_words = set(re.findall(r"\w+", chunk.lower()))
+        scored.append((-len(words & chunk_words), index))
+    selected = []
+    used = 0
+    for _, index in sorted(scored):
+        size = len(chunks[index])
+        if used + size > max_chars:
+            if not selected and max_chars > 0:
+                # Even the best chunk is too big: use the part around its first matching word
+                chunk = chunks[index]
+                positions = [match.start() for match in re.finditer(r"\w+", chunk.lower()) if match.group() in words]
+                start = max(0, min(positions[0] - max_chars // 4, len(chunk) - max_chars)) if positions else 0
+                window = chunk[start:start + max_chars]
+                selected.append((index, window))
+                used += len(window)
+            continue
+        selected.append((index, chunks[index]))
+        used += size
+    return [text for index, text in sorted(selected)]
+
+
+class DocumentExtractor:
+    # Converts referenced files to text chunks in a process pool, so large PDFs are parsed on
+    # other cores without holding the GUI thread or the GIL. Results are cached on disk by
+    # content hash, and in memory by (size, mtime), so unchanged files are never parsed again.
+    def __init__(self, directory, max_workers=2):
+        self.directory = directory
+        self.max_workers = max(1, max_workers)
+        self.lock = threading.Lock()
+        self.documents = {}  # path -> ((size, mtime_ns), chunks)
+        self.pending = {}
+        self.pool = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def signature(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def chunks(self, path):
+        # Extracted chunks of the file as it is now, or None if they are not ready. A file
+        # whose extraction failed has no chunks.
+        with self.lock:
+            document = self.documents.get(path)
+        if document is None or document[0] != self.signature(path):
+            return None
+        return document[1]
+
+    def extract(self, path, on_done=None):
+        # Starts extraction in the background unless the file's chunks are current or already
+        # being extracted. on_done(path, chunks, from_cache, error) runs on a pool thread.
+        signature = self.signature(path)
+        with self.lock:
+            future = self.pending.get(path)
+            started = future is None
+            if started:
+                if self.pool is None:
+                    # Spawned workers do not inherit the GUI process's threads and state
+                    self.pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+                future = self.pool.submit(extract_document, path, self.directory)
+                self.pending[path] = future
+        # Callbacks of a future that is already done run right away, so never under the lock
+        if started:
+            future.add_done_callback(lambda done: self.store(path, signature, done))
+        if on_done is not None:
+            future.add_done_callback(lambda done: on_done(path, *self.outcome(done)))
+        return future
+
+    @staticmethod
+    def outcome(future):
+        if future.cancelled():
+            return None, False, "cancelled"
+        error = future.exception()
+        if error is not None:
+            return None, False, str(error)
+        content_hash, chunks, from_cache = future.result()
+        return chunks, from_cache, None
+
+    def store(self, path, signature, future):
+        # A file that failed gets no chunks, and is only tried again once it changes
+        with self.lock:
+            self.pending.pop(path, None)
+            if future.cancelled():
+                return
+            self.documents[path] = (signature, future.result()[1] if future.exception() is None else [])
+
+    def is_pending(self, path):
+        with self.lock:
+            return path in self.pending
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,317 @@
+import difflib
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+JOURNAL_FILE = ".fileops_journal.json"
+
+
+class FileOperationError(Exception):
+    pass
+
+
+class FileOperation:
+    def __init__(self, path):
+        self.path = path
+        self.content = None  # Full replacement text from a "# File:" block
+        self.appends = []  # "echo ... >" lines applied after the replacement
+        self.touch = False
+
+    def resolve(self, old_text):
+        # Final text of the file, or None when the operation leaves it as it is
+        if self.content is None and not self.appends:
+            return "" if self.touch and old_text is None else None
+        base = self.content if self.content is not None else (old_text or "")
+        return base + "".join(f"{line}\n" for line in self.appends)
+
+
+class FileChange:
+    def __init__(self, path, full_path, old_text, new_text, action):
+        self.path = path
+        self.full_path = full_path
+        self.old_text = old_text  # None when the file does not exist yet
+        self.new_text = new_text
+        self.action = action  # "created", "written" or "appended"
+
+
+class Hunk:
+    def __init__(self, old_start, old_end, new_start, new_end, text):
+        self.old_start = old_start
+        self.old_end = old_end
+        self.new_start = new_start
+        self.new_end = new_end
+        self.text = text
+
+
+class OperationPlan:
+    # Collects ResponseParser events into coalesced operations: repeated mkdirs collapse into
+    # one, and every touch / echo / "# File:" block aimed at one file becomes a single write.
+    def __init__(self):
+        self.directories = []
+        self.operations = {}
+
+    def __bool__(self):
+        return bool(self.directories or self.operations)
+
+    def operation(self, path):
+        path = normalize_path(path)
+        if path not in self.operations:
+            self.operations[path] = FileOperation(path)
+        return self.operations[path]
+
+    def make_directory(self, path):
+        path = normalize_path(path)
+        if path not in self.directories:
+            self.directories.append(path)
+
+    def touch_file(self, path):
+        self.operation(path).touch = True
+
+    def append_to_file(self, path, content):
+        self.operation(path).appends.append(content)
+
+    def begin_file(self, path):
+        pass
+
+    def file_line(self, path, line):
+        pass
+
+    def end_file(self, path, lines):
+        if lines:
+            operation = self.operation(path)
+            # A full write replaces whatever was appended before it
+            operation.content = "\n".join(lines) + "\n"
+            operation.appends = []
+
+    def resolve(self, workspace_path, known_hash=None):
+        # FileChange for every file whose content actually changes. known_hash(full_path) may
+        # return the current content hash (e.g. from the workspace index), which lets full
+        # rewrites with identical content be skipped without reading the file.
+        changes = []
+        for path, operation in self.operations.items():
+            full_path = workspace_file(workspace_path, path)
+            if known_hash is not None and operation.content is not None and not operation.appends:
+                current_hash = known_hash(full_path)
+                if current_hash is not None and current_hash == text_hash(operation.content):
+                    continue
+            old_text = read_text(full_path)
+            new_text = operation.resolve(old_text)
+            if new_text is None or new_text == old_text:
+                continue
+            if old_text is None and operation.content is None and not operation.appends:
+                action = "created"
+            elif operation.content is None:
+                action = "appended"
+            else:
+                action = "written"
+            changes.append(FileChange(path, full_path, old_text, new_text, action))
+        return changes
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode('utf-8', errors='surrogateescape')).hexdigest()
+
+
+def diff_hunks(change, context=3):
+    # Line-level hunks between the current and the new content of a change
+    old_lines = (change.old_text or "").splitlines(keepends=True)
+    new_lines = change.new_text.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+    hunks = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        lines = [f"@@ -{i1 + 1},{i2 - i1} +{j1 + 1},{j2 - j1} @@\n"]
+        lines += [f"  {line}" for line in old_lines[max(0, i1 - context):i1]]
+        lines += [f"- {line}" for line in old_lines[i1:i2]]
+        lines += [f"+ {line}" for line in new_lines[j1:j2]]
+        lines += [f"  {line}" for line in old_lines[i2:i2 + context]]
+        hunks.append(Hunk(i1, i2, j1, j2, "".join(line if line.endswith("\n") else line + "\n" for line in lines)))
+    return hunks
+
+
+def merge_hunks(change, hunks, accepted):
+    # New content with only the accepted hunks (by index) applied to the current content
+    old_lines = (change.old_text or "").splitlines(keepends=True)
+    new_lines = change.new_text.splitlines(keepends=True)
+    result = []
+    position = 0
+    for index, hunk in enumerate(hunks):
+        result += old_lines[position:hunk.old_start]
+        if index in accepted:
+            result += new_lines[hunk.new_start:hunk.new_end]
+        else:
+            result += old_lines[hunk.old_start:hunk.old_end]
+        position = hunk.old_end
+    result += old_lines[position:]
+    return "".join(result)
+
+
+def normalize_path(path):
+    # AI responses sometimes use "/app/x.py" to mean a workspace-relative path
+    return os.path.normpath(path.strip().strip('"\'').lstrip("/\\"))
+
+
+def workspace_file(workspace_path, path, allow_root=False):
+    root = os.path.abspath(workspace_path)
+    full_path = os.path.abspath(os.path.join(root, path))
+    if full_path == root and allow_root:
+        return full_path
+    if not full_path.startswith(root + os.sep):
+        raise FileOperationError(f"Path escapes the workspace: {path}")
+    return full_path
+
+
+def read_text(path):
+    # surrogateescape round-trips bytes that are not valid UTF-8
+    try:
+        with open(path, 'r', encoding='utf-8', errors='surrogateescape', newline='') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def verify_unchanged(changes):
+    # Refuses changes whose file no longer has the content they were computed from, e.g.
+    # because it was edited while a preview was open
+    for change in changes:
+        current = read_text(change.full_path)
+        if current != change.old_text:
+            raise FileOperationError(f"File changed on disk since the changes were prepared: {change.path}")
+
+
+def apply_plan(workspace_path, plan, changes=None):
+    # Applies the plan as one transaction. A journal lists the temp file, target and backup
+    # of every change before anything is written; new contents then go to the temp files,
+    # originals are kept as hard-linked backups, and only then are the temp files renamed
+    # over the targets. Any failure rolls everything back. Removing the journal commits.
+    # Returns (created directories, applied changes).
+    if changes is None:
+        changes = plan.resolve(workspace_path)
+    directories = [workspace_file(workspace_path, path, allow_root=True) for path in plan.directories]
+    directories += [os.path.dirname(change.full_path) for change in changes]
+
+    journal_path = os.path.join(workspace_path, JOURNAL_FILE)
+    journal = {'directories': [], 'files': []}
+    try:
+        for directory in directories:
+            journal['directories'].extend(make_directories(directory))
+
+        for change in changes:
+            journal['files'].append({
+                'path': change.full_path,
+                'temp': sibling_path(change.full_path, "tmp"),
+                'backup': sibling_path(change.full_path, "bak") if change.old_text is not None else None,
+                'replaced': False,
+            })
+        write_journal(journal_path, journal)
+
+        for entry, change in zip(journal['files'], changes):
+            write_temp(entry['path'], entry['temp'], change.new_text)
+        for entry in journal['files']:
+            if entry['backup']:
+                link_or_copy(entry['path'], entry['backup'])
+        for entry in journal['files']:
+            os.replace(entry['temp'], entry['path'])
+            entry['replaced'] = True
+    except Exception:
+        remove_temp_files(journal)
+        rollback(journal)
+        remove_file(journal_path)
+        raise
+
+    # The journal goes first: once it is gone the transaction is committed, and a crash
+    # while the backups are removed only leaves stray backup files
+    remove_file(journal_path)
+    for entry in journal['files']:
+        if entry['backup']:
+            remove_file(entry['backup'])
+    return journal['directories'], changes
+
+
+def make_directories(directory):
+    # Creates missing directories and returns the ones created, outermost first
+    created = []
+    current = directory
+    while not os.path.isdir(current):
+        created.append(current)
+        current = os.path.dirname(current)
+    for path in reversed(created):
+        os.mkdir(path)
+    return list(reversed(created))
+
+
+def write_temp(path, temp_path, text):
+    # A temp file that is not complete is removed with the others when the plan fails
+    with open(temp_path, 'x', encoding='utf-8', errors='surrogateescape', newline='') as f:
+        f.write(text)
+    if os.path.exists(path):
+        shutil.copymode(path, temp_path)
+
+
+def sibling_path(path, suffix):
+    # Hidden, uniquely named file next to path, e.g. for its temp file or backup
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.{suffix}")
+
+
+def remove_temp_files(journal):
+    for entry in journal['files']:
+        if entry.get('temp') and not entry['replaced']:
+            remove_file(entry['temp'])
+
+
+def link_or_copy(path, backup):
+    try:
+        os.link(path, backup)
+    except OSError:
+        shutil.copy2(path, backup)
+
+
+def write_journal(journal_path, journal):
+    with open(journal_path, 'w', encoding='utf-8') as f:
+        json.dump(journal, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def rollback(journal):
+    for entry in reversed(journal['files']):
+        if entry['backup'] and os.path.exists(entry['backup']):
+            os.replace(entry['backup'], entry['path'])
+        elif entry['replaced'] and entry['backup'] is None:
+            # The file did not exist before this transaction
+            remove_file(entry['path'])
+    for directory in reversed(journal['directories']):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+
+def recover_journal(workspace_path):
+    # Rolls back an apply that was interrupted before it finished (e.g. by a crash)
+    journal_path = os.path.join(workspace_path, JOURNAL_FILE)
+    try:
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            journal = json.load(f)
+    except (OSError, ValueError):
+        return False
+    # Temp files of a crash during the write phase are removed. Later progress is not
+    # recorded, so assume every rename happened; originals come back from their backups and
+    # files that did not exist are removed.
+    remove_temp_files(journal)
+    for entry in journal['files']:
+        entry['replaced'] = True
+    rollback(journal)
+    remove_file(journal_path)
+    return True
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -1,57 +1,233 @@
-The Flask application should display a web page that includes the following elements:
+import argparse
+import json
+import os
+import time
 
-1. A title, "Hello World"
-2. A paragraph with some text.
-3. An input field for users to enter their names.
-4. A button labeled "Submit".
-5. A heading element to display a personalized greeting once the user enters their name and clicks the submit button.
+from flask import Flask, Response, jsonify, request
 
-The server should be accessible at `localhost:5000`. You can use HTML templates or render functions directly in your Flask route.
+from api_client import ApiClient
+from batch_runner import BatchRunner, load_config
+from file_ops import FileOperationError
+from generation import DEFAULT_MAIN_PROMPT, parse_response
+from job_queue import FINISHED_STATUSES, JobService, JobStore, QueueFull
 
-Here's an example of how you might structure the Flask application:
+CONFIG_FILE = "config.json"
+JOBS_FILE = "jobs.sqlite3"
+WORKSPACES_DIR = "server_workspaces"
+EVENT_KEEPALIVE = 15  # Seconds between comments on an idle event stream
+QUEUE_POLL_INTERVAL = 0.5  # Seconds between checks of a queued job an event stream waits for
 
-```python
-from flask import Flask, render_template, request
+# HTTP API for the generation pipeline, shared by several users:
+#   POST   /jobs                     submit {"workspace": "name", "task": "...", "model": optional}
+#   GET    /jobs                     recent jobs, filtered by ?user= and ?status=
+#   GET    /jobs/<id>                status, queue position and result of one job
+#   GET    /jobs/<id>/events         server-sent events: streamed text, then the final status
+#   GET    /jobs/<id>/operations     directories and file contents the reply creates
+#   DELETE /jobs/<id>                cancel a queued or running job
+#   GET    /health                   workers and job counts
+# The user is taken from the X-User header (or "user" in the submitted JSON).
 
-app = Flask(__name__)
 
-@app.route('/', methods=['GET', 'POST'])
-def hello():
-    greeting = "Hello World"
-    text = "Welcome to our simple user interface."
-    name = ""
+def error(status, message, headers=None):
+    response = jsonify({'error': message})
+    response.status_code = status
+    for name, value in (headers or {}).items():
+        response.headers[name] = value
+    return response
 
-    if request.method == 'POST':
-        name = request.form['name']
-        greeting = f"Hello {name}!"
 
-    return render_template('index.html', greeting=greeting, text=text, name=name)
+def job_view(service, job):
+    if job['status'] == "queued":
+        job['position'] = service.store.position(job['id'])
+    return job
+
+
+def job_operations(job):
+    # The file operations of the job's reply, with full contents, so clients can apply them
+    # to their own copy of the workspace
+    result = job['result'] or {}
+    plan = parse_response(result.get('reply', ""))
+    actions = {change['path']: change['action'] for change in result.get('files', [])}
+    return {
+        'id': job['id'],
+        'applied': 'files' in result,
+        'directories': plan.directories,
+        'files': [
+            {
+                'path': path,
+                'action': actions.get(path),
+                'content': operation.content,
+                'appends': operation.appends,
+                'touch': operation.touch,
+            }
+            for path, operation in plan.operations.items()
+        ],
+    }
+
+
+def status_event(service, job):
+    return f"event: status\ndata: {json.dumps(job_view(service, job))}\n\n"
+
+
+def stream_events(service, job_id):
+    # A status event whenever the status or queue position changes, text events as the reply
+    # is generated, and a last status event once the job has finished
+    position = 0
+    last_view = None
+    idle_since = time.monotonic()
+    while True:
+        events = service.events.get(job_id)
+        if events is None:
+            job = service.store.get(job_id)
+            if job is None or job['status'] in FINISHED_STATUSES:
+                break
+            view = (job['status'], service.store.position(job_id) if job['status'] == "queued" else None)
+            if view != last_view:
+                last_view = view
+                idle_since = time.monotonic()
+                yield status_event(service, job)
+            elif time.monotonic() - idle_since >= EVENT_KEEPALIVE:
+                idle_since = time.monotonic()
+                yield ": keepalive\n\n"
+            time.sleep(QUEUE_POLL_INTERVAL)
+            continue
+        if last_view != ("running", None):
+            last_view = ("running", None)
+            yield status_event(service, service.store.get(job_id))
+        chunks, status = events.wait(position, EVENT_KEEPALIVE)
+        position += len(chunks)
+        if chunks:
+            yield f"event: text\ndata: {json.dumps({'text': ''.join(chunks)})}\n\n"
+        elif status is None:
+            yield ": keepalive\n\n"
+        if status is not None:
+            break
+    job = service.store.get(job_id)
+    if job is not None:
+        yield status_event(service, job)
+
+
+def create_app(service):
+    app = Flask(__name__)
+
+    @app.post("/jobs")
+    def submit_job():
+        data = request.get_json(silent=True) or {}
+        task = data.get('task') or data.get('prompt')
+        workspace = data.get('workspace')
+        if not task or not workspace:
+            return error(400, "'task' and 'workspace' are required")
+        user = request.headers.get("X-User") or data.get('user') or "anonymous"
+        try:
+            job = service.submit(user, workspace, task, data.get('model'))
+        except FileOperationError as e:
+            return error(400, str(e))
+        except QueueFull as e:
+            return error(429, f"Queue is full: {e}", {"Retry-After": "5"})
+        response = jsonify(job_view(service, job))
+        response.status_code = 201
+        response.headers["Location"] = f"/jobs/{job['id']}"
+        return response
+
+    @app.get("/jobs")
+    def list_jobs():
+        limit = request.args.get('limit', 100, type=int)
+        return jsonify(service.store.jobs(request.args.get('user'), request.args.get('status'), min(limit, 1000)))
+
+    @app.get("/jobs/<job_id>")
+    def get_job(job_id):
+        job = service.store.get(job_id)
+        if job is None:
+            return error(404, "No such job")
+        return jsonify(job_view(service, job))
+
+    @app.delete("/jobs/<job_id>")
+    def cancel_job(job_id):
+        job = service.cancel(job_id)
+        if job is None:
+            return error(404, "No such job")
+        return jsonify(job_view(service, job))
+
+    @app.get("/jobs/<job_id>/events")
+    def job_events(job_id):
+        if service.store.get(job_id) is None:
+            return error(404, "No such job")
+        return Response(stream_events(service, job_id), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache"})
+
+    @app.get("/jobs/<job_id>/operations")
+    def get_operations(job_id):
+        job = service.store.get(job_id)
+        if job is None:
+            return error(404, "No such job")
+        if job['status'] not in FINISHED_STATUSES:
+            return error(409, f"Job is {job['status']}")
+        if job['status'] != "ok":
+            return error(409, f"Job ended with status {job['status']}")
+        return jsonify(job_operations(job))
+
+    @app.get("/health")
+    def health():
+        return jsonify({'workers': service.workers, 'jobs': service.store.counts()})
+
+    return app
+
+
+def build_service(config, workers=8, workspaces_root=WORKSPACES_DIR, jobs_file=JOBS_FILE, max_queued=1000,
+                  main_prompt=DEFAULT_MAIN_PROMPT, dry_run=False, job_retention=7 * 24 * 3600):
+    models_endpoint = config.get('api_endpoint_models', "https://api.openai.com/v1/models")
+    model = config.get('selected_model', "")
+    client = ApiClient(
+        models_endpoint,
+        models_endpoint.replace("/v1/models", "/v1/completions"),
+        api_key=config.get('api_key', ""),
+        connect_timeout=config.get('connect_timeout', 10),
+        read_timeout=config.get('read_timeout', 600),
+        max_retries=config.get('max_retries', 3),
+        backoff_factor=config.get('retry_backoff', 0.5),
+        pool_size=max(10, workers)  # One kept-alive connection per worker
+    )
+    runner = BatchRunner(
+        client,
+        [],
+        model,
+        max_tokens=config.get('max_tokens', 1500),
+        main_prompt=main_prompt,
+        stream=config.get('stream_responses', True),
+        context_budget=config.get('model_context_budgets', {}).get(model, config.get('context_token_budget', 4000)),
+        include_context=config.get('include_workspace_context', True),
+        apply=not dry_run,
+        keep_replies=True
+    )
+    os.makedirs(workspaces_root, exist_ok=True)
+    store = JobStore(jobs_file, max_queued)
+    store.prune(job_retention)
+    return JobService(store, runner, os.path.abspath(workspaces_root), workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the generation pipeline as an HTTP job API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=8, help="jobs running at the same time (default 8)")
+    parser.add_argument("--workspaces", default=WORKSPACES_DIR, help="directory holding the workspaces")
+    parser.add_argument("--jobs-file", default=JOBS_FILE, help="SQLite job queue (default jobs.sqlite3)")
+    parser.add_argument("--max-queued", type=int, default=1000, help="queued jobs before submissions get 429")
+    parser.add_argument("--config", default=CONFIG_FILE, help="configuration file (default config.json)")
+    parser.add_argument("--main-prompt", default=DEFAULT_MAIN_PROMPT, help="main prompt placed before each task")
+    parser.add_argument("--dry-run", action="store_true", help="do not apply replies to the server's workspaces")
+    args = parser.parse_args()
+
+    service = build_service(load_config(args.config), args.workers, args.workspaces, args.jobs_file,
+                            args.max_queued, args.main_prompt, args.dry_run).start()
+    try:
+        # Threaded, so event streams and slow clients do not hold up other requests
+        create_app(service).run(host=args.host, port=args.port, threaded=True)
+    finally:
+        service.stop()
+        service.runner.client.close()
+        service.store.close()
+
 
 if __name__ == '__main__':
-    app.run(debug=True)
-```
-
-Create an `index.html` file in a folder named `templates`. This HTML file will contain the structure of your web page. Make sure to use Jinja2 templating syntax in your HTML to render the variables passed from your Flask route.
-
-```html
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <title>Simple User Interface</title>
-</head>
-<body>
-    <h1>{{ greeting }}</h1>
-    <p>{{ text }}</p>
-    <form method="post">
-        <input type="text" name="name" placeholder="Enter your name">
-        <button type="submit">Submit</button>
-    </form>
-    {% if name %}
-        <h2>{{ greeting }} {{ name }}!</h2>
-    {% endif %}
-</body>
-</html>
-```
-
-This solution provides a basic Flask server and an HTML template that meets the requirements specified in the question. The server runs on `localhost:5000` and displays a web page with the requested elements, including a personalized greeting based on user input.
\ No newline at end of file
+    main()
@@ -0,0 +1,203 @@
+import json
+import os
+
+from context_packer import estimate_tokens, file_section
+from file_ops import OperationPlan, apply_plan
+from response_parser import ResponseParser
+
+# The GUI-free steps of a request: building the prompt, calling the completions endpoint and
+# turning the reply into file operations. Used by the desktop app and by batch_runner.py.
+
+DEFAULT_MAIN_PROMPT = "Your default main prompt here."
+
+
+def build_reference_text(url_references=(), file_references=()):
+    reference_text = ""
+    if url_references:
+        reference_text += "Using the following URLs as references: "
+        reference_text += ", ".join(url_references) + ". "
+    if file_references:
+        reference_text += "Using content from the following files: "
+        reference_text += ", ".join(os.path.basename(file) for file in file_references) + ". "
+    return reference_text
+
+
+def build_prompt(main_prompt, workspace_path, task, url_references=(), file_references=(), context_text=""):
+    reference_text = build_reference_text(url_references, file_references)
+
+    if context_text:
+        context_text = f"\n\n{context_text}"
+
+    return (
+        f"{main_prompt}\n"
+        f"Analyze the existing project structure, including files and directories, in the workspace at: {workspace_path}. "
+        f"{reference_text}"
+        f"Ensure that any generated code integrates seamlessly into the current project structure. The task is: {task}. "
+        "You must decide where each part of the code should go, create or modify files and directories using appropriate file system commands, "
+        "and ensure everything fits together. Log each step you take in the terminal."
+        f"{context_text}"
+    )
+
+
+# Chat mode splits the prompt in two. The system message holds everything that stays the same
+# from request to request, so together with the earlier turns it forms a prefix that servers
+# with prompt caching (llama.cpp, vLLM) do not have to process again. Everything that changes
+# (references, the task and the workspace context) goes into the new user message at the end.
+
+def build_system_prompt(main_prompt, workspace_path):
+    return (
+        f"{main_prompt}\n"
+        f"You work on the project in the workspace at: {workspace_path}. "
+        "Analyze the existing project structure, including files and directories, from the context given with each task. "
+        "Ensure that any generated code integrates seamlessly into the current project structure. "
+        "You must decide where each part of the code should go, create or modify files and directories using appropriate file system commands, "
+        "and ensure everything fits together. Log each step you take in the terminal."
+    )
+
+
+def build_user_message(task, url_references=(), file_references=(), context_text=""):
+    if context_text:
+        context_text = f"\n\n{context_text}"
+    return f"{build_reference_text(url_references, file_references)}The task is: {task}.{context_text}"
+
+
+class ChatHistory:
+    # Earlier turns of one conversation, sent again with each request. When they exceed
+    # max_tokens, the oldest turns are dropped until they fit in half the budget; the newest
+    # turn is always kept, so the next request can refer to it. The history then stays the
+    # same for several turns instead of shifting by one turn every request, which would
+    # change the prompt prefix each time and defeat the server's prefix cache.
+    def __init__(self, max_tokens=8000):
+        self.max_tokens = max_tokens
+        self.turns = []  # (user message, reply, estimated tokens)
+
+    def messages(self, system_prompt, user_message):
+        messages = [{"role": "system", "content": system_prompt}]
+        for user, reply, tokens in self.turns:
+            messages.append({"role": "user", "content": user})
+            messages.append({"role": "assistant", "content": reply})
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def tokens(self):
+        return sum(tokens for user, reply, tokens in self.turns)
+
+    def contains(self, text):
+        # Whether text was sent or received in one of the kept turns
+        return any(text in user or text in reply for user, reply, tokens in self.turns)
+
+    def contains_file(self, label, text):
+        # Whether a kept turn already has the file with this text: sent as a context excerpt,
+        # or written by a reply as a "# File:" block
+        sent = file_section(label, text)
+        written = f"# File: {label}\n{text}"
+        return any(sent in user or written in reply for user, reply, tokens in self.turns)
+
+    def add(self, user_message, reply):
+        self.turns.append((user_message, reply, estimate_tokens(user_message) + estimate_tokens(reply)))
+        if self.tokens() > self.max_tokens:
+            while len(self.turns) > 1 and self.tokens() > self.max_tokens // 2:
+                self.turns.pop(0)
+
+    def clear(self):
+        self.turns = []
+
+
+def build_payload(model, prompt, max_tokens, stream=False):
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "max_tokens": max_tokens
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def build_chat_payload(model, messages, max_tokens, stream=False):
+    payload = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def choice_text(choices):
+    # Text of the first choice: 'text' for completions, message.content for chat completions
+    # and delta.content for streamed chat completions
+    if not choices:
+        return ""
+    choice = choices[0]
+    if 'text' in choice:
+        return choice['text'] or ""
+    message = choice.get('message') or choice.get('delta') or {}
+    return message.get('content') or ""
+
+
+def read_body(response, cancelled=None, on_usage=None):
+    body = bytearray()
+    for chunk in response.iter_content(chunk_size=8192):
+        if cancelled is not None and cancelled():
+            return None
+        body.extend(chunk)
+    data = json.loads(body)
+    if on_usage is not None and data.get('usage'):
+        on_usage(data['usage'])
+    return choice_text(data.get('choices', []))
+
+
+def read_event_stream(response, on_text=None, cancelled=None, on_usage=None):
+    # Server-sent events: "data: {json}" lines, terminated by "data: [DONE]". Servers that
+    # report token usage for streams put it in one of the last events.
+    pieces = []
+    for line in response.iter_lines():
+        if cancelled is not None and cancelled():
+            return None
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].decode('utf-8').strip()
+        if data == "[DONE]":
+            break
+        event = json.loads(data)
+        if on_usage is not None and event.get('usage'):
+            on_usage(event['usage'])
+        text = choice_text(event.get('choices', []))
+        if text:
+            pieces.append(text)
+            if on_text is not None:
+                on_text(text)
+    return "".join(pieces)
+
+
+def request_completion(client, payload, on_text=None, cancelled=None, on_response=None, on_usage=None):
+    # Returns the reply text, or None when cancelled() turned true while reading it.
+    # on_response(response) is called once the headers have arrived, and on_usage(usage) with
+    # the API's token counts if the reply includes them. Payloads with 'messages' go to the
+    # chat completions endpoint.
+    post = client.post_chat_completion if "messages" in payload else client.post_completion
+    with post(payload) as response:
+        if on_response is not None:
+            on_response(response)
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "")
+        if payload.get("stream") and "text/event-stream" in content_type:
+            return read_event_stream(response, on_text, cancelled, on_usage)
+        return read_body(response, cancelled, on_usage)
+
+
+def parse_response(text):
+    # The whole reply as one operation plan
+    plan = OperationPlan()
+    parser = ResponseParser(plan)
+    parser.feed(text.strip())
+    parser.close()
+    return plan
+
+
+def apply_response(workspace_path, text, known_hash=None):
+    # Parses and applies a reply in one transaction; returns (created directories, changes)
+    plan = parse_response(text)
+    return apply_plan(workspace_path, plan, plan.resolve(workspace_path, known_hash))
@@ -0,0 +1,265 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from file_ops import FileOperationError, workspace_file
+
+FINISHED_STATUSES = ("ok", "error", "cancelled")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobStore:
+    # Generation jobs in SQLite, so queued and finished jobs survive a restart. Jobs that were
+    # running when the server stopped are queued again and run from the start. claim() picks the
+    # oldest job of the user with the fewest running jobs, so one user's backlog cannot starve
+    # the others.
+    def __init__(self, path, max_queued=1000):
+        self.path = path
+        self.max_queued = max_queued
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")  # With WAL, a commit does not wait for a sync
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, seq INTEGER NOT NULL, user TEXT NOT NULL, "
+                "workspace TEXT NOT NULL, task TEXT NOT NULL, model TEXT, status TEXT NOT NULL, "
+                "created REAL NOT NULL, started REAL, finished REAL, result TEXT)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, seq)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS jobs_user ON jobs (user, seq)")
+            self.db.execute("UPDATE jobs SET status = 'queued', started = NULL WHERE status = 'running'")
+
+    @staticmethod
+    def to_dict(row):
+        job = {key: row[key] for key in row.keys() if key not in ("seq", "result")}
+        job['result'] = json.loads(row['result']) if row['result'] else None
+        return job
+
+    def submit(self, user, workspace, task, model=None):
+        job_id = uuid.uuid4().hex
+        with self.lock, self.db:
+            queued = self.db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                raise QueueFull(f"{queued} jobs are queued")
+            self.db.execute(
+                "INSERT INTO jobs (id, seq, user, workspace, task, model, status, created) VALUES "
+                "(?, (SELECT COALESCE(MAX(seq) + 1, 0) FROM jobs), ?, ?, ?, ?, 'queued', ?)",
+                (job_id, user, workspace, task, model, time.time())
+            )
+        return self.get(job_id)
+
+    def claim(self, on_claim=None):
+        # Marks the next job as running and returns it, or None when nothing is queued.
+        # on_claim(job_id) runs before the status changes, under the lock cancel_queued takes,
+        # so a cancel either finds the job queued or finds what on_claim set up.
+        with self.lock, self.db:
+            row = self.db.execute(
+                "SELECT * FROM jobs q WHERE q.status = 'queued' ORDER BY "
+                "(SELECT COUNT(*) FROM jobs r WHERE r.status = 'running' AND r.user = q.user), q.seq LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            if on_claim is not None:
+                on_claim(row['id'])
+            started = time.time()
+            self.db.execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ?", (started, row['id']))
+        job = self.to_dict(row)
+        job['status'] = "running"
+        job['started'] = started
+        return job
+
+    def finish(self, job_id, status, result):
+        with self.lock, self.db:
+            self.db.execute(
+                "UPDATE jobs SET status = ?, finished = ?, result = ? WHERE id = ?",
+                (status, time.time(), json.dumps(result), job_id)
+            )
+
+    def cancel_queued(self, job_id):
+        # True if the job was still queued; running jobs have to be stopped by their worker
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+        return cursor.rowcount > 0
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self.to_dict(row) if row is not None else None
+
+    def position(self, job_id):
+        # Jobs queued ahead of a queued job, in submission order
+        with self.lock:
+            return self.db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND seq < (SELECT seq FROM jobs WHERE id = ?)",
+                (job_id,)
+            ).fetchone()[0]
+
+    def jobs(self, user=None, status=None, limit=100):
+        # Most recent first; results are left out to keep listings small
+        conditions, values = [], []
+        if user is not None:
+            conditions.append("user = ?")
+            values.append(user)
+        if status is not None:
+            conditions.append("status = ?")
+            values.append(status)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT * FROM jobs {where} ORDER BY seq DESC LIMIT ?", values + [limit]
+            ).fetchall()
+        jobs = []
+        for row in rows:
+            job = self.to_dict(row)
+            del job['result']
+            jobs.append(job)
+        return jobs
+
+    def counts(self):
+        with self.lock:
+            return dict(self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def prune(self, max_age):
+        # Deletes finished jobs older than max_age seconds
+        with self.lock, self.db:
+            placeholders = ", ".join("?" * len(FINISHED_STATUSES))
+            cursor = self.db.execute(
+                f"DELETE FROM jobs WHERE status IN ({placeholders}) AND finished < ?",
+                FINISHED_STATUSES + (time.time() - max_age,)
+            )
+        return cursor.rowcount
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class JobEvents:
+    # Streamed text and the final status of a running job, for clients following it live
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.chunks = []
+        self.status = None
+
+    def text(self, text):
+        with self.condition:
+            self.chunks.append(text)
+            self.condition.notify_all()
+
+    def close(self, status):
+        with self.condition:
+            self.status = status
+            self.condition.notify_all()
+
+    def wait(self, position, timeout):
+        # (chunks after position, final status or None), once there is news or after timeout
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.chunks) > position or self.status is not None, timeout)
+            return self.chunks[position:], self.status
+
+
+class JobService:
+    # Runs queued jobs on a fixed pool of worker threads through BatchRunner.run_task. Completion
+    # calls of different jobs run in parallel, even in one workspace; only context packing and
+    # applying replies take the workspace's lock. Workspaces are directories under
+    # workspaces_root, named by the client.
+    def __init__(self, store, runner, workspaces_root, workers=8, poll_interval=1.0):
+        self.store = store
+        self.runner = runner
+        self.workspaces_root = workspaces_root
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.workspace_lock = threading.Lock()
+        self.wakeup = threading.Condition()
+        self.stopping = False
+        self.threads = []
+        self.events = {}  # job id -> JobEvents of a running job
+        self.cancel_events = {}  # job id -> threading.Event of a running job
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self.work, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout=5):
+        # Running jobs get timeout seconds to finish; the rest stay "running" in the store and
+        # are queued again on the next start
+        with self.wakeup:
+            self.stopping = True
+            self.wakeup.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+    def workspace_path(self, name):
+        # Raises FileOperationError for names that leave workspaces_root or are not a direct
+        # child of it: with nested names, "a" and "a/b" would be workspaces inside each other
+        if "/" in name or "\\" in name:
+            raise FileOperationError(f"Workspace names cannot contain path separators: {name}")
+        return workspace_file(self.workspaces_root, name)
+
+    def submit(self, user, workspace, task, model=None):
+        self.workspace_path(workspace)
+        job = self.store.submit(user, workspace, task, model)
+        with self.wakeup:
+            self.wakeup.notify()
+        return job
+
+    def cancel(self, job_id):
+        # Returns the job afterwards, or None if there is no such job
+        if not self.store.cancel_queued(job_id):
+            cancel_event = self.cancel_events.get(job_id)
+            if cancel_event is not None:
+                cancel_event.set()
+        return self.store.get(job_id)
+
+    def work(self):
+        while True:
+            with self.wakeup:
+                if self.stopping:
+                    return
+            job = self.store.claim(self.register)
+            if job is None:
+                # Submissions wake a worker; the timeout picks up jobs queued while none was waiting
+                with self.wakeup:
+                    if not self.stopping:
+                        self.wakeup.wait(self.poll_interval)
+                continue
+            self.run(job)
+
+    def register(self, job_id):
+        # Called by claim() before the job is marked running, so cancel() can always reach it
+        self.events[job_id] = JobEvents()
+        self.cancel_events[job_id] = threading.Event()
+
+    def run(self, job):
+        events = self.events[job['id']]
+        cancel_event = self.cancel_events[job['id']]
+        try:
+            with self.workspace_lock:
+                workspace = self.runner.workspace_for({'workspace': self.workspace_path(job['workspace'])})
+            result = self.runner.run_task(
+                job['id'], {'prompt': job['task'], 'model': job['model']}, workspace,
+                on_text=events.text, cancelled=cancel_event.is_set
+            )
+        except Exception as e:
+            result = {'task': job['id'], 'status': "error", 'error': str(e)}
+        try:
+            self.store.finish(job['id'], result['status'], result)
+        except sqlite3.ProgrammingError:
+            return  # The store was closed at shutdown; the job runs again on the next start
+        events.close(result['status'])
+        self.events.pop(job['id'], None)
+        self.cancel_events.pop(job['id'], None)
@@ -0,0 +1,110 @@
+import bisect
+import mmap
+import os
+from array import array
+
+BLOCK_SIZE = 64 * 1024
+SEARCH_CHUNK = 4 * 1024 * 1024
+MAX_LINE_CHARS = 10000  # Longer lines are cut off when displayed
+
+
+class FileChangedError(Exception):
+    pass
+
+
+class LineIndex:
+    # Line positions in a memory-mapped file. Only the number of newlines before each 64 KB
+    # block is stored, so the index stays small however large the file is; a line is found
+    # by scanning forward from the start of its block. Every access checks first that the file
+    # has not shrunk: touching a mapped page past the end of a truncated file raises SIGBUS,
+    # which would kill the whole process.
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.newlines = array('Q', [0])  # Newlines before each counted block, plus the running total
+        self.complete = self.size == 0
+        self.closed = False
+
+    def check(self):
+        if os.fstat(self.file.fileno()).st_size < self.size:
+            raise FileChangedError(f"{os.path.basename(self.path)} was truncated on disk; close and reopen it")
+
+    def build(self):
+        # Runs on a worker thread; lines become available as blocks are counted
+        count = 0
+        for position in range(0, self.size, BLOCK_SIZE):
+            if self.closed:
+                return
+            self.check()
+            count += self.map[position:position + BLOCK_SIZE].count(b"\n")
+            self.newlines.append(count)
+        self.complete = True
+
+    def line_count(self):
+        # Lines known so far; exact once the index is complete
+        total = self.newlines[-1]
+        if self.complete and self.size:
+            self.check()
+            if self.map[self.size - 1] != ord("\n"):
+                total += 1
+        return total
+
+    def line_start(self, line):
+        if line == 0:
+            return 0
+        self.check()
+        # The block holding the newline that ends the previous line
+        block = bisect.bisect_left(self.newlines, line) - 1
+        position = block * BLOCK_SIZE
+        for _ in range(line - self.newlines[block]):
+            position = self.map.find(b"\n", position) + 1
+        return position
+
+    def line_at(self, offset):
+        # Line number containing a byte offset; needs the index to cover that offset
+        self.check()
+        block = offset // BLOCK_SIZE
+        return self.newlines[block] + self.map[block * BLOCK_SIZE:offset].count(b"\n")
+
+    def lines(self, start, count):
+        count = min(count, self.line_count() - start)
+        if count <= 0:
+            return []
+        self.check()
+        position = self.line_start(start)
+        lines = []
+        for _ in range(count):
+            end = self.map.find(b"\n", position)
+            if end < 0:
+                end = self.size
+            text = self.map[position:min(end, position + MAX_LINE_CHARS)].decode('utf-8', errors='replace')
+            if end - position > MAX_LINE_CHARS:
+                text += " ..."
+            lines.append(text.rstrip("\r"))
+            position = end + 1
+        return lines
+
+    def find(self, text, start=0):
+        # Byte offset of the next occurrence at or after start, or -1. The file is searched in
+        # chunks, so other threads get to run during long searches.
+        pattern = text.encode('utf-8')
+        position = start
+        while position < self.size and not self.closed:
+            self.check()
+            found = self.map.find(pattern, position, min(self.size, position + SEARCH_CHUNK + len(pattern)))
+            if found >= 0:
+                return found
+            position += SEARCH_CHUNK
+        return -1
+
+    def text(self, start, end):
+        self.check()
+        return self.map[start:end].decode('utf-8', errors='replace')
+
+    def close(self):
+        self.closed = True
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
@@ -1,34 +1,1118 @@
+import time
+STARTUP_STARTED = time.perf_counter()  # Start of the import phase reported by --profile-startup
 import sys
 import os
 import json
+import fnmatch
+import hashlib
 import shutil
-import requests
+import sqlite3
+import threading
+from contextlib import nullcontext
+from importlib import import_module
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QTextEdit,
     QListWidget, QSizePolicy, QToolBar, QDialog, QLabel, QLineEdit, QPushButton,
     QComboBox, QTabWidget, QTreeView, QInputDialog, QPlainTextEdit, QAbstractItemView,
-    QFileDialog, QCheckBox, QListWidgetItem, QMessageBox, QMenu, QTreeWidget, QTreeWidgetItem
+    QFileDialog, QCheckBox, QListWidgetItem, QMessageBox, QMenu, QTreeWidget, QTreeWidgetItem, QSplitter,
+    QScrollBar, QTableWidget, QTableWidgetItem, QHeaderView
 )
-from PyQt6.QtGui import QIcon, QAction, QColor, QPalette, QFileSystemModel, QDrag
-from PyQt6.QtCore import Qt, QMimeData, QDir
+from PyQt6.QtGui import QIcon, QAction, QColor, QPalette, QFileSystemModel, QDrag, QTextCursor
+from PyQt6.QtCore import Qt, QEvent, QMimeData, QObject, QSortFilterProxyModel, QTimer, QFileSystemWatcher, pyqtSignal
+from background import run_in_background
+from completion_engine import CompletionEngine
+from context_packer import CHARS_PER_TOKEN, ContextPacker, estimate_tokens
+from large_file import FileChangedError, LineIndex
+from file_ops import (
+    FileChange, FileOperationError, OperationPlan, apply_plan, diff_hunks, merge_hunks, normalize_path,
+    recover_journal, verify_unchanged, workspace_file
+)
+from generation import (DEFAULT_MAIN_PROMPT, ChatHistory, build_chat_payload, build_payload, build_prompt,
+                        build_system_prompt, build_user_message, parse_response)
+from model_catalog import ModelCatalog
+from response_cache import ResponseCache
+from response_parser import ResponseParser
+from prompt_library import PromptLibrary
+from rotating_log import RotatingLog
+from syntax import SyntaxHighlighter, language_for_path
+from tracing import PHASE_LABELS, PHASES, Tracer, format_trace
+from workflow_store import UNCHANGED, WorkflowWriter, read_workflow
+from workspace_index import IGNORED_DIRS, WorkspaceIndex
 
 CONFIG_FILE = "config.json"
+MODELS_CACHE_FILE = "models_cache.json"
+RESPONSE_CACHE_DIR = ".response_cache"
+TERMINAL_LOG_FILE = "terminal.log"
+AUTOSAVE_WORKFLOW_FILE = "workflow_autosave.json"
+PROMPT_LIBRARY_FILE = "prompt_library.sqlite3"
+URL_CACHE_DIR = ".url_cache"
+DOCUMENT_CACHE_DIR = ".document_cache"
+TRACE_FILE = "traces.jsonl"
+METRICS_FILE = "metrics.prom"
+TERMINAL_FLUSH_INTERVAL = 50  # Milliseconds between batched terminal updates
+MAIN_PROMPT_LIMIT = 200  # Rows listed by the main prompt dialog; a search narrows them down
+PROFILE_STARTUP_FLAG = "--profile-startup"
+
+# Terminal messages for applied file changes
+CHANGE_MESSAGES = {
+    "created": "File created:",
+    "appended": "Content written to",
+    "written": "File written:",
+}
+
+class StartupProfile:
+    # Time spent in each startup phase, printed to stderr when the app runs with --profile-startup
+    def __init__(self, started):
+        self.last = started
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        lines = [f"{phase:<16}{seconds * 1000:8.1f} ms" for phase, seconds in self.phases]
+        lines.append(f"{'total':<16}{sum(seconds for _, seconds in self.phases) * 1000:8.1f} ms")
+        print("Startup profile:\n" + "\n".join(lines), file=sys.stderr)
+
+
+class FirstPaintWatcher(QObject):
+    # Emits painted once, after the watched widget has been painted for the first time
+    painted = pyqtSignal()
+
+    def __init__(self, widget):
+        super().__init__(widget)
+        self.widget = widget
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint:
+            self.widget.removeEventFilter(self)
+            # Queued, so the paint completes before anything runs
+            QTimer.singleShot(0, self.painted.emit)
+        return False
+
 
 class TerminalOutput(QPlainTextEdit):
-    def __init__(self):
+    # Messages and streamed text may come from any thread. They are buffered and written in
+    # one batch per TERMINAL_FLUSH_INTERVAL. The document keeps the last max_lines lines; every
+    # line also goes to a rotating log file that "Show Earlier Output" pages through.
+    messages_pending = pyqtSignal()
+
+    def __init__(self, log=None, max_lines=5000):
         super().__init__()
         self.setReadOnly(True)
         self.setStyleSheet("font: 10pt 'Courier'; background-color: black; color: white;")
+        self.setMaximumBlockCount(max_lines)
+        self.streaming = False
+        self.log = log
+        self.log_line_open = False  # The log file ends in streamed text without a newline
+        self.lock = threading.Lock()
+        self.pending = []  # ("line" | "stream" | "end", text) in arrival order
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(TERMINAL_FLUSH_INTERVAL)
+        self.flush_timer.timeout.connect(self.flush)
+        # Emitted from the writing thread; the timer is started on the GUI thread
+        self.messages_pending.connect(lambda: self.flush_timer.start())
+
+    def write(self, message):
+        self.queue("line", message)
+
+    def append_stream(self, text):
+        if text:
+            self.queue("stream", text)
+
+    def end_stream(self):
+        self.queue("end", "")
+
+    def queue(self, kind, text):
+        with self.lock:
+            first = not self.pending
+            self.pending.append((kind, text))
+        if first:
+            self.messages_pending.emit()
+
+    def flush(self):
+        with self.lock:
+            entries, self.pending = self.pending, []
+        lines = []
+        stream = []
+        for kind, text in entries:
+            if kind == "line":
+                self.insert_stream("".join(stream))
+                stream = []
+                lines.append(text)
+            else:
+                self.append_lines(lines)
+                lines = []
+                if kind == "stream":
+                    stream.append(text)
+                else:
+                    self.insert_stream("".join(stream))
+                    stream = []
+                    self.streaming = False
+        self.insert_stream("".join(stream))
+        self.append_lines(lines)
+
+    def append_lines(self, lines):
+        if not lines:
+            return
+        # Lines beyond the block limit would be dropped right away; only the log gets them
+        self.appendPlainText("\n".join(lines[-self.maximumBlockCount():]))
+        if self.log is not None:
+            text = "".join(f"{line}\n" for line in lines)
+            self.log.write("\n" + text if self.log_line_open else text)
+            self.log_line_open = False
+
+    def insert_stream(self, text):
+        # Append raw streamed text without starting a new line per piece.
+        # A trailing newline closes the line so log messages can follow it.
+        if not text:
+            return
+        if self.log is not None:
+            self.log.write(text)
+            self.log_line_open = not text.endswith("\n")
+        if not self.streaming:
+            self.appendPlainText("")
+            self.streaming = True
+        if text.endswith("\n"):
+            text = text[:-1]
+            self.streaming = False
+        cursor = self.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(text)
+        self.setTextCursor(cursor)
+        self.ensureCursorVisible()
+
+    def set_text(self, text):
+        self.flush()
+        self.setPlainText(text)
+        self.streaming = False
+
+    def contextMenuEvent(self, event):
+        menu = self.createStandardContextMenu()
+        if self.log is not None:
+            menu.addSeparator()
+            menu.addAction("Show Earlier Output...", self.show_earlier_output)
+        menu.exec(event.globalPos())
+
+    def show_earlier_output(self):
+        self.flush()
+        TerminalHistoryDialog(self.log, self).exec()
+
+    def close_log(self):
+        self.flush()
+        if self.log is not None:
+            self.log.close()
+
+class TerminalHistoryDialog(QDialog):
+    # Pages through the terminal log file, newest page first
+    def __init__(self, log, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Earlier Output")
+        self.resize(900, 600)
+        self.log = log
+        self.page = 0
+
+        self.text_view = CodeEditor()
+        self.text_view.setReadOnly(True)
+        self.page_label = QLabel()
+        self.older_button = QPushButton("Older")
+        self.older_button.clicked.connect(lambda: self.show_page(self.page + 1))
+        self.newer_button = QPushButton("Newer")
+        self.newer_button.clicked.connect(lambda: self.show_page(self.page - 1))
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(self.older_button)
+        buttons_layout.addWidget(self.newer_button)
+        buttons_layout.addWidget(self.page_label)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.text_view)
+        layout.addLayout(buttons_layout)
+        self.show_page(0)
+
+    def show_page(self, page):
+        lines, has_older = self.log.read_page(page)
+        self.page = page
+        self.text_view.setPlainText("\n".join(lines))
+        self.text_view.moveCursor(QTextCursor.MoveOperation.End)
+        self.page_label.setText(f"Page {page + 1}" + ("" if has_older else " (oldest)"))
+        self.older_button.setEnabled(has_older)
+        self.newer_button.setEnabled(page > 0)
 
 class CodeEditor(QPlainTextEdit):
     def __init__(self):
         super().__init__()
         self.setStyleSheet("font: 10pt 'Courier'; background-color: black; color: white;")
         self.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.highlighter = None
+
+    def set_language(self, language):
+        if language is not None:
+            self.highlighter = SyntaxHighlighter(self.document(), language)
+
+class LargeFileViewer(QWidget):
+    # Read-only view of a large file. The file is memory-mapped and only the lines in view are
+    # decoded, so memory use does not grow with the file size. If the file is truncated while
+    # it is shown, the view stops reading it.
+    def __init__(self, path):
+        super().__init__()
+        self.index = LineIndex(path)
+        self.first_line = 0
+        self.search_offset = 0
+        self.searching = False
+        self.changed = False
+
+        self.view = CodeEditor()
+        self.view.setReadOnly(True)
+        self.view.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.view.viewport().installEventFilter(self)
+        self.scroll_bar = QScrollBar(Qt.Orientation.Vertical)
+        self.scroll_bar.valueChanged.connect(self.scroll_to)
+
+        self.status_label = QLabel()
+        self.line_input = QLineEdit()
+        self.line_input.setPlaceholderText("Go to line")
+        self.line_input.returnPressed.connect(self.jump_to_line)
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search")
+        self.search_input.returnPressed.connect(self.find_next)
+        self.search_input.textChanged.connect(self.reset_search)
+        # Searching needs the complete line index to turn matches into line numbers
+        self.search_input.setEnabled(False)
+
+        tools_layout = QHBoxLayout()
+        tools_layout.addWidget(self.status_label)
+        tools_layout.addWidget(self.line_input)
+        tools_layout.addWidget(self.search_input)
+        view_layout = QHBoxLayout()
+        view_layout.addWidget(self.view)
+        view_layout.addWidget(self.scroll_bar)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(tools_layout)
+        layout.addLayout(view_layout)
+
+        # The line range grows while the index is built in the background
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(200)
+        self.progress_timer.timeout.connect(self.update_range)
+        self.progress_timer.start()
+        run_in_background(self.index.build, on_result=lambda _: self.update_range(), on_error=self.on_build_failed)
+        self.update_range()
+
+    def visible_lines(self):
+        return max(1, self.view.viewport().height() // self.view.fontMetrics().lineSpacing())
+
+    def update_range(self):
+        if self.index.closed or self.changed:
+            return
+        if self.index.complete:
+            self.progress_timer.stop()
+            self.search_input.setEnabled(True)
+        self.scroll_bar.setPageStep(self.visible_lines())
+        try:
+            self.scroll_bar.setMaximum(max(0, self.index.line_count() - self.visible_lines()))
+        except FileChangedError as e:
+            self.show_changed(e)
+            return
+        self.render()
+
+    def show_changed(self, error):
+        self.changed = True
+        self.progress_timer.stop()
+        self.line_input.setEnabled(False)
+        self.search_input.setEnabled(False)
+        self.status_label.setText(str(error))
+
+    def on_build_failed(self, error):
+        if not self.index.closed:
+            self.progress_timer.stop()
+            self.status_label.setText(f"Error indexing file: {error}")
+
+    def render(self):
+        if self.changed:
+            return
+        try:
+            lines = self.index.lines(self.first_line, self.visible_lines())
+            total = self.index.line_count()
+        except FileChangedError as e:
+            self.show_changed(e)
+            return
+        self.view.setPlainText("\n".join(lines))
+        suffix = "" if self.index.complete else " (indexing...)"
+        self.status_label.setText(f"Lines {self.first_line + 1}-{self.first_line + len(lines)} of {total}{suffix}")
+
+    def scroll_to(self, line):
+        self.first_line = line
+        self.render()
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Wheel:
+            self.scroll_bar.setValue(self.scroll_bar.value() - event.angleDelta().y() // 40)
+            return True
+        return super().eventFilter(obj, event)
+
+    def keyPressEvent(self, event):
+        steps = {Qt.Key.Key_PageDown: self.visible_lines(), Qt.Key.Key_PageUp: -self.visible_lines()}
+        if event.key() in steps:
+            self.scroll_bar.setValue(self.scroll_bar.value() + steps[event.key()])
+        else:
+            super().keyPressEvent(event)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_range()
+
+    def jump_to_line(self):
+        try:
+            line = int(self.line_input.text()) - 1
+        except ValueError:
+            return
+        self.scroll_bar.setValue(max(0, line))
+        self.scroll_to(self.scroll_bar.value())
+
+    def reset_search(self):
+        self.search_offset = 0
+
+    def find_next(self):
+        text = self.search_input.text()
+        if not text or self.searching:
+            return
+        self.searching = True
+        self.status_label.setText("Searching...")
+        run_in_background(self.index.find, text, self.search_offset,
+                          on_result=self.show_match, on_error=self.on_search_failed)
+
+    def on_search_failed(self, error):
+        self.searching = False
+        if not self.index.closed:
+            self.status_label.setText(f"Search failed: {error}")
+
+    def show_match(self, offset):
+        self.searching = False
+        if self.index.closed or self.changed:
+            return
+        if offset < 0:
+            # The next search starts over from the top
+            self.search_offset = 0
+            self.render()
+            self.status_label.setText(f"No more matches for \"{self.search_input.text()}\"")
+            return
+        self.search_offset = offset + 1
+        try:
+            line = self.index.line_at(offset)
+            self.scroll_bar.setValue(line)
+            self.scroll_to(line)
+            # Select the match; the line is now the top one in view unless the file ends before that
+            column = len(self.index.text(self.index.line_start(line), offset))
+        except FileChangedError as e:
+            self.show_changed(e)
+            return
+        if self.changed:
+            return
+        block = self.view.document().findBlockByNumber(line - self.first_line)
+        cursor = QTextCursor(block)
+        cursor.movePosition(QTextCursor.MoveOperation.Right, QTextCursor.MoveMode.MoveAnchor, column)
+        cursor.movePosition(QTextCursor.MoveOperation.Right, QTextCursor.MoveMode.KeepAnchor, len(self.search_input.text()))
+        self.view.setTextCursor(cursor)
+
+    def close_file(self):
+        self.progress_timer.stop()
+        self.index.close()
+
+class EditorTab(QWidget):
+    # Tab page that only holds a CodeEditor while it is the current tab. Inactive pages are
+    # stubs with the file path, the content hash and the text of unsaved edits, if any.
+    # Files of large_file_threshold bytes or more open in a LargeFileViewer instead.
+    def __init__(self, path=None, text=None, content_hash=None, large_file_threshold=None):
+        super().__init__()
+        self.path = path
+        self.text = text  # Unsaved content; None when the file on disk is the content
+        self.hash = content_hash
+        self.large_file_threshold = large_file_threshold
+        self.signature = None  # (mtime_ns, size) of the file when it was last read
+        self.editor = None
+        self.viewer = None
+
+    def load(self):
+        # Builds the editor; the file is read again only if it changed since it was last shown.
+        # Returns the text widget that is now shown.
+        if self.viewer is not None:
+            if not self.is_stale():
+                return self.viewer.view
+            self.unload()
+        if self.editor is None:
+            if self.layout() is None:
+                QVBoxLayout(self).setContentsMargins(0, 0, 0, 0)
+            if self.text is None and self.is_large():
+                self.signature = self.file_signature()
+                self.viewer = LargeFileViewer(self.path)
+                self.viewer.view.set_language(language_for_path(self.path))
+                self.layout().addWidget(self.viewer)
+                return self.viewer.view
+            self.editor = CodeEditor()
+            self.editor.set_language(language_for_path(self.path))
+            self.layout().addWidget(self.editor)
+            self.show_content()
+        elif self.text is None and self.path and not self.editor.document().isModified() and self.is_stale():
+            self.show_content()
+        return self.editor
+
+    def is_large(self):
+        signature = self.file_signature() if self.path and self.large_file_threshold else None
+        return signature is not None and signature[1] >= self.large_file_threshold
+
+    def show_content(self):
+        text = self.text if self.text is not None else self.read_file()
+        self.editor.setPlainText(text)
+        self.editor.document().setModified(False)
+
+    def unload(self):
+        if self.viewer is not None:
+            self.viewer.close_file()
+            self.viewer.deleteLater()
+            self.viewer = None
+        if self.editor is None:
+            return
+        if self.editor.document().isModified():
+            self.text = self.editor.toPlainText()
+        self.editor.deleteLater()
+        self.editor = None
+
+    def discard_edits(self):
+        self.text = None
+        self.signature = None
+        if self.editor is not None:
+            self.editor.document().setModified(False)
+
+    def unsaved_text(self):
+        if self.editor is not None and self.editor.document().isModified():
+            return self.editor.toPlainText()
+        return self.text
+
+    def is_stale(self):
+        return self.file_signature() != self.signature
+
+    def file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def read_file(self):
+        # A file that does not exist yet (e.g. one that is being generated) opens empty
+        if self.path is None or not os.path.exists(self.path):
+            self.signature = None
+            return ""
+        with open(self.path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            data = f.read()
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        self.hash = hashlib.sha1(data).hexdigest()
+        return data.decode('utf-8', errors='replace')
+
+class EditorTabs(QTabWidget):
+    # Editor tabs keyed on absolute file path, so each file is open at most once. Only the
+    # current page holds an editor; the others are EditorTab stubs loaded again when activated.
+    load_failed = pyqtSignal(str)
+
+    def __init__(self, apply_theme, large_file_threshold=None):
+        super().__init__()
+        self.apply_theme = apply_theme
+        self.large_file_threshold = large_file_threshold
+        self.pages_by_path = {}
+        self.active_page = None
+        self.setTabsClosable(True)
+        self.tabCloseRequested.connect(self.close_page)
+        self.currentChanged.connect(self.activate)
+
+    def pages(self):
+        return [self.widget(i) for i in range(self.count())]
+
+    def add_page(self, path=None, title=None, text=None, content_hash=None):
+        # Existing page for the path, or a new stub; nothing is read until it is activated
+        if path is not None:
+            path = os.path.abspath(path)
+            if path in self.pages_by_path:
+                return self.pages_by_path[path]
+        page = EditorTab(path, text, content_hash, self.large_file_threshold)
+        if path is not None:
+            self.pages_by_path[path] = page
+        self.addTab(page, title or os.path.basename(path or "") or "Untitled")
+        return page
+
+    def open_path(self, path):
+        page = self.add_page(path)
+        if self.currentWidget() is page:
+            self.load(page)
+        else:
+            self.setCurrentWidget(page)
+        return page.editor
+
+    def show_text(self, path, text):
+        # Shows generated content in the file's tab without reading the file
+        page = self.add_page(path)
+        page.text = None
+        editor = self.open_path(path)
+        if editor is not None:
+            editor.setPlainText(text)
+            editor.document().setModified(False)
+            page.signature = page.file_signature()
+        return editor
+
+    def activate(self, index):
+        page = self.widget(index)
+        if self.active_page is not None and self.active_page is not page:
+            self.active_page.unload()
+        self.active_page = page
+        if page is not None:
+            self.load(page)
+
+    def load(self, page):
+        try:
+            editor = page.load()
+        except OSError as e:
+            self.load_failed.emit(f"Error opening file {page.path}: {e}")
+            return None
+        self.apply_theme(editor)
+        return editor
+
+    def close_page(self, index):
+        page = self.widget(index)
+        if page is None:
+            return
+        if page is self.active_page:
+            self.active_page = None
+        if page.path is not None:
+            self.pages_by_path.pop(page.path, None)
+        self.removeTab(index)
+        page.unload()
+        page.deleteLater()
+
+    def clear_pages(self):
+        self.active_page = None
+        pages = self.pages()
+        self.pages_by_path.clear()
+        self.clear()
+        for page in pages:
+            page.unload()
+            page.deleteLater()
+
+class StreamingApplier(OperationPlan):
+    # Operation plan for a response that is still streaming. Each "# File:" block is shown
+    # in its tab line by line, and everything collected so far is applied as one
+    # transaction as soon as the block ends.
+    def __init__(self, window):
+        super().__init__()
+        self.window = window
+        self.full_path = None
+
+    def begin_file(self, path):
+        try:
+            self.full_path = workspace_file(self.window.workspace_path, normalize_path(path))
+        except FileOperationError:
+            # Reported when the plan is applied
+            self.full_path = None
+            return
+        with self.window.trace_span("editor"):
+            self.window.display_code_in_editor(self.full_path, "")
+
+    def page(self):
+        # The tab may have been closed or unloaded while the block was streaming
+        return self.window.code_tabs.pages_by_path.get(self.full_path)
+
+    def file_line(self, path, line):
+        page = self.page()
+        if page is not None and page.editor is not None:
+            with self.window.trace_span("editor"):
+                page.editor.appendPlainText(line)
+
+    def end_file(self, path, lines):
+        super().end_file(path, lines)
+        page = self.page()
+        if page is not None:
+            # The streamed text is not an unsaved edit; the tab reloads the written file
+            page.discard_edits()
+        self.full_path = None
+        # With previews enabled nothing is written until the whole response has been reviewed
+        if not self.window.preview_changes:
+            self.flush()
+
+    def finish(self):
+        if self.window.preview_changes:
+            self.window.preview_operation_plan(self)
+        else:
+            self.flush()
+
+    def flush(self):
+        if self:
+            self.window.apply_operation_plan(self, show_in_editor=False)
+            self.directories = []
+            self.operations = {}
+
+class PlanPreviewDialog(QDialog):
+    # Diff of every planned file change, with a checkbox per file and per hunk
+    def __init__(self, plan, changes, hunks, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Preview Changes")
+        self.resize(1000, 600)
+        self.changes = changes
+        self.hunks = hunks
+
+        layout = QVBoxLayout(self)
+        if plan.directories:
+            layout.addWidget(QLabel("Directories: " + ", ".join(plan.directories)))
+
+        self.file_tree = QTreeWidget()
+        self.file_tree.setHeaderHidden(True)
+        for change in changes:
+            file_hunks = hunks[change.path]
+            label = f"{change.path} (new file)" if change.old_text is None else f"{change.path} ({len(file_hunks)} hunks)"
+            file_item = QTreeWidgetItem([label])
+            file_item.setFlags(file_item.flags() | Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsAutoTristate)
+            file_item.setData(0, Qt.ItemDataRole.UserRole, (change.path, None))
+            if not file_hunks:
+                # e.g. a new empty file; the file row is its only checkbox
+                file_item.setCheckState(0, Qt.CheckState.Checked)
+            for index, hunk in enumerate(file_hunks):
+                hunk_item = QTreeWidgetItem([f"Hunk {index + 1}: -{hunk.old_end - hunk.old_start} +{hunk.new_end - hunk.new_start}"])
+                hunk_item.setFlags(hunk_item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+                hunk_item.setCheckState(0, Qt.CheckState.Checked)
+                hunk_item.setData(0, Qt.ItemDataRole.UserRole, (change.path, index))
+                file_item.addChild(hunk_item)
+            self.file_tree.addTopLevelItem(file_item)
+        self.file_tree.currentItemChanged.connect(self.show_diff)
+
+        self.diff_view = CodeEditor()
+        self.diff_view.setReadOnly(True)
+
+        splitter = QSplitter()
+        splitter.addWidget(self.file_tree)
+        splitter.addWidget(self.diff_view)
+        splitter.setSizes([300, 700])
+        layout.addWidget(splitter)
+
+        buttons_layout = QHBoxLayout()
+        apply_selected_button = QPushButton("Apply Selected")
+        apply_selected_button.clicked.connect(self.accept)
+        apply_all_button = QPushButton("Apply All")
+        apply_all_button.clicked.connect(self.apply_all)
+        cancel_button = QPushButton("Cancel")
+        cancel_button.clicked.connect(self.reject)
+        buttons_layout.addWidget(apply_selected_button)
+        buttons_layout.addWidget(apply_all_button)
+        buttons_layout.addWidget(cancel_button)
+        layout.addLayout(buttons_layout)
+
+        if self.file_tree.topLevelItemCount():
+            self.file_tree.setCurrentItem(self.file_tree.topLevelItem(0))
+
+    def show_diff(self, item, previous):
+        if item is None:
+            return
+        path, index = item.data(0, Qt.ItemDataRole.UserRole)
+        file_hunks = self.hunks[path]
+        selected = file_hunks if index is None else [file_hunks[index]]
+        self.diff_view.setPlainText("\n".join(hunk.text for hunk in selected))
+
+    def apply_all(self):
+        for i in range(self.file_tree.topLevelItemCount()):
+            self.file_tree.topLevelItem(i).setCheckState(0, Qt.CheckState.Checked)
+        self.accept()
+
+    def selected_changes(self):
+        selected = []
+        for i, change in enumerate(self.changes):
+            file_item = self.file_tree.topLevelItem(i)
+            file_hunks = self.hunks[change.path]
+            if not file_hunks:
+                if file_item.checkState(0) == Qt.CheckState.Checked:
+                    selected.append(change)
+                continue
+            accepted = {j for j in range(file_item.childCount())
+                        if file_item.child(j).checkState(0) == Qt.CheckState.Checked}
+            if not accepted:
+                continue
+            if len(accepted) == len(file_hunks):
+                selected.append(change)
+            else:
+                new_text = merge_hunks(change, file_hunks, accepted)
+                selected.append(FileChange(change.path, change.full_path, change.old_text, new_text, change.action))
+        return selected
+
+class ComparisonTargetsDialog(QDialog):
+    # Checklist of the models to compare: the configured comparison targets (checked) and the
+    # cached models of the current endpoint
+    def __init__(self, targets, catalog_models, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Compare Models")
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("Send the prompt to each checked model at the same time:"))
+
+        self.target_list = QListWidget()
+        known = set()
+        for target in targets:
+            self.add_target(target, True)
+            known.add((target['model'], target.get('endpoint')))
+        for model in catalog_models:
+            if (model, None) not in known:
+                self.add_target({'model': model}, False)
+        layout.addWidget(self.target_list)
+
+        buttons_layout = QHBoxLayout()
+        compare_button = QPushButton("Compare")
+        compare_button.clicked.connect(self.accept)
+        cancel_button = QPushButton("Cancel")
+        cancel_button.clicked.connect(self.reject)
+        buttons_layout.addWidget(compare_button)
+        buttons_layout.addWidget(cancel_button)
+        layout.addLayout(buttons_layout)
+
+    def add_target(self, target, checked):
+        item = QListWidgetItem(comparison_label(target))
+        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+        item.setCheckState(Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked)
+        item.setData(Qt.ItemDataRole.UserRole, target)
+        self.target_list.addItem(item)
+
+    def selected_targets(self):
+        items = (self.target_list.item(i) for i in range(self.target_list.count()))
+        return [item.data(Qt.ItemDataRole.UserRole) for item in items if item.checkState() == Qt.CheckState.Checked]
+
+def comparison_label(target):
+    endpoint = target.get('endpoint')
+    if not endpoint:
+        return target['model']
+    return f"{target['model']} @ {endpoint.split('//', 1)[-1].split('/', 1)[0]}"
+
+class ComparisonTab(QWidget):
+    # One model's reply in a comparison, with its timings once it is done
+    def __init__(self, label, apply_theme, apply_reply):
+        super().__init__()
+        self.label = label
+        self.apply_reply = apply_reply
+        self.submitted = time.perf_counter()
+        self.first_text = None
+        self.elapsed = None
+        self.timings = {}  # From the engine's measured signal, which arrives before finished
+        self.reply = ""
+
+        layout = QVBoxLayout(self)
+        self.stats_label = QLabel("Waiting for the model...")
+        layout.addWidget(self.stats_label)
+        self.view = CodeEditor()
+        self.view.setReadOnly(True)
+        apply_theme(self.view)
+        layout.addWidget(self.view)
+        self.apply_button = QPushButton("Apply This Response")
+        self.apply_button.setEnabled(False)
+        self.apply_button.clicked.connect(lambda: self.apply_reply(self.reply))
+        layout.addWidget(self.apply_button)
+
+    def append(self, text):
+        if self.first_text is None:
+            self.first_text = time.perf_counter()
+            self.stats_label.setText("Generating...")
+        cursor = self.view.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(text)
+
+    def measure(self, timings):
+        self.timings = timings
+
+    def finish(self, reply):
+        self.elapsed = time.perf_counter() - self.submitted
+        self.reply = reply
+        self.view.setPlainText(reply)
+        # The API's completion token count when it reports one; otherwise estimated from the
+        # reply length, the same way as context budgets
+        usage = self.timings.get('usage') or {}
+        tokens = usage.get('completion_tokens')
+        token_label = f"{tokens} tokens"
+        if tokens is None:
+            tokens = estimate_tokens(reply)
+            token_label = f"~{tokens} tokens"
+        # The rate covers generation only: from the first text (the headers of a reply that
+        # was not streamed) to the end, so queueing and prompt processing do not dilute it
+        generation_started = self.timings.get('first_text', self.timings.get('headers'))
+        if generation_started is not None and 'finished' in self.timings:
+            generating = self.timings['finished'] - generation_started
+        else:
+            generating = self.elapsed
+        stats = [f"latency {self.elapsed:.2f} s"]
+        if self.first_text is not None:
+            stats.append(f"first token {self.first_text - self.submitted:.2f} s")
+        stats.append(token_label)
+        stats.append(f"{tokens / generating if generating > 0 else 0:.1f} tokens/s")
+        stats.append(f"{len(reply.encode('utf-8'))} bytes")
+        self.stats_label.setText(", ".join(stats))
+        self.apply_button.setEnabled(bool(reply))
+
+    def fail(self, message):
+        self.elapsed = time.perf_counter() - self.submitted
+        self.stats_label.setText(f"{message} after {self.elapsed:.2f} s")
+
+class ComparisonWindow(QDialog):
+    # Replies of one prompt sent to several models at once, in side-by-side tabs. The requests
+    # run in parallel, so the run takes as long as the slowest model.
+    def __init__(self, engine, apply_theme, apply_reply, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Model Comparison")
+        self.resize(1000, 700)
+        self.engine = engine
+        self.apply_theme = apply_theme
+        self.apply_reply = apply_reply
+        self.started = time.perf_counter()
+        self.tabs_by_job = {}
+        self.running = set()
+
+        layout = QVBoxLayout(self)
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+        self.tabs = QTabWidget()
+        layout.addWidget(self.tabs)
+
+    def add_run(self, job_id, label):
+        tab = ComparisonTab(label, self.apply_theme, self.apply_reply)
+        self.tabs_by_job[job_id] = tab
+        self.running.add(job_id)
+        self.tabs.addTab(tab, label)
+        self.update_summary()
+
+    def on_chunk(self, job_id, text):
+        self.tabs_by_job[job_id].append(text)
+
+    def on_measured(self, job_id, timings):
+        self.tabs_by_job[job_id].measure(timings)
+
+    def on_finished(self, job_id, reply):
+        tab = self.tabs_by_job[job_id]
+        tab.finish(reply)
+        self.end_run(job_id, f"{tab.label} ({tab.elapsed:.1f} s)")
+
+    def on_failed(self, job_id, error):
+        tab = self.tabs_by_job[job_id]
+        tab.fail(f"Failed: {error}")
+        self.end_run(job_id, f"{tab.label} (failed)")
+
+    def on_cancelled(self, job_id):
+        tab = self.tabs_by_job[job_id]
+        tab.fail("Cancelled")
+        self.end_run(job_id, f"{tab.label} (cancelled)")
+
+    def end_run(self, job_id, title):
+        self.running.discard(job_id)
+        self.tabs.setTabText(self.tabs.indexOf(self.tabs_by_job[job_id]), title)
+        self.update_summary()
+
+    def update_summary(self):
+        done = [tab for tab in self.tabs_by_job.values() if tab.elapsed is not None]
+        if self.running:
+            self.summary_label.setText(f"{len(done)} of {len(self.tabs_by_job)} models done")
+            return
+        wall_time = time.perf_counter() - self.started
+        self.summary_label.setText(
+            f"{len(done)} models in {wall_time:.2f} s "
+            f"(sum of latencies {sum(tab.elapsed for tab in done):.2f} s)"
+        )
+
+    def done(self, result):
+        # Closing the window cancels the requests that are still running
+        for job_id in list(self.running):
+            self.engine.cancel(job_id)
+        super().done(result)
+
+class MetricsWindow(QDialog):
+    # Timings of recent requests, newest first, and p50/p95 per endpoint, model and phase
+    def __init__(self, tracer, metrics_file, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Request Metrics")
+        self.resize(1100, 650)
+        self.tracer = tracer
+        self.metrics_file = metrics_file
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("p50 / p95 of the last requests per endpoint and model (ms):"))
+        self.summary_table = self.make_table(["Endpoint", "Model", "Phase", "Requests", "p50", "p95"])
+        layout.addWidget(self.summary_table)
+        layout.addWidget(QLabel("Recent requests (ms):"))
+        self.trace_columns = PHASES + ("total",)
+        self.trace_table = self.make_table(
+            ["Time", "Model", "Status"] + [PHASE_LABELS[phase] for phase in self.trace_columns] + ["Tokens", "Tokens/s"]
+        )
+        layout.addWidget(self.trace_table)
+
+        buttons_layout = QHBoxLayout()
+        export_trace_button = QPushButton("Export Trace...")
+        export_trace_button.clicked.connect(self.export_trace)
+        export_metrics_button = QPushButton("Export Metrics...")
+        export_metrics_button.clicked.connect(self.export_metrics)
+        buttons_layout.addWidget(export_trace_button)
+        buttons_layout.addWidget(export_metrics_button)
+        layout.addLayout(buttons_layout)
+
+    @staticmethod
+    def make_table(headers):
+        table = QTableWidget(0, len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        return table
+
+    @staticmethod
+    def fill_table(table, rows):
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                table.setItem(row, column, QTableWidgetItem(value))
+
+    def refresh(self):
+        summary = []
+        for endpoint, model, phase, count, p50, p95 in self.tracer.summary():
+            if phase == "tokens_per_second":
+                summary.append([endpoint, model, "Tokens/s", str(count), f"{p50:.1f}", f"{p95:.1f}"])
+            else:
+                summary.append([endpoint, model, PHASE_LABELS[phase], str(count), f"{p50 * 1000:.1f}", f"{p95 * 1000:.1f}"])
+        self.fill_table(self.summary_table, summary)
+
+        traces = []
+        for trace in reversed(self.tracer.recent_traces()):
+            measured = dict(trace['phases'], total=trace['total'])
+            tokens = f"{trace['prompt_tokens']} / {trace['completion_tokens']}"
+            if trace['tokens_estimated']:
+                tokens = f"~{tokens}"
+            traces.append(
+                [time.strftime("%H:%M:%S", time.localtime(trace['started_at'])), trace['model'], trace['status']]
+                + [f"{measured[phase] * 1000:.1f}" if phase in measured else "" for phase in self.trace_columns]
+                + [tokens, f"{trace['tokens_per_second']:.1f}" if trace['tokens_per_second'] else ""]
+            )
+        self.fill_table(self.trace_table, traces)
+
+    def export_trace(self):
+        file_name, _ = QFileDialog.getSaveFileName(self, "Export Trace", "traces.jsonl", "JSON Lines (*.jsonl)")
+        if file_name:
+            try:
+                self.tracer.export(file_name)
+            except OSError as e:
+                QMessageBox.warning(self, "Export Trace", f"Failed to export the trace: {e}")
+
+    def export_metrics(self):
+        file_name, _ = QFileDialog.getSaveFileName(
+            self, "Export Metrics", self.metrics_file or METRICS_FILE, "Prometheus Text (*.prom)")
+        if file_name:
+            try:
+                self.tracer.write_metrics(file_name)
+            except OSError as e:
+                QMessageBox.warning(self, "Export Metrics", f"Failed to export the metrics: {e}")
+
+class WorkspaceFilterProxy(QSortFilterProxyModel):
+    # Hides ignored entries (VCS metadata, dependencies, caches) from the workspace tree
+    def __init__(self, ignore_patterns, parent=None):
+        super().__init__(parent)
+        self.ignore_patterns = list(ignore_patterns)
+        self.root_path = None
+
+    def set_root(self, path):
+        self.root_path = os.path.normcase(os.path.abspath(path))
+        self.invalidateFilter()
+
+    def is_below_root(self, path):
+        if self.root_path is None:
+            return True
+        return os.path.normcase(os.path.abspath(path)).startswith(self.root_path.rstrip(os.sep) + os.sep)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        # The root and its ancestors are always shown, so a workspace inside e.g. a "build" or
+        # "venv" directory is not hidden along with it
+        index = self.sourceModel().index(source_row, 0, source_parent)
+        if not self.is_below_root(self.sourceModel().filePath(index)):
+            return True
+        name = self.sourceModel().fileName(index)
+        return not any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore_patterns)
+
+class WorkspaceWatcher(QObject):
+    # Keeps a WorkspaceIndex current from QFileSystemWatcher directory events.
+    # Events are debounced and applied to the changed directories only, on a worker thread.
+    # Directory events miss files written in place (e.g. appended to), so readers that find
+    # an entry out of date report it through report_stale.
+    stale = pyqtSignal(str)
+
+    def __init__(self, index, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.pending = set()
+        self.busy = False
+        self.closed = False
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.notify)
+        self.stale.connect(self.notify)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(250)
+        self.timer.timeout.connect(self.flush)
+
+    def start(self):
+        # Directories known from the last session are watched right away; a full
+        # reconcile then catches up with anything that changed while the app was closed
+        self.watch_directories()
+        self.busy = True
+        run_in_background(self.index.refresh, on_result=self.on_updated, on_error=self.on_update_failed)
+
+    def watch_directories(self):
+        paths = {os.path.join(self.index.root, rel_dir) if rel_dir else self.index.root
+                 for rel_dir in self.index.directories()}
+        new_paths = paths - set(self.watcher.directories())
+        if new_paths:
+            self.watcher.addPaths(sorted(new_paths))
+
+    def notify(self, *paths):
+        self.pending.update(paths)
+        self.timer.start()
+
+    def report_stale(self, path):
+        # Safe from any thread; the signal is delivered on the watcher's thread
+        self.stale.emit(path)
+
+    def flush(self):
+        if self.busy or self.closed:
+            return
+        paths, self.pending = self.pending, set()
+        self.busy = True
+        run_in_background(self.index.update_paths, paths, on_result=self.on_updated, on_error=self.on_update_failed)
+
+    def on_updated(self, changed):
+        self.busy = False
+        if self.closed:
+            self.index.close()
+            return
+        if changed:
+            self.watch_directories()
+        if self.pending:
+            self.timer.start()
+
+    def on_update_failed(self, error):
+        self.on_updated(0)
+
+    def close(self):
+        self.closed = True
+        self.timer.stop()
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+        if not self.busy:
+            self.index.close()
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    # Per-request metrics reported by the API client, possibly from a worker thread
+    api_metrics = pyqtSignal(dict)
+
+    def __init__(self, startup_profile=None):
         super().__init__()
+        self.startup_profile = startup_profile
 
         # Initialize reference lists and configurations
         self.url_references = []
@@ -38,20 +1122,96 @@ class MainWindow(QMainWindow):
 
         # Initialize workspace status
         self.workspace_path = None
-        self.default_main_prompt = "Your default main prompt here."
+        self.default_main_prompt = DEFAULT_MAIN_PROMPT
         self.current_main_prompt = self.default_main_prompt
 
         # Load initial configuration
         self.load_config()
+        self.mark_startup("config load")
+
+        # Pooled API client shared by all requests, created on first use so startup does not
+        # pay for importing the networking stack
+        self.api_metrics.connect(self.log_api_metrics)
+        self.api_client = None
+
+        # Model lists cached per endpoint and revalidated in the background
+        self.model_catalog = ModelCatalog(MODELS_CACHE_FILE, max_age=self.models_cache_max_age)
+
+        # Workspace context for prompts, re-reading only files that changed
+        self.context_packer = ContextPacker()
+
+        # Background fetcher for URL references, created when the first URL is needed
+        self.url_fetcher = None
+
+        # Text extraction for file references in worker processes, started with the first file
+        self.document_extractor = None
+
+        # Persistent index of the workspace files, kept current by a directory watcher
+        self.workspace_index = None
+        self.workspace_watcher = None
+
+        # Incremental parsers for responses that are being streamed
+        self.stream_parsers = {}
+
+        # Cache of replies for identical requests, keyed per pending job until it completes
+        self.response_cache = ResponseCache(
+            RESPONSE_CACHE_DIR,
+            max_entries=self.response_cache_max_entries,
+            max_bytes=self.response_cache_max_bytes,
+            ttl=self.response_cache_ttl
+        )
+        self.pending_cache_keys = {}
+        # Chat mode: the conversation of each workspace, and the turn each request in flight adds to it
+        self.chat_histories = {}  # workspace path -> ChatHistory
+        self.pending_chat_turns = {}  # job id -> (workspace path, user message)
+
+        # Background engine that runs completion requests off the GUI thread
+        self.completion_engine = CompletionEngine(self, max_workers=self.max_concurrent_requests)
+        self.completion_engine.started.connect(self.on_completion_started)
+        self.completion_engine.chunk.connect(self.on_completion_chunk)
+        self.completion_engine.finished.connect(self.on_completion_finished)
+        self.completion_engine.failed.connect(self.on_completion_failed)
+        self.completion_engine.cancelled.connect(self.on_completion_cancelled)
+        self.completion_engine.measured.connect(self.on_completion_measured)
+
+        # Timing spans of each request, written to a JSONL trace file and a Prometheus textfile
+        self.tracer = Tracer(self.trace_file or None, self.metrics_file or None)
+        self.traces = {}  # job id -> Trace of a request in flight
+        self.active_trace = None  # Trace of the reply being handled on the GUI thread
+        self.metrics_window = None
+
+        # Separate engine for model comparisons, sized to run every compared model at once
+        self.comparison_engine = CompletionEngine(self)
+        self.comparison_engine.chunk.connect(lambda job_id, text: self.dispatch_comparison(job_id, 'on_chunk', text))
+        self.comparison_engine.measured.connect(
+            lambda job_id, timings: self.dispatch_comparison(job_id, 'on_measured', timings))
+        self.comparison_engine.finished.connect(lambda job_id, reply: self.dispatch_comparison(job_id, 'on_finished', reply, done=True))
+        self.comparison_engine.failed.connect(lambda job_id, error: self.dispatch_comparison(job_id, 'on_failed', error, done=True))
+        self.comparison_engine.cancelled.connect(lambda job_id: self.dispatch_comparison(job_id, 'on_cancelled', done=True))
+        self.comparison_runs = {}  # job id -> ComparisonWindow
+        self.comparison_clients = {}  # (endpoint, api key) -> ApiClient for targets on other endpoints
+
+        # Periodic autosave of the workflow; only sections that changed are encoded again
+        self.autosave_writer = WorkflowWriter(AUTOSAVE_WORKFLOW_FILE)
+        self.autosave_running = False
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.timeout.connect(self.autosave_workflow)
+        if self.workflow_autosave_interval > 0:
+            self.autosave_timer.start(self.workflow_autosave_interval * 1000)
+        self.mark_startup("services")
 
         # Main widget and layout
         main_widget = QWidget()
         main_layout = QHBoxLayout(main_widget)
 
-        # Prompt management
-        self.prompt_tree = PromptTree()
+        # Prompt management, backed by the on-disk prompt library
+        self.prompt_library = PromptLibrary(PROMPT_LIBRARY_FILE)
+        self.prompt_tree = PromptTree(self.prompt_library)
         self.prompt_tree.setSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Expanding)
         self.prompt_tree.itemDoubleClicked.connect(self.populate_input_from_prompt)
+        self.prompt_search = QLineEdit()
+        self.prompt_search.setPlaceholderText("Search prompts")
+        self.prompt_search.textChanged.connect(self.prompt_tree.filter)
 
         # Buttons for managing prompts
         prompt_buttons_layout = QHBoxLayout()
@@ -81,23 +1241,48 @@ class MainWindow(QMainWindow):
         send_button = QPushButton("Send")
         send_button.clicked.connect(self.send_command)
 
-        # File system model for workspace
-        self.model = QFileSystemModel()
-        self.model.setRootPath(QDir.rootPath())
+        # Cancel button for queued and in-flight requests
+        cancel_button = QPushButton("Cancel")
+        cancel_button.clicked.connect(self.cancel_commands)
+        # Toggle for replaying cached responses instead of calling the model
+        self.cache_checkbox = QCheckBox("Use Cache")
+        self.cache_checkbox.setChecked(self.use_response_cache)
+        self.cache_checkbox.stateChanged.connect(lambda: self.toggle_response_cache(self.cache_checkbox.isChecked()))
+
+        # Sends the prompt to several models at once and compares the replies
+        compare_button = QPushButton("Compare")
+        compare_button.clicked.connect(self.compare_models)
+
+        send_buttons_layout = QHBoxLayout()
+        send_buttons_layout.addWidget(send_button)
+        send_buttons_layout.addWidget(compare_button)
+        send_buttons_layout.addWidget(cancel_button)
+        send_buttons_layout.addWidget(self.cache_checkbox)
+
+        # Toggle for reviewing file changes before they are written
+        self.preview_checkbox = QCheckBox("Preview Changes")
+        self.preview_checkbox.setChecked(self.preview_changes)
+        self.preview_checkbox.stateChanged.connect(lambda: self.toggle_preview_changes(self.preview_checkbox.isChecked()))
+        send_buttons_layout.addWidget(self.preview_checkbox)
+
+        # File system model for workspace, created once a workspace is chosen (see set_tree_root).
+        # Directories are populated lazily as they are expanded.
+        self.model = None
+        self.tree_proxy = WorkspaceFilterProxy(self.tree_ignore_patterns, self)
         self.tree_view = QTreeView()
-        self.tree_view.setModel(self.model)
+        self.tree_view.setModel(self.tree_proxy)
         self.tree_view.setSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Expanding)
         self.tree_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.tree_view.customContextMenuRequested.connect(self.workspace_context_menu)
         self.tree_view.doubleClicked.connect(self.open_file_from_tree)
 
         # Tabs for code files
-        self.code_tabs = QTabWidget()
-        self.code_tabs.setTabsClosable(True)
-        self.code_tabs.tabCloseRequested.connect(self.close_tab)
+        self.code_tabs = EditorTabs(self.apply_dark_theme, self.large_file_threshold)
+        self.code_tabs.load_failed.connect(self.log_to_terminal)
 
         # Terminal output
-        self.terminal_output = TerminalOutput()
+        terminal_log = RotatingLog(TERMINAL_LOG_FILE, self.terminal_log_max_bytes, self.terminal_log_backups)
+        self.terminal_output = TerminalOutput(terminal_log, self.terminal_max_lines)
 
         # Layout adjustments
         input_layout = QVBoxLayout()
@@ -105,10 +1290,11 @@ class MainWindow(QMainWindow):
         input_layout.addWidget(self.main_prompt_input)
         input_layout.addWidget(main_prompt_button)
         input_layout.addWidget(reset_prompt_button)
+        input_layout.addWidget(self.prompt_search)
         input_layout.addWidget(self.prompt_tree)
         input_layout.addLayout(prompt_buttons_layout)
         input_layout.addWidget(self.text_input_window)
-        input_layout.addWidget(send_button)
+        input_layout.addLayout(send_buttons_layout)
 
         workspace_layout = QVBoxLayout()
         workspace_layout.addWidget(self.tree_view)
@@ -127,9 +1313,26 @@ class MainWindow(QMainWindow):
 
         # Set up toolbar
         self.setup_toolbar()
-
+        self.mark_startup("widget build")
+
+        # A workspace is asked for once the window has been painted (see on_first_paint)
+        self.first_paint_watcher = FirstPaintWatcher(main_widget)
+        self.first_paint_watcher.painted.connect(self.on_first_paint)
+
+    def mark_startup(self, phase):
+        if self.startup_profile is not None:
+            self.startup_profile.mark(phase)
+
+    def on_first_paint(self):
+        if self.startup_profile is not None:
+            self.startup_profile.mark("first paint")
+            self.startup_profile.report()
+            self.startup_profile = None
+        # Import the networking stack while the user picks a workspace
+        run_in_background(import_module, "api_client")
         # Ensure a workspace is created at startup
-        self.create_workspace()
+        if not self.workspace_path:
+            self.create_workspace()
 
     def setup_toolbar(self):
         # Create toolbar
@@ -173,6 +1376,18 @@ class MainWindow(QMainWindow):
         add_url_file_action.triggered.connect(self.open_url_file_management)
         toolbar.addAction(add_url_file_action)
 
+        # Request timings
+        metrics_action = QAction("Metrics", self)
+        metrics_action.setStatusTip("Show request timings and token rates")
+        metrics_action.triggered.connect(self.open_metrics_window)
+        toolbar.addAction(metrics_action)
+
+        # Start over with an empty chat history
+        new_conversation_action = QAction("New Conversation", self)
+        new_conversation_action.setStatusTip("Forget the earlier requests of this workspace (chat completions mode)")
+        new_conversation_action.triggered.connect(self.new_conversation)
+        toolbar.addAction(new_conversation_action)
+
     def workspace_context_menu(self, position):
         index = self.tree_view.indexAt(position)
         if not index.isValid():
@@ -185,15 +1400,15 @@ class MainWindow(QMainWindow):
         menu.exec(self.tree_view.viewport().mapToGlobal(position))
 
     def remove_file_or_directory(self, index):
-        file_path = self.model.filePath(index)
+        file_path = self.tree_file_path(index)
         if os.path.isdir(file_path):
             shutil.rmtree(file_path)
             self.log_to_terminal(f"Directory removed: {file_path}")
         else:
             os.remove(file_path)
             self.log_to_terminal(f"File removed: {file_path}")
-        self.model.setRootPath(QDir.rootPath())
-        self.tree_view.setRootIndex(self.model.index(self.workspace_path))
+        # The model watches the directories it has loaded, so the tree updates by itself
+        self.notify_workspace_changed([file_path])
 
     def open_url_file_management(self):
         dialog = QDialog(self)
@@ -247,6 +1462,8 @@ class MainWindow(QMainWindow):
         if url:
             self.url_references.append(url)
             url_list.addItem(QListWidgetItem(url))
+            # Fetch right away, so the content is ready by the time a command is sent
+            self.prefetch_urls([url])
 
     def remove_selected(self, list_widget, reference_list):
         for item in list_widget.selectedItems():
@@ -255,6 +1472,36 @@ class MainWindow(QMainWindow):
 
     def toggle_urls(self, use):
         self.use_urls = use
+        if use:
+            self.prefetch_urls(self.url_references)
+
+    def get_url_fetcher(self):
+        if self.url_fetcher is None:
+            from url_fetcher import UrlFetcher
+            self.url_fetcher = UrlFetcher(
+                URL_CACHE_DIR,
+                max_workers=self.url_fetch_workers,
+                timeout=self.url_fetch_timeout,
+                max_age=self.url_cache_max_age
+            )
+        return self.url_fetcher
+
+    def prefetch_urls(self, urls):
+        if urls:
+            self.get_url_fetcher().fetch_all(urls, on_done=self.on_url_fetched)
+
+    def on_url_fetched(self, url, entry, error):
+        # Runs on a fetcher thread; log_to_terminal is thread-safe
+        if error is not None:
+            self.log_to_terminal(f"Error fetching {url}: {error}")
+        elif entry['elapsed'] is None:
+            return  # Served from the cache
+        elif entry.get('text') is None:
+            self.log_to_terminal(f"Fetched {url}, but its content ({entry.get('content_type')}) has no text to use.")
+        elif entry.get('revalidated'):
+            self.log_to_terminal(f"Revalidated {url}: not modified ({entry['elapsed'] * 1000:.0f} ms).")
+        else:
+            self.log_to_terminal(f"Fetched {url} ({entry['bytes'] / 1024:.1f} KB in {entry['elapsed'] * 1000:.0f} ms).")
 
     def add_file(self, file_list):
         options = QFileDialog.Options()
@@ -262,9 +1509,35 @@ class MainWindow(QMainWindow):
         for file in files:
             self.file_references.append(file)
             file_list.addItem(QListWidgetItem(file))
+        # Extract right away, so the text is ready by the time a command is sent
+        self.extract_documents(files)
 
     def toggle_files(self, use):
         self.use_files = use
+        if use:
+            self.extract_documents(self.file_references)
+
+    def get_document_extractor(self):
+        if self.document_extractor is None:
+            from document_extractor import DocumentExtractor
+            self.document_extractor = DocumentExtractor(DOCUMENT_CACHE_DIR, max_workers=self.document_workers)
+        return self.document_extractor
+
+    def extract_documents(self, paths):
+        extractor = self.get_document_extractor() if paths else None
+        for path in paths:
+            if extractor.chunks(path) is None:
+                extractor.extract(path, on_done=self.on_document_extracted)
+
+    def on_document_extracted(self, path, chunks, from_cache, error):
+        # Runs on a pool thread; log_to_terminal is thread-safe
+        name = os.path.basename(path)
+        if error is not None:
+            self.log_to_terminal(f"Error extracting text from {name}: {error}")
+        elif from_cache:
+            self.log_to_terminal(f"Text of {name} loaded from the cache ({len(chunks)} chunks).")
+        else:
+            self.log_to_terminal(f"Extracted text from {name} ({len(chunks)} chunks).")
 
     def create_workspace(self):
         # Prompt for a new workspace directory
@@ -272,10 +1545,34 @@ class MainWindow(QMainWindow):
         if ok and workspace_name:
             os.makedirs(workspace_name, exist_ok=True)
             self.workspace_path = os.path.abspath(workspace_name)
-            self.model.setRootPath(self.workspace_path)
-            self.tree_view.setRootIndex(self.model.index(self.workspace_path))
+            self.set_tree_root(self.workspace_path)
+            self.prepare_workspace()
             self.log_to_terminal(f"Workspace '{workspace_name}' created.")
 
+    def prepare_workspace(self):
+        if self.workspace_path and recover_journal(self.workspace_path):
+            self.log_to_terminal("Rolled back file operations that were interrupted in the last session.")
+        self.open_workspace_index()
+
+    def open_workspace_index(self):
+        if self.workspace_watcher is not None:
+            self.workspace_watcher.close()
+            self.workspace_watcher = None
+        self.workspace_index = None
+        if not self.workspace_path or not os.path.isdir(self.workspace_path):
+            return
+        try:
+            self.workspace_index = WorkspaceIndex(self.workspace_path)
+        except (OSError, sqlite3.Error) as e:
+            self.log_to_terminal(f"Error opening workspace index: {e}")
+            return
+        self.workspace_watcher = WorkspaceWatcher(self.workspace_index, self)
+        self.workspace_watcher.start()
+
+    def notify_workspace_changed(self, paths):
+        if self.workspace_watcher is not None and paths:
+            self.workspace_watcher.notify(*paths)
+
     def set_main_prompt(self):
         self.current_main_prompt = self.main_prompt_input.text()
 
@@ -305,9 +1602,11 @@ class MainWindow(QMainWindow):
         dialog_layout.addWidget(key_label)
         dialog_layout.addWidget(key_input)
 
-        # Dropdown for models
+        # Dropdown for models, filled instantly from the cached catalogue
         model_label = QLabel("Select Model:")
         model_dropdown = QComboBox()
+        self.populate_model_dropdown(model_dropdown, self.model_catalog.models(self.api_endpoint_models),
+                                     self.api_endpoint_models)
         dialog_layout.addWidget(model_label)
         dialog_layout.addWidget(model_dropdown)
 
@@ -316,40 +1615,76 @@ class MainWindow(QMainWindow):
         refresh_button.clicked.connect(lambda: self.refresh_models(endpoint_input.text(), key_input.text(), model_dropdown))
         dialog_layout.addWidget(refresh_button)
 
+        # Streaming toggle
+        stream_checkbox = QCheckBox("Stream responses")
+        stream_checkbox.setChecked(self.stream_responses)
+        dialog_layout.addWidget(stream_checkbox)
+
+        # Chat completions toggle
+        chat_checkbox = QCheckBox("Use chat completions (keeps a conversation per workspace)")
+        chat_checkbox.setChecked(self.api_mode == "chat")
+        dialog_layout.addWidget(chat_checkbox)
+
         # Save button
         save_button = QPushButton("Save Configuration")
-        save_button.clicked.connect(lambda: self.save_configuration(endpoint_input.text(), key_input.text(), model_dropdown.currentText()))
+        save_button.clicked.connect(lambda: self.save_configuration(
+            endpoint_input.text(), key_input.text(), model_dropdown.currentText(), stream_checkbox.isChecked(),
+            "chat" if chat_checkbox.isChecked() else "completions"
+        ))
         dialog_layout.addWidget(save_button)
 
         dialog.setLayout(dialog_layout)
+
+        # Revalidate a stale catalogue in the background while the dialog is open
+        if self.model_catalog.is_stale(self.api_endpoint_models):
+            self.refresh_models(self.api_endpoint_models, self.api_key, model_dropdown)
         dialog.exec()
 
     def refresh_models(self, endpoint, api_key, dropdown):
-        # Headers setup
-        headers = {}
-        if api_key:
-            headers["Authorization"] = f"Bearer {api_key}"
+        # Revalidate the model catalogue off the GUI thread; the dropdown updates when it is done
+        run_in_background(
+            self.model_catalog.revalidate, self.get_api_client(), endpoint, api_key,
+            on_result=lambda result: self.on_models_refreshed(dropdown, endpoint, *result),
+            on_error=lambda error: self.on_models_refresh_failed(dropdown, error)
+        )
 
-        # Fetch and list models using requests
-        try:
-            response = requests.get(endpoint, headers=headers)
-            response.raise_for_status()
-            models = response.json().get('data', [])
-            dropdown.clear()
-            for model in models:
-                dropdown.addItem(model['id'])
-            if models:  # Automatically select the first model if available
-                dropdown.setCurrentIndex(0)
-        except Exception as e:
-            dropdown.clear()
-            dropdown.addItem(f"Error: {str(e)}")
-
-    def save_configuration(self, endpoint, api_key, selected_model):
+    def on_models_refreshed(self, dropdown, endpoint, models, changed):
+        # An unchanged catalogue still has to be shown if the dropdown lists another endpoint's
+        if changed or dropdown.count() == 0 or dropdown.property("endpoint") != endpoint:
+            self.populate_model_dropdown(dropdown, models, endpoint)
+
+    def on_models_refresh_failed(self, dropdown, error):
+        self.log_to_terminal(f"Error refreshing models: {error}")
+        if dropdown.count() == 0:
+            dropdown.addItem(f"Error: {error}")
+
+    def populate_model_dropdown(self, dropdown, models, endpoint):
+        # One batched update instead of an addItem call per model. The dropdown remembers
+        # which endpoint the models came from.
+        dropdown.setProperty("endpoint", endpoint)
+        current = dropdown.currentText() or self.selected_model
+        if current and current not in models and not current.startswith("Error:"):
+            models = [current] + models
+        dropdown.setUpdatesEnabled(False)
+        dropdown.clear()
+        dropdown.addItems(models)
+        index = dropdown.findText(current)
+        dropdown.setCurrentIndex(max(index, 0))
+        dropdown.setUpdatesEnabled(True)
+
+    def save_configuration(self, endpoint, api_key, selected_model, stream_responses, api_mode="completions"):
         self.api_endpoint_models = endpoint
         self.api_endpoint_completions = endpoint.replace("/v1/models", "/v1/completions")
+        self.api_endpoint_chat = endpoint.replace("/v1/models", "/v1/chat/completions")
         self.api_key = api_key
         self.selected_model = selected_model
+        self.stream_responses = stream_responses
+        self.api_mode = api_mode
         self.save_config()
+        if self.api_client is not None:
+            self.api_client.close()
+            self.api_client = None
+        self.close_comparison_clients()
         QMessageBox.information(self, "Configuration Saved", "API configuration has been saved successfully.")
 
     def open_main_prompt_management(self):
@@ -357,10 +1692,18 @@ class MainWindow(QMainWindow):
         dialog.setWindowTitle("Manage Main Prompts")
 
         dialog_layout = QVBoxLayout()
+        # Only a page of prompts is loaded; the search box (starting from the main window's
+        # search) queries the library for the rest
+        search = QLineEdit(self.prompt_search.text())
+        search.setPlaceholderText("Search prompts")
         main_prompt_list = QListWidget()
-        main_prompt_list.addItems(self.prompt_tree.get_prompt_list())
+        limit_label = QLabel(f"Showing the first {MAIN_PROMPT_LIMIT} prompts; search to find others.")
+        search.textChanged.connect(lambda text: self.load_main_prompts(main_prompt_list, limit_label, text))
+        self.load_main_prompts(main_prompt_list, limit_label, search.text())
         main_prompt_list.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        dialog_layout.addWidget(search)
         dialog_layout.addWidget(main_prompt_list)
+        dialog_layout.addWidget(limit_label)
 
         button_layout = QHBoxLayout()
         add_button = QPushButton("+")
@@ -376,19 +1719,35 @@ class MainWindow(QMainWindow):
         dialog.setLayout(dialog_layout)
         dialog.exec()
 
+    def load_main_prompts(self, main_prompt_list, limit_label, query):
+        main_prompt_list.clear()
+        prompts = self.prompt_tree.get_prompt_list(query, MAIN_PROMPT_LIMIT)
+        for prompt_id, text in prompts:
+            item = QListWidgetItem(text)
+            item.setData(Qt.ItemDataRole.UserRole, prompt_id)
+            main_prompt_list.addItem(item)
+        limit_label.setVisible(len(prompts) >= MAIN_PROMPT_LIMIT)
+
     def add_main_prompt(self, main_prompt_list):
         text, ok = QInputDialog.getText(self, "Add Main Prompt", "Enter your main prompt:")
         if ok and text:
-            main_prompt_list.addItem(text)
-            self.prompt_tree.add_prompt_to_tree(QTreeWidgetItem([text]))
+            item = QListWidgetItem(text)
+            item.setData(Qt.ItemDataRole.UserRole, self.prompt_tree.add_prompt(text))
+            main_prompt_list.addItem(item)
 
     def remove_main_prompt(self, main_prompt_list):
         selected_items = main_prompt_list.selectedItems()
         if not selected_items:
             return
+        removed = False
         for item in selected_items:
-            self.prompt_tree.main_prompts.remove(item.text())
-            main_prompt_list.takeItem(main_prompt_list.row(item))
+            # By id: other prompts with the same text, e.g. in folders, stay. The row stays
+            # when nothing was deleted, e.g. because the prompt was removed elsewhere.
+            if self.prompt_library.remove_prompt(item.data(Qt.ItemDataRole.UserRole)):
+                main_prompt_list.takeItem(main_prompt_list.row(item))
+                removed = True
+        if removed:
+            self.prompt_tree.refresh()
 
     def set_prompt_from_list(self, main_prompt_list):
         current_item = main_prompt_list.currentItem()
@@ -410,133 +1769,490 @@ class MainWindow(QMainWindow):
             return
 
         # Prepare to send the command to the selected AI model
-        headers = {}
-        if self.api_key:
-            headers["Authorization"] = f"Bearer {self.api_key}"
+        chat = self.api_mode == "chat"
+        endpoint = self.api_endpoint_chat if chat else self.api_endpoint_completions
+        trace = self.tracer.start(endpoint, self.selected_model, self.stream_responses)
+        with trace.span("prompt"):
+            if chat:
+                # The system message and the earlier turns are sent unchanged, as a prefix the server can reuse
+                user_message = self.build_chat_user_message(user_input)
+                system_prompt = build_system_prompt(self.current_main_prompt, self.workspace_path)
+                messages = self.chat_history().messages(system_prompt, user_message)
+                prompt = json.dumps(messages)
+            else:
+                prompt = self.modify_prompt_for_structure(user_input)
+        trace.prompt_chars = len(prompt)
+        cache_key = ResponseCache.make_key(self.selected_model, prompt, self.max_tokens, endpoint)
+        if self.use_response_cache:
+            reply = self.replay_cached_response(cache_key, trace)
+            if reply is not None:
+                if chat:
+                    self.chat_history().add(user_message, reply)
+                self.text_input_window.clear()
+                return
+
+        if chat:
+            payload = build_chat_payload(self.selected_model, messages, self.max_tokens, self.stream_responses)
+        else:
+            payload = build_payload(self.selected_model, prompt, self.max_tokens, self.stream_responses)
+        job_id = self.completion_engine.submit(self.get_api_client(), payload)
+        self.pending_cache_keys[job_id] = cache_key
+        if chat:
+            self.pending_chat_turns[job_id] = (self.workspace_path, user_message)
+        self.traces[job_id] = trace
+        self.log_to_terminal(f"Request #{job_id} queued for model {self.selected_model}.")
+        self.text_input_window.clear()  # Clear the text input after sending
+
+    def compare_models(self):
+        if not self.workspace_path:
+            self.text_input_window.append("Please create a workspace first.")
+            return
 
-        try:
-            response = requests.post(
-                self.api_endpoint_completions,
-                headers=headers,
-                json={
-                    "model": self.selected_model,
-                    "prompt": self.modify_prompt_for_structure(user_input),
-                    "max_tokens": 1500
-                }
+        user_input = self.text_input_window.toPlainText().strip()
+        if not user_input:
+            self.text_input_window.append("Please enter a command.")
+            return
+
+        targets = self.comparison_targets or ([{'model': self.selected_model}] if self.selected_model else [])
+        dialog = ComparisonTargetsDialog(targets, self.model_catalog.models(self.api_endpoint_models), self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        targets = dialog.selected_targets()
+        if not targets:
+            self.log_to_terminal("No models selected for comparison.")
+            return
+        self.comparison_targets = targets
+        self.save_config()
+
+        # One prompt for every model, so the replies differ only by model
+        prompt = self.modify_prompt_for_structure(user_input)
+        window = ComparisonWindow(self.comparison_engine, self.apply_dark_theme, self.process_ai_response, self)
+        # Closing cancels the running jobs, whose cancelled signals forget the window's runs
+        # right away, so nothing refers to the window once it is deleted
+        window.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        self.comparison_engine.set_max_workers(len(self.comparison_runs) + len(targets))
+        for target in targets:
+            payload = build_payload(target['model'], prompt, self.max_tokens, self.stream_responses)
+            job_id = self.comparison_engine.submit(self.comparison_client(target), payload)
+            self.comparison_runs[job_id] = window
+            window.add_run(job_id, comparison_label(target))
+        self.log_to_terminal(f"Comparing {len(targets)} models.")
+        window.show()
+
+    def dispatch_comparison(self, job_id, handler, *args, done=False):
+        # Signals the worker queued before its window was closed (which cancels the job) are
+        # delivered after the run was forgotten; they are dropped
+        window = self.comparison_runs.pop(job_id, None) if done else self.comparison_runs.get(job_id)
+        if window is not None:
+            getattr(window, handler)(job_id, *args)
+
+    def comparison_client(self, target):
+        endpoint = target.get('endpoint')
+        if not endpoint or endpoint == self.api_endpoint_completions:
+            return self.get_api_client()
+        api_key = target.get('api_key', self.api_key)
+        key = (endpoint, api_key)
+        if key not in self.comparison_clients:
+            from api_client import ApiClient
+            self.comparison_clients[key] = ApiClient(
+                endpoint.replace("/v1/completions", "/v1/models"),
+                endpoint,
+                api_key=api_key,
+                connect_timeout=self.connect_timeout,
+                read_timeout=self.read_timeout,
+                max_retries=self.max_retries,
+                backoff_factor=self.retry_backoff,
+                on_metrics=self.api_metrics.emit
             )
-            response.raise_for_status()
-            choices = response.json().get('choices', [])
-            if choices:
-                reply = choices[0].get('text', '').strip()
+        return self.comparison_clients[key]
+
+    def close_comparison_clients(self):
+        for client in self.comparison_clients.values():
+            client.close()
+        self.comparison_clients = {}
+
+    def replay_cached_response(self, cache_key, trace=None):
+        # Returns the replayed reply, or None on a cache miss
+        started = time.perf_counter()
+        reply = self.response_cache.get(cache_key)
+        if reply is None:
+            return None
+        self.log_to_terminal("Cache hit: replaying cached response.")
+        self.active_trace = trace
+        try:
+            self.process_ai_response(reply)
+        finally:
+            self.active_trace = None
+        self.log_to_terminal(f"Cached response replayed in {(time.perf_counter() - started) * 1000:.1f} ms.")
+        if trace is not None:
+            trace.reply_chars = len(reply)
+            self.finish_trace(trace, "cached")
+        return reply
+
+    def toggle_response_cache(self, use):
+        self.use_response_cache = use
+
+    def toggle_preview_changes(self, use):
+        self.preview_changes = use
+
+    def store_cached_response(self, job_id, reply):
+        # Fresh replies are stored even when the cache is bypassed, refreshing stale entries
+        cache_key = self.pending_cache_keys.pop(job_id, None)
+        if cache_key and reply:
+            try:
+                self.response_cache.put(cache_key, reply)
+            except OSError as e:
+                self.log_to_terminal(f"Error caching response: {e}")
+
+    def cancel_commands(self):
+        if self.completion_engine.pending_count():
+            self.completion_engine.cancel_all()
+        else:
+            self.log_to_terminal("No requests to cancel.")
+
+    def on_completion_started(self, job_id):
+        self.log_to_terminal(f"Request #{job_id} sent.")
+
+    def on_completion_chunk(self, job_id, text):
+        if job_id not in self.stream_parsers:
+            self.start_streamed_response(job_id)
+        # Complete lines are shown before the file operations they trigger get logged
+        head, newline, tail = text.rpartition("\n")
+        self.terminal_output.append_stream(head + newline)
+        self.active_trace = self.traces.get(job_id)
+        try:
+            with self.trace_span("parse"):
+                self.stream_parsers[job_id].feed(text)
+        finally:
+            self.active_trace = None
+        self.terminal_output.append_stream(tail)
+
+    def on_completion_measured(self, job_id, timings):
+        trace = self.traces.get(job_id)
+        if trace is not None:
+            trace.record_request(timings)
+
+    def on_completion_finished(self, job_id, reply):
+        self.store_cached_response(job_id, reply)
+        self.add_chat_turn(job_id, reply)
+        trace = self.traces.pop(job_id, None)
+        self.active_trace = trace
+        try:
+            if job_id in self.stream_parsers:
+                self.finish_streamed_response(job_id)
+                self.log_to_terminal(f"Request #{job_id} completed.")
+            elif reply:
+                self.log_to_terminal(f"Request #{job_id} completed.")
                 self.process_ai_response(reply)
             else:
-                self.text_input_window.append("No response generated.")
-
-            self.text_input_window.clear()  # Clear the text input after sending
-        except Exception as e:
-            self.text_input_window.append(f"Error: {str(e)}")
+                self.log_to_terminal(f"Request #{job_id}: No response generated.")
+        finally:
+            self.active_trace = None
+        if trace is not None:
+            trace.reply_chars = len(reply)
+            self.finish_trace(trace, "ok", job_id=job_id)
+
+    def on_completion_failed(self, job_id, error):
+        self.pending_cache_keys.pop(job_id, None)
+        self.pending_chat_turns.pop(job_id, None)
+        self.discard_streamed_response(job_id)
+        self.log_to_terminal(f"Request #{job_id} failed. Error: {error}")
+        trace = self.traces.pop(job_id, None)
+        if trace is not None:
+            self.finish_trace(trace, "error", error)
+
+    def on_completion_cancelled(self, job_id):
+        self.pending_cache_keys.pop(job_id, None)
+        self.pending_chat_turns.pop(job_id, None)
+        self.discard_streamed_response(job_id)
+        self.log_to_terminal(f"Request #{job_id} cancelled.")
+        trace = self.traces.pop(job_id, None)
+        if trace is not None:
+            self.finish_trace(trace, "cancelled")
+
+    def trace_span(self, phase):
+        # Span of the request whose reply is being handled, if any
+        return self.active_trace.span(phase) if self.active_trace is not None else nullcontext()
+
+    def finish_trace(self, trace, status, error=None, job_id=None):
+        trace.finish(status, error)
+        try:
+            data = self.tracer.record(trace)
+        except OSError as e:
+            self.log_to_terminal(f"Error writing request trace: {e}")
+            return
+        if job_id is not None:
+            self.log_to_terminal(f"Request #{job_id} timings: {format_trace(data)}")
+        if self.metrics_window is not None and self.metrics_window.isVisible():
+            self.metrics_window.refresh()
+
+    def open_metrics_window(self):
+        if self.metrics_window is None:
+            self.metrics_window = MetricsWindow(self.tracer, self.metrics_file, self)
+        self.metrics_window.refresh()
+        self.metrics_window.show()
+        self.metrics_window.raise_()
 
     def modify_prompt_for_structure(self, prompt):
-        reference_text = ""
-        if self.use_urls:
-            reference_text += "Using the following URLs as references: "
-            reference_text += ", ".join(self.url_references) + ". "
-        if self.use_files:
-            reference_text += "Using content from the following files: "
-            reference_text += ", ".join(os.path.basename(file) for file in self.file_references) + ". "
-
-        return (
-            f"{self.current_main_prompt}\n"
-            f"Analyze the existing project structure, including files and directories, in the workspace at: {self.workspace_path}. "
-            f"{reference_text}"
-            f"Ensure that any generated code integrates seamlessly into the current project structure. The task is: {prompt}. "
-            "You must decide where each part of the code should go, create or modify files and directories using appropriate file system commands, "
-            "and ensure everything fits together. Log each step you take in the terminal."
+        return build_prompt(self.current_main_prompt, self.workspace_path, prompt, **self.prompt_references(prompt))
+
+    def build_chat_user_message(self, prompt):
+        # Workspace files the conversation already has unchanged are not sent again
+        return build_user_message(prompt, **self.prompt_references(prompt, seen=self.chat_history().contains_file))
+
+    def prompt_references(self, prompt, seen=None):
+        return {
+            'url_references': self.url_references if self.use_urls else (),
+            'file_references': self.file_references if self.use_files else (),
+            'context_text': "\n\n".join(text for text in (
+                self.build_document_context(prompt), self.build_url_context(), self.build_workspace_context(prompt, seen)
+            ) if text)
+        }
+
+    def chat_history(self):
+        if self.workspace_path not in self.chat_histories:
+            self.chat_histories[self.workspace_path] = ChatHistory(self.chat_history_tokens)
+        return self.chat_histories[self.workspace_path]
+
+    def add_chat_turn(self, job_id, reply):
+        # Only complete replies join the conversation; the turn goes to the workspace it was sent from
+        turn = self.pending_chat_turns.pop(job_id, None)
+        if turn is None or not reply:
+            return
+        workspace_path, user_message = turn
+        history = self.chat_histories.setdefault(workspace_path, ChatHistory(self.chat_history_tokens))
+        history.add(user_message, reply)
+
+    def new_conversation(self):
+        self.chat_histories.pop(self.workspace_path, None)
+        self.log_to_terminal("Started a new conversation.")
+
+    def build_document_context(self, prompt):
+        # The parts of each referenced file most relevant to the task, within file_excerpt_tokens
+        if not self.use_files or not self.file_references:
+            return ""
+        from document_extractor import select_chunks
+        extractor = self.get_document_extractor()
+        max_chars = self.file_excerpt_tokens * CHARS_PER_TOKEN // len(self.file_references)
+        sections = []
+        for path in self.file_references:
+            chunks = extractor.chunks(path)
+            if chunks is None:
+                # New or changed since it was extracted; it is used from the next command on
+                if not extractor.is_pending(path):
+                    extractor.extract(path, on_done=self.on_document_extracted)
+                self.log_to_terminal(f"{os.path.basename(path)} is still being extracted; sending without its content.")
+                continue
+            excerpts = select_chunks(chunks, prompt, max_chars)
+            if excerpts:
+                # Not "# File:", which the response parser reads as a write instruction if echoed back
+                sections.append(f"# Reference: {os.path.basename(path)}\n" + "\n...\n".join(excerpts))
+        return "\n\n".join(sections)
+
+    def build_url_context(self):
+        # Excerpts of the URL references fetched so far; sending never waits for a download
+        if not self.use_urls or not self.url_references:
+            return ""
+        fetcher = self.get_url_fetcher()
+        max_chars = self.url_excerpt_tokens * CHARS_PER_TOKEN
+        sections = []
+        for url in self.url_references:
+            if fetcher.is_pending(url):
+                pending = True
+            else:
+                # Stale entries are revalidated in the background for the next command
+                pending = False
+                if fetcher.needs_fetch(url):
+                    fetcher.fetch(url, on_done=self.on_url_fetched)
+            excerpt = fetcher.excerpt(url, max_chars)
+            if excerpt is None:
+                if pending:
+                    self.log_to_terminal(f"{url} is still being fetched; sending without its content.")
+                continue
+            sections.append(f"# URL: {url}\n{excerpt}")
+        return "\n\n".join(sections)
+
+    def build_workspace_context(self, prompt, seen=None):
+        # Workspace tree and file excerpts sized to the selected model's context budget
+        if not self.include_workspace_context:
+            return ""
+        started = time.perf_counter()
+        # Referenced files are not packed here; build_document_context adds their relevant parts
+        budget = self.model_context_budgets.get(self.selected_model, self.context_token_budget)
+        workspace_files = None
+        if self.workspace_index is not None and self.workspace_index.is_built():
+            workspace_files = [(path, size, mtime_ns) for path, size, mtime_ns, _, _ in self.workspace_index.files()]
+        context_text = self.context_packer.pack(self.workspace_path, prompt, budget, workspace_files=workspace_files, seen=seen)
+        self.log_to_terminal(
+            f"Workspace context packed in {(time.perf_counter() - started) * 1000:.1f} ms "
+            f"(~{estimate_tokens(context_text)} of {budget} tokens)."
         )
+        return context_text
 
     def log_to_terminal(self, message):
-        self.terminal_output.appendPlainText(message)
+        # Safe to call from any thread; the terminal batches its updates
+        self.terminal_output.write(message)
+
+    def log_api_metrics(self, metrics):
+        from api_client import format_metrics
+        self.log_to_terminal(f"API: {format_metrics(metrics)}")
+
+    def get_api_client(self):
+        if self.api_client is None:
+            self.api_client = self.build_api_client()
+        return self.api_client
+
+    def build_api_client(self):
+        from api_client import ApiClient
+        return ApiClient(
+            self.api_endpoint_models,
+            self.api_endpoint_completions,
+            api_key=self.api_key,
+            connect_timeout=self.connect_timeout,
+            read_timeout=self.read_timeout,
+            max_retries=self.max_retries,
+            backoff_factor=self.retry_backoff,
+            on_metrics=self.api_metrics.emit,
+            chat_endpoint=self.api_endpoint_chat
+        )
 
     def process_ai_response(self, response):
-        # Process AI instructions for file operations
-        lines = response.strip().split("\n")
-        current_file = None
-        file_contents = []
-
-        for line in lines:
-            line = line.strip()
-            if len(line) == 0:
-                continue
+        # Parse the whole response into an operation plan, then apply it in one transaction
+        with self.trace_span("parse"):
+            plan = parse_response(response)
+        if self.preview_changes:
+            self.preview_operation_plan(plan)
+        else:
+            self.apply_operation_plan(plan)
+
+    def preview_operation_plan(self, plan):
+        # Diffs are computed on a worker thread; the preview opens once they are ready
+        run_in_background(
+            self.diff_operation_plan, plan,
+            on_result=lambda result: self.show_plan_preview(plan, *result),
+            on_error=lambda error: self.log_to_terminal(f"Error preparing preview: {error}")
+        )
 
-            if line.startswith("mkdir"):
-                dir_path = line.split(" ", 1)[1]
-                full_dir_path = os.path.join(self.workspace_path, dir_path)
-                os.makedirs(full_dir_path, exist_ok=True)
-                self.log_to_terminal(f"Directory created: {full_dir_path}")
-
-            elif line.startswith("touch"):
-                file_path = line.split(" ", 1)[1]
-                full_file_path = os.path.join(self.workspace_path, file_path)
-                open(full_file_path, 'a').close()
-                self.log_to_terminal(f"File created: {full_file_path}")
-
-            elif line.startswith("echo"):
-                parts = line.split(">", 1)
-                if len(parts) < 2:
-                    continue
-
-                file_content = parts[0].replace("echo ", "").strip()
-                target_file = parts[1].strip()
-
-                full_file_path = os.path.join(self.workspace_path, target_file)
-                try:
-                    with open(full_file_path, 'a', encoding='utf-8') as f:
-                        f.write(file_content + "\n")
-                    self.log_to_terminal(f"Content written to {full_file_path}")
-                except OSError as e:
-                    self.log_to_terminal(f"Error writing to file {full_file_path}: {e}")
-
-            elif line.startswith("# File:"):
-                if current_file and file_contents:
-                    self.write_to_file(current_file, file_contents)
-                current_file = line.split(":", 1)[1].strip()
-                file_contents = []
-
-            elif current_file:
-                file_contents.append(line)
-
-        if current_file and file_contents:
-            self.write_to_file(current_file, file_contents)
-
-        self.model.setRootPath(QDir.rootPath())  # Refresh the view
-        self.tree_view.setRootIndex(self.model.index(self.workspace_path))
-
-    def write_to_file(self, file_path, contents):
-        full_file_path = os.path.join(self.workspace_path, file_path)
-        try:
-            with open(full_file_path, 'w', encoding='utf-8') as f:
-                f.write("\n".join(contents) + "\n")
-            self.log_to_terminal(f"File written: {full_file_path}")
-            self.display_code_in_editor(file_path, contents)  # Show the file content in the code editor
-        except OSError as e:
-            self.log_to_terminal(f"Error writing to file {full_file_path}: {e}")
+    def diff_operation_plan(self, plan):
+        changes = plan.resolve(self.workspace_path, self.known_file_hash)
+        return changes, {change.path: diff_hunks(change) for change in changes}
 
-    def display_code_in_editor(self, file_path, code):
-        code_editor = CodeEditor()
-        code_editor.setPlainText("\n".join(code))
+    def show_plan_preview(self, plan, changes, hunks):
+        if not changes and not plan.directories:
+            self.log_to_terminal("No changes: the response matches the workspace.")
+            return
+        dialog = PlanPreviewDialog(plan, changes, hunks, self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            self.log_to_terminal("Changes discarded.")
+            return
+        selected = dialog.selected_changes()
+        if changes and not selected:
+            self.log_to_terminal("No changes selected.")
+            return
+        self.apply_operation_plan(plan, changes=selected)
+
+    def known_file_hash(self, full_path):
+        # Content hash from the workspace index, trusted only while size and mtime still match
+        index = self.workspace_index
+        if index is None:
+            return None
+        row = index.lookup(full_path)
+        if row is None:
+            return None
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (row[1], row[2]):
+            # Changed in place without a directory event; have the index catch up
+            watcher = self.workspace_watcher
+            if watcher is not None:
+                watcher.report_stale(full_path)
+            return None
+        return row[3]
+
+    def apply_operation_plan(self, plan, show_in_editor=True, changes=None):
+        try:
+            with self.trace_span("apply"):
+                if changes is None:
+                    changes = plan.resolve(self.workspace_path, self.known_file_hash)
+                else:
+                    # Changes from the preview were diffed against what was on disk back then
+                    verify_unchanged(changes)
+                created_dirs, changes = apply_plan(self.workspace_path, plan, changes)
+        except (OSError, FileOperationError) as e:
+            self.log_to_terminal(f"Error applying file operations, workspace left unchanged: {e}")
+            return
 
-        self.code_tabs.addTab(code_editor, os.path.basename(file_path))
-        self.apply_dark_theme(code_editor)
+        messages = [f"Directory created: {directory}" for directory in created_dirs]
+        for change in changes:
+            messages.append(f"{CHANGE_MESSAGES[change.action]} {change.full_path}")
+        if messages:
+            self.log_to_terminal("\n".join(messages))
+
+        if show_in_editor:
+            with self.trace_span("editor"):
+                for change in changes:
+                    if change.action == "written":
+                        # Show the file content in the code editor
+                        self.display_code_in_editor(change.full_path, change.new_text)
+
+        touched_paths = created_dirs + [change.full_path for change in changes]
+        with self.trace_span("tree_refresh"):
+            self.notify_workspace_changed(touched_paths)
+            self.refresh_workspace_view(touched_paths)
+
+    def start_streamed_response(self, job_id):
+        self.stream_parsers[job_id] = ResponseParser(StreamingApplier(self))
+
+    def finish_streamed_response(self, job_id):
+        parser = self.stream_parsers.pop(job_id)
+        parser.close()
+        parser.handler.finish()
+        self.terminal_output.end_stream()
+
+    def discard_streamed_response(self, job_id):
+        # Blocks already applied stay on disk; the unfinished remainder is dropped
+        if self.stream_parsers.pop(job_id, None) is not None:
+            self.terminal_output.end_stream()
+
+    def set_tree_root(self, path):
+        # Only the workspace is watched and populated, never the whole file system
+        if self.model is None:
+            self.model = QFileSystemModel(self)
+            self.tree_proxy.setSourceModel(self.model)
+        self.model.setRootPath(path)
+        self.tree_proxy.set_root(path)
+        self.tree_view.setRootIndex(self.tree_proxy.mapFromSource(self.model.index(path)))
+
+    def tree_file_path(self, index):
+        return self.model.filePath(self.tree_proxy.mapToSource(index))
+
+    def refresh_workspace_view(self, paths):
+        # Loaded directories are watched by the model; directories that were touched but
+        # not populated yet only need fetching if they are already expanded in the view
+        if self.model is None:
+            return
+        directories = {os.path.dirname(path) for path in paths} | {path for path in paths if os.path.isdir(path)}
+        for directory in sorted(directories):
+            index = self.model.index(directory)
+            if index.isValid() and self.model.canFetchMore(index) and \
+                    self.tree_view.isExpanded(self.tree_proxy.mapFromSource(index)):
+                self.model.fetchMore(index)
+
+    def write_to_file(self, file_path, contents, show_in_editor=True):
+        plan = OperationPlan()
+        plan.end_file(file_path, contents)
+        self.apply_operation_plan(plan, show_in_editor)
+
+    def display_code_in_editor(self, file_path, text):
+        # Reuses the file's tab if it is already open
+        return self.code_tabs.show_text(file_path, text)
 
     def open_file_from_tree(self, index):
-        file_path = self.model.filePath(index)
+        file_path = self.tree_file_path(index)
         if os.path.isfile(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.readlines()
-                self.display_code_in_editor(file_path, content)
-            except Exception as e:
-                self.log_to_terminal(f"Error opening file {file_path}: {e}")
+            self.code_tabs.open_path(file_path)
 
     def apply_dark_theme(self, text_edit):
         # Set dark theme for QTextEdit
@@ -545,45 +2261,28 @@ class MainWindow(QMainWindow):
         palette.setColor(QPalette.ColorRole.Text, QColor(255, 255, 255))
         text_edit.setPalette(palette)
 
-    def close_tab(self, index):
-        widget = self.code_tabs.widget(index)
-        if widget is not None:
-            widget.deleteLater()
-        self.code_tabs.removeTab(index)
-
     def populate_input_from_prompt(self, item):
         self.text_input_window.setText(item.text(0))
+        self.prompt_tree.record_use(item)
 
     def add_prompt(self):
         text, ok = QInputDialog.getText(self, "Add Prompt", "Enter your prompt:")
         if ok and text:
             current_item = self.prompt_tree.currentItem()
-            prompt_item = QTreeWidgetItem([text])
-            prompt_item.setExpanded(False)  # Ensure new prompts are collapsed
-            if current_item and current_item.parent() is not None:
-                # Add as a child to the current folder
-                current_item.addChild(prompt_item)
-            else:
-                # Add to the root if no folder is selected
-                self.prompt_tree.addTopLevelItem(prompt_item)
+            if current_item is not None and not self.prompt_tree.is_folder(current_item):
+                current_item = current_item.parent()
+            # Add to the current folder, or to the root if no folder is selected
+            self.prompt_tree.add_prompt(text, current_item)
 
     def add_folder(self):
         folder_name, ok = QInputDialog.getText(self, "Add Folder", "Enter folder name:")
         if ok and folder_name:
-            folder_item = QTreeWidgetItem([folder_name])
-            folder_item.setFlags(folder_item.flags() | Qt.ItemFlag.ItemIsDropEnabled)
-            folder_item.setExpanded(False)  # Ensure new folders are collapsed
-            self.prompt_tree.addTopLevelItem(folder_item)
+            self.prompt_tree.add_prompt(folder_name, is_folder=True)
 
     def remove_prompt(self):
         current_item = self.prompt_tree.currentItem()
-        if current_item and current_item.parent() is not None:
-            parent = current_item.parent()
-            index = parent.indexOfChild(current_item)
-            parent.takeChild(index)
-        elif current_item:
-            index = self.prompt_tree.indexOfTopLevelItem(current_item)
-            self.prompt_tree.takeTopLevelItem(index)
+        if current_item:
+            self.prompt_tree.remove_item(current_item)
 
     def get_prompts(self):
         return [
@@ -619,21 +2318,85 @@ class MainWindow(QMainWindow):
         try:
             with open(CONFIG_FILE, 'r') as f:
                 config = json.load(f)
-                self.api_endpoint_models = config.get('api_endpoint_models', "https://api.openai.com/v1/models")
-                self.api_endpoint_completions = self.api_endpoint_models.replace("/v1/models", "/v1/completions")
-                self.api_key = config.get('api_key', "")
-                self.selected_model = config.get('selected_model', "")
         except FileNotFoundError:
-            self.api_endpoint_models = "https://api.openai.com/v1/models"
-            self.api_endpoint_completions = self.api_endpoint_models.replace("/v1/models", "/v1/completions")
-            self.api_key = ""
-            self.selected_model = ""
+            config = {}
+        self.api_endpoint_models = config.get('api_endpoint_models', "https://api.openai.com/v1/models")
+        self.api_endpoint_completions = self.api_endpoint_models.replace("/v1/models", "/v1/completions")
+        self.api_endpoint_chat = self.api_endpoint_models.replace("/v1/models", "/v1/chat/completions")
+        self.api_key = config.get('api_key', "")
+        self.selected_model = config.get('selected_model', "")
+        self.max_concurrent_requests = config.get('max_concurrent_requests', 1)
+        self.stream_responses = config.get('stream_responses', True)
+        self.api_mode = config.get('api_mode', "completions")
+        self.chat_history_tokens = config.get('chat_history_tokens', 8000)
+        self.connect_timeout = config.get('connect_timeout', 10)
+        self.read_timeout = config.get('read_timeout', 600)
+        self.max_retries = config.get('max_retries', 3)
+        self.retry_backoff = config.get('retry_backoff', 0.5)
+        self.max_tokens = config.get('max_tokens', 1500)
+        self.models_cache_max_age = config.get('models_cache_max_age', 300)
+        self.include_workspace_context = config.get('include_workspace_context', True)
+        self.context_token_budget = config.get('context_token_budget', 4000)
+        self.model_context_budgets = config.get('model_context_budgets', {})
+        self.tree_ignore_patterns = config.get('tree_ignore_patterns', sorted(IGNORED_DIRS) + ["*.pyc"])
+        self.use_response_cache = config.get('use_response_cache', True)
+        self.large_file_threshold = config.get('large_file_threshold', 10 * 1024 * 1024)
+        self.terminal_max_lines = config.get('terminal_max_lines', 5000)
+        self.terminal_log_max_bytes = config.get('terminal_log_max_bytes', 1024 * 1024)
+        self.terminal_log_backups = config.get('terminal_log_backups', 5)
+        self.workflow_autosave_interval = config.get('workflow_autosave_interval', 60)
+        self.preview_changes = config.get('preview_changes', False)
+        self.comparison_targets = config.get('comparison_targets', [])
+        self.url_fetch_workers = config.get('url_fetch_workers', 4)
+        self.url_fetch_timeout = config.get('url_fetch_timeout', 20)
+        self.url_cache_max_age = config.get('url_cache_max_age', 3600)
+        self.url_excerpt_tokens = config.get('url_excerpt_tokens', 1000)
+        self.document_workers = config.get('document_workers', 2)
+        self.file_excerpt_tokens = config.get('file_excerpt_tokens', 2000)
+        self.trace_file = config.get('trace_file', TRACE_FILE)
+        self.metrics_file = config.get('metrics_file', METRICS_FILE)
+        self.response_cache_ttl = config.get('response_cache_ttl', 7 * 24 * 3600)
+        self.response_cache_max_entries = config.get('response_cache_max_entries', 500)
+        self.response_cache_max_bytes = config.get('response_cache_max_bytes', 50 * 1024 * 1024)
 
     def save_config(self):
         config = {
             'api_endpoint_models': self.api_endpoint_models,
             'api_key': self.api_key,
-            'selected_model': self.selected_model
+            'selected_model': self.selected_model,
+            'max_concurrent_requests': self.max_concurrent_requests,
+            'stream_responses': self.stream_responses,
+            'api_mode': self.api_mode,
+            'chat_history_tokens': self.chat_history_tokens,
+            'connect_timeout': self.connect_timeout,
+            'read_timeout': self.read_timeout,
+            'max_retries': self.max_retries,
+            'retry_backoff': self.retry_backoff,
+            'max_tokens': self.max_tokens,
+            'models_cache_max_age': self.models_cache_max_age,
+            'include_workspace_context': self.include_workspace_context,
+            'context_token_budget': self.context_token_budget,
+            'model_context_budgets': self.model_context_budgets,
+            'tree_ignore_patterns': self.tree_ignore_patterns,
+            'use_response_cache': self.use_response_cache,
+            'preview_changes': self.preview_changes,
+            'comparison_targets': self.comparison_targets,
+            'url_fetch_workers': self.url_fetch_workers,
+            'url_fetch_timeout': self.url_fetch_timeout,
+            'url_cache_max_age': self.url_cache_max_age,
+            'url_excerpt_tokens': self.url_excerpt_tokens,
+            'document_workers': self.document_workers,
+            'file_excerpt_tokens': self.file_excerpt_tokens,
+            'trace_file': self.trace_file,
+            'metrics_file': self.metrics_file,
+            'large_file_threshold': self.large_file_threshold,
+            'terminal_max_lines': self.terminal_max_lines,
+            'terminal_log_max_bytes': self.terminal_log_max_bytes,
+            'terminal_log_backups': self.terminal_log_backups,
+            'workflow_autosave_interval': self.workflow_autosave_interval,
+            'response_cache_ttl': self.response_cache_ttl,
+            'response_cache_max_entries': self.response_cache_max_entries,
+            'response_cache_max_bytes': self.response_cache_max_bytes
         }
         with open(CONFIG_FILE, 'w') as f:
             json.dump(config, f)
@@ -641,117 +2404,318 @@ class MainWindow(QMainWindow):
     def load_workflow(self):
         file_name, _ = QFileDialog.getOpenFileName(self, "Load Workflow", "", "Workflow Files (*.json)")
         if file_name:
-            try:
-                with open(file_name, 'r') as f:
-                    workflow = json.load(f)
-                    self.url_references = workflow.get('url_references', [])
-                    self.file_references = workflow.get('file_references', [])
-                    self.use_urls = workflow.get('use_urls', False)
-                    self.use_files = workflow.get('use_files', False)
-                    self.selected_model = workflow.get('selected_model', "")
-                    self.prompt_tree.load_from_json(workflow.get('prompts', []))
-                    self.workspace_path = workflow.get('workspace_path', None)
-                    self.set_open_tabs(workflow.get('open_tabs', []))
-                    self.terminal_output.setPlainText(workflow.get('terminal_output', ""))
-                self.update_ui_from_workflow()
-            except FileNotFoundError:
-                QMessageBox.warning(self, "Load Workflow", "Failed to load the selected workflow file.")
+            # Parsing and decompression happen on a worker thread
+            run_in_background(
+                read_workflow, file_name,
+                on_result=self.apply_workflow,
+                on_error=lambda error: QMessageBox.warning(
+                    self, "Load Workflow", f"Failed to load the selected workflow file: {error}")
+            )
+
+    def apply_workflow(self, workflow):
+        self.url_references = workflow.get('url_references', [])
+        self.file_references = workflow.get('file_references', [])
+        self.use_urls = workflow.get('use_urls', False)
+        self.use_files = workflow.get('use_files', False)
+        self.selected_model = workflow.get('selected_model', "")
+        self.prompt_tree.load_from_json(workflow.get('prompts', []))
+        self.workspace_path = workflow.get('workspace_path', None)
+        self.set_open_tabs(workflow.get('open_tabs', []))
+        self.terminal_output.set_text(workflow.get('terminal_output', ""))
+        if self.use_urls:
+            self.prefetch_urls(self.url_references)
+        if self.use_files:
+            self.extract_documents(self.file_references)
+        self.update_ui_from_workflow()
 
     def set_open_tabs(self, open_tabs):
-        self.code_tabs.clear()
+        # Tabs are restored as stubs; only the current one is loaded
+        self.code_tabs.clear_pages()
         for tab_data in open_tabs:
-            editor = CodeEditor()
-            editor.setPlainText(tab_data['content'])
-            self.code_tabs.addTab(editor, tab_data['title'])
-            self.apply_dark_theme(editor)
+            self.code_tabs.add_page(tab_data.get('path'), tab_data.get('title'),
+                                    tab_data.get('content'), tab_data.get('hash'))
 
     def save_workflow_as(self):
         file_name, _ = QFileDialog.getSaveFileName(self, "Save Workflow As", "", "Workflow Files (*.json)")
         if file_name:
-            workflow = {
-                'url_references': self.url_references,
-                'file_references': self.file_references,
-                'use_urls': self.use_urls,
-                'use_files': self.use_files,
-                'selected_model': self.selected_model,
-                'prompts': self.prompt_tree.save_to_json(),  # Save the current state of prompts
-                'workspace_path': self.workspace_path,
-                'open_tabs': self.get_open_tabs(),
-                'terminal_output': self.terminal_output.toPlainText()
-            }
-            with open(file_name, 'w') as f:
-                json.dump(workflow, f)
-            QMessageBox.information(self, "Save Workflow", "Workflow and settings have been saved.")
+            run_in_background(
+                WorkflowWriter(file_name).write, self.workflow_sections(),
+                on_result=lambda _: QMessageBox.information(
+                    self, "Save Workflow", "Workflow and settings have been saved."),
+                on_error=lambda error: QMessageBox.warning(
+                    self, "Save Workflow", f"Failed to save the workflow: {error}")
+            )
             self.save_config()  # Also save the current configuration
 
+    def workflow_sections(self, writer=None):
+        # {section: (change marker, value)} gathered on the GUI thread. With a writer, the
+        # terminal text is only collected if the document changed since that writer's last write.
+        revision = self.terminal_output.document().revision()
+        terminal_output = UNCHANGED
+        if writer is None or not writer.is_current('terminal_output', revision):
+            terminal_output = self.terminal_output.toPlainText()
+        prompts = UNCHANGED
+        if writer is None or not writer.is_current('prompts', self.prompt_library.revision):
+            prompts = self.prompt_tree.save_to_json()
+        sections = {
+            'url_references': self.url_references,
+            'file_references': self.file_references,
+            'use_urls': self.use_urls,
+            'use_files': self.use_files,
+            'selected_model': self.selected_model,
+            'workspace_path': self.workspace_path,
+            'open_tabs': self.get_open_tabs(),
+        }
+        # Small sections have no change marker; they are compared by their encoded JSON
+        sections = {name: (None, value) for name, value in sections.items()}
+        sections['prompts'] = (self.prompt_library.revision, prompts)
+        sections['terminal_output'] = (revision, terminal_output)
+        return sections
+
+    def autosave_workflow(self):
+        if self.autosave_running:
+            return
+        self.autosave_running = True
+        run_in_background(
+            self.autosave_writer.write, self.workflow_sections(self.autosave_writer),
+            on_result=self.on_autosaved,
+            on_error=self.on_autosave_failed
+        )
+
+    def on_autosaved(self, written):
+        self.autosave_running = False
+
+    def on_autosave_failed(self, error):
+        self.autosave_running = False
+        self.log_to_terminal(f"Autosave failed: {error}")
+
     def get_open_tabs(self):
         tabs = []
-        for i in range(self.code_tabs.count()):
-            editor = self.code_tabs.widget(i)
-            tabs.append({
-                'title': self.code_tabs.tabText(i),
-                'content': editor.toPlainText()
-            })
+        for i, page in enumerate(self.code_tabs.pages()):
+            tab = {'title': self.code_tabs.tabText(i)}
+            if page.path is not None:
+                tab['path'] = page.path
+                tab['hash'] = page.hash
+            # File-backed tabs only carry content when they have unsaved edits
+            text = page.unsaved_text()
+            if text is not None or page.path is None:
+                tab['content'] = text or ""
+            tabs.append(tab)
         return tabs
 
     def update_ui_from_workflow(self):
         self.main_prompt_input.setText(self.current_main_prompt)
         if self.workspace_path:
-            self.model.setRootPath(self.workspace_path)
-            self.tree_view.setRootIndex(self.model.index(self.workspace_path))
+            self.set_tree_root(self.workspace_path)
+        self.prepare_workspace()
         QMessageBox.information(self, "Workflow Loaded", "Workflow settings have been loaded.")
 
+    def closeEvent(self, event):
+        self.completion_engine.shutdown()
+        self.comparison_engine.shutdown()
+        self.close_comparison_clients()
+        if self.url_fetcher is not None:
+            self.url_fetcher.close()
+        if self.document_extractor is not None:
+            self.document_extractor.close()
+        if self.workspace_watcher is not None:
+            self.workspace_watcher.close()
+        if self.api_client is not None:
+            self.api_client.close()
+        if self.workflow_autosave_interval > 0:
+            self.autosave_writer.write(self.workflow_sections(self.autosave_writer))
+        self.terminal_output.close_log()
+        self.tracer.close()
+        self.prompt_library.close()
+        super().closeEvent(event)
+
 class PromptTree(QTreeWidget):
-    def __init__(self):
+    # View over a PromptLibrary. Folders are filled in when first expanded, and a search shows
+    # the matching prompts as a flat list instead of the tree.
+    def __init__(self, library):
         super().__init__()
+        self.library = library
+        self.search_text = ""
+        self.populated = set()
+        self.tree_expanded = set()  # Folders to expand again when a search is cleared
         self.setHeaderHidden(True)
         self.setDragDropMode(QAbstractItemView.DragDropMode.InternalMove)
         self.setItemsExpandable(True)
         self.setExpandsOnDoubleClick(True)
+        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.customContextMenuRequested.connect(self.context_menu)
+        self.itemExpanded.connect(self.populate_item)
+        self.reload()
+
+    @staticmethod
+    def prompt_id(item):
+        return item.data(0, Qt.ItemDataRole.UserRole) if item is not None else None
+
+    @staticmethod
+    def is_folder(item):
+        return bool(item.data(0, Qt.ItemDataRole.UserRole + 1))
+
+    def make_item(self, row):
+        prompt_id, text, is_folder, tags, uses, has_children = row
+        item = QTreeWidgetItem([text])
+        item.setData(0, Qt.ItemDataRole.UserRole, prompt_id)
+        item.setData(0, Qt.ItemDataRole.UserRole + 1, bool(is_folder))
+        self.set_details(item, tags, uses)
+        if has_children:
+            item.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.ShowIndicator)
+        return item
+
+    def set_details(self, item, tags, uses):
+        item.setData(0, Qt.ItemDataRole.UserRole + 2, (tags, uses))
+        details = [f"Tags: {tags}"] if tags else []
+        details.append(f"Used {uses} times")
+        item.setToolTip(0, "\n".join(details))
+
+    def reload(self):
+        self.clear()
+        self.populated.clear()
+        if self.search_text:
+            rows = self.library.search(self.search_text)
+            # Results are shown flat; their children are not part of the match
+            self.addTopLevelItems([self.make_item(row[:5] + (False,)) for row in rows])
+        else:
+            self.addTopLevelItems([self.make_item(row) for row in self.library.children()])
+
+    def expanded_ids(self):
+        expanded = set()
+        pending = [self.topLevelItem(i) for i in range(self.topLevelItemCount())]
+        while pending:
+            item = pending.pop()
+            if item.isExpanded():
+                expanded.add(self.prompt_id(item))
+                pending.extend(item.child(i) for i in range(item.childCount()))
+        return expanded
+
+    def refresh(self, expanded=None):
+        # Reload, keeping expanded folders expanded (and therefore loaded)
+        if expanded is None:
+            expanded = self.expanded_ids() if not self.search_text else set()
+        self.reload()
+        if self.search_text:
+            return
+        pending = [self.topLevelItem(i) for i in range(self.topLevelItemCount())]
+        while pending:
+            item = pending.pop()
+            if self.prompt_id(item) in expanded:
+                item.setExpanded(True)
+                pending.extend(item.child(i) for i in range(item.childCount()))
+
+    def populate_item(self, item):
+        prompt_id = self.prompt_id(item)
+        if self.search_text or prompt_id in self.populated:
+            return
+        self.populated.add(prompt_id)
+        item.addChildren([self.make_item(row) for row in self.library.children(prompt_id)])
+
+    def filter(self, text):
+        text = text.strip()
+        if text and not self.search_text:
+            self.tree_expanded = self.expanded_ids()
+        self.search_text = text
+        if text:
+            self.reload()
+        else:
+            self.refresh(self.tree_expanded)
+
+    def add_prompt(self, text, parent_item=None, is_folder=False):
+        prompt_id = self.library.add(text, self.prompt_id(parent_item), is_folder)
+        if parent_item is not None and not self.search_text:
+            # Reload the folder's children, which also loads it if it was never expanded
+            self.populated.discard(self.prompt_id(parent_item))
+            parent_item.takeChildren()
+            parent_item.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.ShowIndicator)
+            if parent_item.isExpanded():
+                self.populate_item(parent_item)
+            else:
+                parent_item.setExpanded(True)
+        else:
+            self.refresh()
+        return prompt_id
+
+    def remove_item(self, item):
+        self.library.remove(self.prompt_id(item))
+        parent = item.parent()
+        if parent is not None:
+            parent.takeChild(parent.indexOfChild(item))
+        else:
+            self.takeTopLevelItem(self.indexOfTopLevelItem(item))
 
-    def add_prompt_to_tree(self, item):
-        self.addTopLevelItem(item)
-        item.setExpanded(False)  # Ensure all items are initially collapsed
-
-    def get_prompt_list(self):
-        def collect_prompts(item):
-            prompts = []
-            for i in range(item.childCount()):
-                prompts.append(item.child(i).text(0))
-                prompts.extend(collect_prompts(item.child(i)))
-            return prompts
-
-        prompts = []
-        for i in range(self.topLevelItemCount()):
-            top_item = self.topLevelItem(i)
-            prompts.append(top_item.text(0))
-            prompts.extend(collect_prompts(top_item))
-        return prompts
+    def record_use(self, item):
+        if not self.is_folder(item):
+            self.library.record_use(self.prompt_id(item))
+            tags, uses = item.data(0, Qt.ItemDataRole.UserRole + 2)
+            self.set_details(item, tags, uses + 1)
 
-    def save_to_json(self):
-        def serialize_item(item):
-            return {
-                'text': item.text(0),
-                'children': [serialize_item(item.child(i)) for i in range(item.childCount())]
-            }
+    def context_menu(self, position):
+        item = self.itemAt(position)
+        if item is None:
+            return
+        menu = QMenu()
+        edit_tags_action = menu.addAction("Edit Tags...")
+        if menu.exec(self.viewport().mapToGlobal(position)) == edit_tags_action:
+            self.edit_tags(item)
+
+    def edit_tags(self, item):
+        current_tags, uses = item.data(0, Qt.ItemDataRole.UserRole + 2)
+        tags, ok = QInputDialog.getText(self, "Edit Tags", "Tags (separated by spaces):", text=current_tags)
+        if ok:
+            self.library.set_tags(self.prompt_id(item), tags.strip())
+            self.set_details(item, tags.strip(), uses)
+
+    def dropEvent(self, event):
+        # Moves are applied to the library and the tree is reloaded from it
+        item = self.currentItem()
+        if item is None or self.search_text:
+            event.ignore()
+            return
+        target = self.itemAt(event.position().toPoint())
+        indicator = self.dropIndicatorPosition()
+        if target is None or indicator == QAbstractItemView.DropIndicatorPosition.OnViewport:
+            parent_id, position = None, None
+        elif indicator == QAbstractItemView.DropIndicatorPosition.OnItem:
+            parent_id, position = self.prompt_id(target), None
+        else:
+            parent_id = self.prompt_id(target.parent())
+            position = self.library.position_of(self.prompt_id(target))
+            if indicator == QAbstractItemView.DropIndicatorPosition.BelowItem:
+                position += 1
+        self.library.move(self.prompt_id(item), parent_id, position)
+        event.setDropAction(Qt.DropAction.IgnoreAction)
+        event.accept()
+        self.refresh()
+
+    def get_prompt_list(self, query="", limit=MAIN_PROMPT_LIMIT):
+        # (id, text) of prompts, folders excluded
+        return [(row[0], row[1]) for row in self.library.prompts(query, limit)]
 
-        return [serialize_item(self.topLevelItem(i)) for i in range(self.topLevelItemCount())]
+    def save_to_json(self):
+        return self.library.export_json()
 
     def load_from_json(self, data):
-        def deserialize_item(data):
-            item = QTreeWidgetItem([data['text']])
-            for child_data in data['children']:
-                item.addChild(deserialize_item(child_data))
-            return item
-
-        self.clear()
-        for item_data in data:
-            self.addTopLevelItem(deserialize_item(item_data))
-            self.expandItem(self.topLevelItem(self.topLevelItemCount() - 1))
-
-app = QApplication(sys.argv)
-window = MainWindow()
-window.setWindowTitle('PyQt6 Code Editor with Workspace and Terminal')
-window.resize(1200, 800)
-window.show()
-sys.exit(app.exec())
+        # Workflow prompts are merged into the library; entries it already has are kept once
+        self.library.import_json(data)
+        self.refresh()
+
+def main():
+    startup_profile = None
+    if PROFILE_STARTUP_FLAG in sys.argv:
+        sys.argv.remove(PROFILE_STARTUP_FLAG)
+        startup_profile = StartupProfile(STARTUP_STARTED)
+        startup_profile.mark("imports")
+    app = QApplication(sys.argv)
+    if startup_profile is not None:
+        startup_profile.mark("application")
+    window = MainWindow(startup_profile)
+    window.setWindowTitle('PyQt6 Code Editor with Workspace and Terminal')
+    window.resize(1200, 800)
+    window.show()
+    return app.exec()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
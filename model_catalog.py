@@ -0,0 +1,71 @@
+import json
+import os
+import threading
+import time
+
+
+class ModelCatalog:
+    # Model lists per endpoint, persisted next to config.json so they can be shown instantly
+    # and revalidated in the background with ETag / Last-Modified.
+    def __init__(self, path, max_age=300):
+        self.path = path
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.entries = self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(temp_path, self.path)
+
+    def models(self, endpoint):
+        with self.lock:
+            return list(self.entries.get(endpoint, {}).get('models', []))
+
+    def is_stale(self, endpoint):
+        with self.lock:
+            entry = self.entries.get(endpoint)
+            return entry is None or time.time() - entry.get('fetched_at', 0) > self.max_age
+
+    def revalidate(self, client, endpoint, api_key=None):
+        # Returns (models, changed); safe to call from a worker thread
+        with self.lock:
+            entry = dict(self.entries.get(endpoint, {}))
+
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        with client.request("GET", endpoint, api_key=api_key, headers=headers) as response:
+            if response.status_code == 304 and 'models' in entry:
+                models = entry['models']
+                changed = False
+                etag = response.headers.get('ETag', entry.get('etag'))
+                last_modified = response.headers.get('Last-Modified', entry.get('last_modified'))
+            else:
+                response.raise_for_status()
+                models = [model['id'] for model in response.json().get('data', [])]
+                changed = models != entry.get('models')
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+
+        entry = {
+            'models': models,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': time.time(),
+        }
+        with self.lock:
+            self.entries[endpoint] = entry
+            self.save()
+        return models, changed
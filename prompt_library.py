@@ -0,0 +1,200 @@
+import re
+import sqlite3
+import threading
+
+
+class PromptLibrary:
+    # Prompts and folders in SQLite, with an FTS5 index over prompt text and tags. Folders are
+    # read one level at a time, so the tree never has to be loaded whole. `revision` changes
+    # on every write, which lets callers skip exporting an unchanged library.
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.revision = 0
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA foreign_keys=ON")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS prompts (id INTEGER PRIMARY KEY, "
+                "parent INTEGER REFERENCES prompts (id) ON DELETE CASCADE, position INTEGER NOT NULL, "
+                "text TEXT NOT NULL, is_folder INTEGER NOT NULL DEFAULT 0, tags TEXT NOT NULL DEFAULT '', "
+                "uses INTEGER NOT NULL DEFAULT 0)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS prompts_parent ON prompts (parent, position)")
+            self.db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS prompts_fts USING fts5(text, tags, content='prompts', content_rowid='id')"
+            )
+            # Keep the full-text index in step with the table
+            self.db.execute(
+                "CREATE TRIGGER IF NOT EXISTS prompts_ai AFTER INSERT ON prompts BEGIN "
+                "INSERT INTO prompts_fts (rowid, text, tags) VALUES (new.id, new.text, new.tags); END"
+            )
+            self.db.execute(
+                "CREATE TRIGGER IF NOT EXISTS prompts_ad AFTER DELETE ON prompts BEGIN "
+                "INSERT INTO prompts_fts (prompts_fts, rowid, text, tags) VALUES ('delete', old.id, old.text, old.tags); END"
+            )
+            self.db.execute(
+                "CREATE TRIGGER IF NOT EXISTS prompts_au AFTER UPDATE OF text, tags ON prompts BEGIN "
+                "INSERT INTO prompts_fts (prompts_fts, rowid, text, tags) VALUES ('delete', old.id, old.text, old.tags); "
+                "INSERT INTO prompts_fts (rowid, text, tags) VALUES (new.id, new.text, new.tags); END"
+            )
+
+    # Rows are (id, text, is_folder, tags, uses, has_children)
+    ROW_COLUMNS = (
+        "p.id, p.text, p.is_folder, p.tags, p.uses, "
+        "EXISTS (SELECT 1 FROM prompts c WHERE c.parent = p.id)"
+    )
+
+    def children(self, parent=None):
+        with self.lock:
+            return self.db.execute(
+                f"SELECT {self.ROW_COLUMNS} FROM prompts p WHERE p.parent IS ? ORDER BY p.position, p.id", (parent,)
+            ).fetchall()
+
+    def search(self, query, limit=500, prompts_only=False):
+        # Every word of the query must match the start of a word in the text or tags
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        match = " ".join(f'"{word}"*' for word in words)
+        folders = "AND p.is_folder = 0 " if prompts_only else ""
+        with self.lock:
+            return self.db.execute(
+                f"SELECT {self.ROW_COLUMNS} FROM prompts_fts JOIN prompts p ON p.id = prompts_fts.rowid "
+                f"WHERE prompts_fts MATCH ? {folders}ORDER BY p.uses DESC, prompts_fts.rank LIMIT ?", (match, limit)
+            ).fetchall()
+
+    def prompts(self, query="", limit=200):
+        # Prompts (no folders) matching the query, or the most used ones without a query
+        if query.strip():
+            return self.search(query, limit, prompts_only=True)
+        with self.lock:
+            return self.db.execute(
+                f"SELECT {self.ROW_COLUMNS} FROM prompts p WHERE p.is_folder = 0 ORDER BY p.uses DESC, p.id LIMIT ?",
+                (limit,)
+            ).fetchall()
+
+    def count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM prompts").fetchone()[0]
+
+
+    def add(self, text, parent=None, is_folder=False, tags=""):
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "INSERT INTO prompts (parent, position, text, is_folder, tags) VALUES "
+                "(?, (SELECT COALESCE(MAX(position) + 1, 0) FROM prompts WHERE parent IS ?), ?, ?, ?)",
+                (parent, parent, text, int(is_folder), tags)
+            )
+            self.revision += 1
+            return cursor.lastrowid
+
+    def remove(self, prompt_id):
+        # Children go with their folder (ON DELETE CASCADE)
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
+            self.revision += 1
+
+    def remove_prompt(self, prompt_id):
+        # Removes one prompt and returns whether it did; folders are left alone, since they
+        # would take their children along
+        with self.lock, self.db:
+            cursor = self.db.execute("DELETE FROM prompts WHERE id = ? AND is_folder = 0", (prompt_id,))
+            if cursor.rowcount:
+                self.revision += 1
+        return cursor.rowcount > 0
+
+    def set_tags(self, prompt_id, tags):
+        with self.lock, self.db:
+            self.db.execute("UPDATE prompts SET tags = ? WHERE id = ?", (tags, prompt_id))
+            self.revision += 1
+
+    def record_use(self, prompt_id):
+        with self.lock, self.db:
+            self.db.execute("UPDATE prompts SET uses = uses + 1 WHERE id = ?", (prompt_id,))
+            self.revision += 1
+
+    def move(self, prompt_id, parent, position=None):
+        # Moves an entry under a new parent, before the entry now at `position` (or last).
+        # Returns False if that would put a folder inside itself.
+        with self.lock, self.db:
+            if parent is not None:
+                ancestors = self.db.execute(
+                    "WITH RECURSIVE up (id, parent) AS (SELECT id, parent FROM prompts WHERE id = ? "
+                    "UNION ALL SELECT p.id, p.parent FROM prompts p JOIN up ON p.id = up.parent) SELECT id FROM up",
+                    (parent,)
+                ).fetchall()
+                if (prompt_id,) in ancestors:
+                    return False
+            if position is None:
+                position = self.db.execute(
+                    "SELECT COALESCE(MAX(position) + 1, 0) FROM prompts WHERE parent IS ?", (parent,)
+                ).fetchone()[0]
+            else:
+                self.db.execute(
+                    "UPDATE prompts SET position = position + 1 WHERE parent IS ? AND position >= ?", (parent, position)
+                )
+            self.db.execute("UPDATE prompts SET parent = ?, position = ? WHERE id = ?", (parent, position, prompt_id))
+            self.revision += 1
+            return True
+
+    def position_of(self, prompt_id):
+        with self.lock:
+            row = self.db.execute("SELECT position FROM prompts WHERE id = ?", (prompt_id,)).fetchone()
+            return row[0] if row else None
+
+    def import_json(self, data, parent=None):
+        # Merges the workflow 'prompts' structure ([{'text', 'children'}]) into the library.
+        # Entries already present under the same parent are reused, so importing twice adds nothing.
+        with self.lock, self.db:
+            self.import_nodes(data, parent)
+            self.revision += 1
+
+    def import_nodes(self, nodes, parent):
+        existing = {text: prompt_id for prompt_id, text in self.db.execute(
+            "SELECT id, text FROM prompts WHERE parent IS ?", (parent,))}
+        position = self.db.execute(
+            "SELECT COALESCE(MAX(position) + 1, 0) FROM prompts WHERE parent IS ?", (parent,)
+        ).fetchone()[0]
+        for node in nodes:
+            children = node.get('children', [])
+            prompt_id = existing.get(node['text'])
+            if prompt_id is None:
+                prompt_id = self.db.execute(
+                    "INSERT INTO prompts (parent, position, text, is_folder, tags, uses) VALUES (?, ?, ?, ?, ?, ?)",
+                    (parent, position, node['text'], int(bool(children) or node.get('folder', False)),
+                     node.get('tags', ""), node.get('uses', 0))
+                ).lastrowid
+                existing[node['text']] = prompt_id
+                position += 1
+            if children:
+                self.import_nodes(children, prompt_id)
+
+    def export_json(self):
+        # The whole library in the workflow 'prompts' structure
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, parent, text, is_folder, tags, uses FROM prompts ORDER BY parent, position, id"
+            ).fetchall()
+        nodes = {}
+        roots = []
+        for prompt_id, parent, text, is_folder, tags, uses in rows:
+            node = {'text': text, 'children': []}
+            if is_folder:
+                node['folder'] = True
+            if tags:
+                node['tags'] = tags
+            if uses:
+                node['uses'] = uses
+            nodes[prompt_id] = (parent, node)
+        for parent, node in nodes.values():
+            if parent is None:
+                roots.append(node)
+            elif parent in nodes:
+                nodes[parent][1]['children'].append(node)
+        return roots
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import time
+
+
+class ResponseCache:
+    # On-disk cache of completion replies, one JSON file per content-addressed key.
+    # A hit refreshes the file's mtime, so mtimes order entries for LRU eviction.
+    def __init__(self, directory, max_entries=500, max_bytes=50 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(model, prompt, max_tokens, endpoint):
+        data = json.dumps([model, prompt, max_tokens, endpoint], ensure_ascii=False)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self.path_for(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - entry.get('created', 0) > self.ttl:
+            self.remove(path)
+            return None
+
+        os.utime(path)
+        return entry.get('reply')
+
+    def put(self, key, reply):
+        path = self.path_for(key)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.time(), 'reply': reply}, f)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self):
+        now = time.time()
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                stat = entry.stat()
+                # mtime is bumped on every hit, so only entries idle for the whole TTL expire here
+                if now - stat.st_mtime > self.ttl:
+                    self.remove(entry.path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, path = entries.pop(0)
+            self.remove(path)
+            total_bytes -= size
+
+    def clear(self):
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                self.remove(entry.path)
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,62 @@
+class ResponseParser:
+    # Incremental parser for the mkdir / touch / "echo ... >" / "# File:" grammar of AI responses.
+    # Text can be fed in arbitrary pieces; every complete line is dispatched to the handler,
+    # and a "# File:" block is handed over as soon as the next header (or the end) is seen.
+    def __init__(self, handler):
+        self.handler = handler
+        self.buffer = ""
+        self.current_file = None
+        self.file_contents = []
+
+    def feed(self, text):
+        self.buffer += text
+        if "\n" not in self.buffer:
+            return
+        lines = self.buffer.split("\n")
+        self.buffer = lines.pop()
+        for line in lines:
+            self.parse_line(line)
+
+    def close(self):
+        if self.buffer:
+            self.parse_line(self.buffer)
+            self.buffer = ""
+        self.end_file()
+
+    def end_file(self):
+        if self.current_file:
+            self.handler.end_file(self.current_file, self.file_contents)
+        self.current_file = None
+        self.file_contents = []
+
+    def parse_line(self, line):
+        line = line.strip()
+        if len(line) == 0:
+            return
+
+        if line.startswith("mkdir"):
+            parts = line.split(" ", 1)
+            if len(parts) == 2:
+                self.handler.make_directory(parts[1])
+
+        elif line.startswith("touch"):
+            parts = line.split(" ", 1)
+            if len(parts) == 2:
+                self.handler.touch_file(parts[1])
+
+        elif line.startswith("echo"):
+            parts = line.split(">", 1)
+            if len(parts) < 2:
+                return
+            file_content = parts[0].replace("echo ", "").strip()
+            target_file = parts[1].strip()
+            self.handler.append_to_file(target_file, file_content)
+
+        elif line.startswith("# File:"):
+            self.end_file()
+            self.current_file = line.split(":", 1)[1].strip()
+            self.handler.begin_file(self.current_file)
+
+        elif self.current_file:
+            self.file_contents.append(line)
+            self.handler.file_line(self.current_file, line)
@@ -0,0 +1,66 @@
+import os
+import threading
+
+
+class RotatingLog:
+    # Append-only text log spread over path, path.1 ... path.<backups>, newest first. When the
+    # current file reaches max_bytes it becomes path.1 and the oldest file is dropped.
+    def __init__(self, path, max_bytes=1024 * 1024, backups=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()
+        self.file = None
+
+    def write(self, text):
+        if not text:
+            return
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, 'a', encoding='utf-8', errors='replace')
+            self.file.write(text)
+            self.file.flush()
+            if self.file.tell() >= self.max_bytes:
+                self.rotate()
+
+    def rotate(self):
+        self.file.close()
+        self.file = None
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def files(self):
+        paths = [self.path] + [f"{self.path}.{index}" for index in range(1, self.backups + 1)]
+        return [path for path in paths if os.path.exists(path)]
+
+    def read_page(self, page, page_lines=500):
+        # Lines of one page, oldest first; page 0 holds the newest lines. Files are read newest
+        # first and only until the page is covered. Returns (lines, whether older lines exist).
+        wanted = (page + 1) * page_lines
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+            newest_first = []
+            for path in self.files():
+                if len(newest_first) > wanted:
+                    break
+                try:
+                    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                        newest_first.extend(reversed(f.read().splitlines()))
+                except OSError:
+                    continue
+        has_older = len(newest_first) > wanted
+        page_slice = newest_first[page * page_lines:wanted]
+        return list(reversed(page_slice)), has_older
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,260 @@
+import os
+import re
+import time
+
+from PyQt6.QtCore import QObject, QTimer
+from PyQt6.QtGui import QColor, QFont, QTextCharFormat, QTextLayout
+
+TICK_BUDGET = 0.008  # Seconds of highlighting per event loop tick
+
+EXTENSIONS = {
+    ".py": "python", ".pyw": "python",
+    ".js": "javascript", ".mjs": "javascript", ".cjs": "javascript", ".jsx": "javascript",
+    ".ts": "javascript", ".tsx": "javascript",
+    ".html": "html", ".htm": "html", ".xml": "html", ".svg": "html",
+    ".json": "json",
+    ".sh": "shell", ".bash": "shell", ".zsh": "shell",
+}
+
+STYLES = {
+    "keyword": ("#569cd6", True, False),
+    "builtin": ("#4ec9b0", False, False),
+    "function": ("#dcdcaa", False, False),
+    "decorator": ("#c586c0", False, False),
+    "string": ("#ce9178", False, False),
+    "comment": ("#6a9955", False, True),
+    "number": ("#b5cea8", False, False),
+    "tag": ("#569cd6", False, False),
+    "attribute": ("#9cdcfe", False, False),
+    "key": ("#9cdcfe", False, False),
+    "variable": ("#9cdcfe", False, False),
+}
+
+
+def words(*names):
+    return r"\b(?:" + "|".join(names) + r")\b"
+
+
+DOUBLE_QUOTED = r'"(?:[^"\\]|\\.)*"?'
+SINGLE_QUOTED = r"'(?:[^'\\]|\\.)*'?"
+
+# Per language: single-line tokens as (kind, regex) in priority order, and multi-line
+# constructs as (kind, start regex, end regex). The leftmost match wins; at the same position
+# the earlier rule does.
+RULES = {
+    "python": (
+        [
+            ("comment", r"#.*"),
+            ("string", r"[rRbBuUfF]{0,2}(?:" + DOUBLE_QUOTED + "|" + SINGLE_QUOTED + ")"),
+            ("decorator", r"@[\w.]+"),
+            ("function", r"(?<=\bdef )\w+|(?<=\bclass )\w+"),
+            ("keyword", words(
+                "and", "as", "assert", "async", "await", "break", "class", "continue", "def", "del",
+                "elif", "else", "except", "finally", "for", "from", "global", "if", "import", "in",
+                "is", "lambda", "nonlocal", "not", "or", "pass", "raise", "return", "try", "while",
+                "with", "yield", "match", "case")),
+            ("builtin", words("True", "False", "None", "self", "cls", "print", "len", "range", "super")),
+            ("number", r"\b\d[\d_]*(?:\.\d+)?(?:[eE][+-]?\d+)?j?\b"),
+        ],
+        [
+            ("string", r'[rRbBuUfF]{0,2}"""', r'"""'),
+            ("string", r"[rRbBuUfF]{0,2}'''", r"'''"),
+        ],
+    ),
+    "javascript": (
+        [
+            ("comment", r"//.*"),
+            ("string", DOUBLE_QUOTED + "|" + SINGLE_QUOTED + r"|`(?:[^`\\]|\\.)*`"),
+            ("function", r"(?<=\bfunction )\w+|(?<=\bclass )\w+"),
+            ("keyword", words(
+                "async", "await", "break", "case", "catch", "class", "const", "continue", "default",
+                "delete", "do", "else", "export", "extends", "finally", "for", "from", "function",
+                "if", "import", "in", "instanceof", "let", "new", "of", "return", "switch", "throw",
+                "try", "typeof", "var", "void", "while", "yield", "interface", "type")),
+            ("builtin", words("true", "false", "null", "undefined", "this", "console", "window", "document")),
+            ("number", r"\b\d[\d_]*(?:\.\d+)?(?:[eE][+-]?\d+)?n?\b"),
+        ],
+        [
+            ("comment", r"/\*", r"\*/"),
+        ],
+    ),
+    "html": (
+        [
+            ("tag", r"</?[\w:-]+|/?>"),
+            ("attribute", r"[\w:-]+(?==)"),
+            ("string", DOUBLE_QUOTED + "|" + SINGLE_QUOTED),
+            ("builtin", r"&#?\w+;"),
+        ],
+        [
+            ("comment", r"<!--", r"-->"),
+        ],
+    ),
+    "json": (
+        [
+            ("key", DOUBLE_QUOTED + r"(?=\s*:)"),
+            ("string", DOUBLE_QUOTED),
+            ("builtin", words("true", "false", "null")),
+            ("number", r"-?\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b"),
+        ],
+        [],
+    ),
+    "shell": (
+        [
+            ("comment", r"(?<!\S)#.*"),
+            ("string", DOUBLE_QUOTED + "|" + SINGLE_QUOTED),
+            ("variable", r"\$\{[^}]*\}|\$[\w@*#?$!-]"),
+            ("keyword", words(
+                "if", "then", "else", "elif", "fi", "for", "in", "do", "done", "while", "until",
+                "case", "esac", "function", "return", "local", "export")),
+            ("builtin", words("echo", "cd", "exit", "source", "set", "unset", "read", "test")),
+            ("number", r"\b\d+\b"),
+        ],
+        [],
+    ),
+}
+
+
+class LanguageRules:
+    # One combined regex per language, so each line is scanned left to right in a single pass
+    def __init__(self, tokens, multiline):
+        # Multi-line openers come first, so '"""' is not taken for an empty string
+        parts = [f"(?P<m{i}>{start})" for i, (kind, start, end) in enumerate(multiline)]
+        parts += [f"(?P<t{i}>{regex})" for i, (kind, regex) in enumerate(tokens)]
+        self.pattern = re.compile("|".join(parts))
+        self.kinds = {f"t{i}": kind for i, (kind, regex) in enumerate(tokens)}
+        self.multiline = [(kind, re.compile(end)) for kind, start, end in multiline]
+
+    def highlight(self, text, state):
+        # Returns ([(start, length, kind)], end state). State 0 is plain code; state n > 0
+        # means the line ends inside multi-line construct n - 1.
+        spans = []
+        position = 0
+        if state > 0:
+            kind, end = self.multiline[state - 1]
+            match = end.search(text)
+            if match is None:
+                return [(0, len(text), kind)], state
+            spans.append((0, match.end(), kind))
+            position = match.end()
+
+        while True:
+            match = self.pattern.search(text, position)
+            if match is None:
+                return spans, 0
+            group = match.lastgroup
+            start = match.start()
+            if group[0] == "m":
+                index = int(group[1:])
+                kind, end = self.multiline[index]
+                closing = end.search(text, match.end())
+                if closing is None:
+                    spans.append((start, len(text) - start, kind))
+                    return spans, index + 1
+                position = closing.end()
+            else:
+                kind = self.kinds[group]
+                position = max(match.end(), start + 1)
+            spans.append((start, position - start, kind))
+
+
+# Compiled once and shared by every editor
+LANGUAGES = {name: LanguageRules(*rules) for name, rules in RULES.items()}
+formats = {}
+
+
+def language_for_path(path):
+    if not path:
+        return None
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def text_format(kind):
+    # QTextCharFormats need a running QGuiApplication, so they are created on first use
+    if kind not in formats:
+        color, bold, italic = STYLES[kind]
+        char_format = QTextCharFormat()
+        char_format.setForeground(QColor(color))
+        if bold:
+            char_format.setFontWeight(QFont.Weight.Bold)
+        char_format.setFontItalic(italic)
+        formats[kind] = char_format
+    return formats[kind]
+
+
+class SyntaxHighlighter(QObject):
+    # Highlights a QTextDocument block by block, keeping each block's end state in its user
+    # state. After an edit, the edited blocks are highlighted and the following ones only
+    # until a block ends in the same state as before. Work is done in slices of TICK_BUDGET
+    # per event loop tick, so loading a large file never blocks input. (QSyntaxHighlighter
+    # is not used because attaching it rehighlights the whole document at once.)
+    def __init__(self, document, language):
+        super().__init__(document)
+        self.document = document
+        self.rules = LANGUAGES[language]
+        self.pending = None  # (first, last) block numbers that must be highlighted
+        self.highlighting = False
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.highlight_pending)
+        document.contentsChange.connect(self.on_contents_change)
+        self.schedule(0, document.blockCount() - 1)
+
+    def is_pending(self):
+        return self.pending is not None
+
+    def on_contents_change(self, position, removed, added):
+        # Applying formats marks the document dirty, which lands here too
+        if self.highlighting:
+            return
+        first = self.document.findBlock(position).blockNumber()
+        last = self.document.findBlock(min(position + added, self.document.characterCount() - 1)).blockNumber()
+        self.schedule(first, last)
+        # Typing is highlighted right away; only large changes spill over to later ticks
+        self.highlight_pending()
+
+    def schedule(self, first, last):
+        if self.pending is not None:
+            first = min(first, self.pending[0])
+            last = max(last, self.pending[1])
+        self.pending = (first, last)
+        self.timer.start(0)
+
+    def highlight_pending(self):
+        if self.pending is None:
+            return
+        first, last = self.pending
+        deadline = time.perf_counter() + TICK_BUDGET
+        block = self.document.findBlockByNumber(first)
+        self.highlighting = True
+        try:
+            while block.isValid():
+                changed = self.highlight_block(block)
+                number = block.blockNumber()
+                block = block.next()
+                if number >= last and not changed:
+                    break
+                if block.isValid() and time.perf_counter() > deadline:
+                    self.pending = (number + 1, max(last, number + 1))
+                    self.timer.start(0)
+                    return
+        finally:
+            self.highlighting = False
+        self.pending = None
+
+    def highlight_block(self, block):
+        # Returns whether the block's end state changed
+        previous = block.previous()
+        state = max(previous.userState(), 0) if previous.isValid() else 0
+        spans, end_state = self.rules.highlight(block.text(), state)
+        ranges = []
+        for start, length, kind in spans:
+            format_range = QTextLayout.FormatRange()
+            format_range.start = start
+            format_range.length = length
+            format_range.format = text_format(kind)
+            ranges.append(format_range)
+        block.layout().setFormats(ranges)
+        self.document.markContentsDirty(block.position(), block.length())
+        changed = block.userState() != end_state
+        block.setUserState(end_state)
+        return changed
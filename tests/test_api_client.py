@@ -0,0 +1,79 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api_client import ApiClient
+
+
+class StandIn(BaseHTTPRequestHandler):
+    # Answers each request with the next (status, headers) in `replies`, then 200
+    replies = []
+    hits = []
+
+    def reply(self):
+        StandIn.hits.append(self.command)
+        status, headers = StandIn.replies.pop(0) if StandIn.replies else (200, {})
+        body = b'{"data": [{"id": "m"}], "choices": [{"text": "ok"}]}' if status == 200 else b"{}"
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.reply()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.reply()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def client():
+    StandIn.replies = []
+    StandIn.hits = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    client = ApiClient(f"{base}/v1/models", f"{base}/v1/completions", backoff_factor=0)
+    yield client
+    client.close()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def post_status(client):
+    with client.post_completion({"prompt": "x"}) as response:
+        return response.status_code
+
+
+def test_get_is_retried_on_server_errors(client):
+    StandIn.replies = [(500, {}), (502, {})]
+    assert client.get_models() == ["m"]
+    assert StandIn.hits == ["GET"] * 3
+
+
+@pytest.mark.parametrize("status", [500, 502, 504, 503, 429])
+def test_post_is_not_retried_without_retry_after(client, status):
+    StandIn.replies = [(status, {})]
+    assert post_status(client) == status
+    assert StandIn.hits == ["POST"]
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_post_is_retried_when_server_asks(client, status):
+    StandIn.replies = [(status, {"Retry-After": "0"})]
+    assert post_status(client) == 200
+    assert StandIn.hits == ["POST", "POST"]
+
+
+def test_post_server_error_with_retry_after_is_not_retried(client):
+    StandIn.replies = [(500, {"Retry-After": "0"})]
+    assert post_status(client) == 500
+    assert StandIn.hits == ["POST"]
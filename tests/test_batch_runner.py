@@ -0,0 +1,98 @@
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api_client import ApiClient
+from batch_runner import BatchRunner, Workspace
+
+REPLY = "# File: hello.py\nprint('hello')\n"
+
+
+class StandIn(BaseHTTPRequestHandler):
+    # Completions endpoint answering REPLY, as server-sent events for stream requests
+    prompts = []
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        StandIn.prompts.append(request['prompt'])
+        if request.get('stream'):
+            body = "".join(f"data: {json.dumps({'choices': [{'text': line}]})}\n\n"
+                           for line in REPLY.splitlines(keepends=True)) + "data: [DONE]\n\n"
+            content_type = "text/event-stream"
+        else:
+            body = json.dumps({'choices': [{'text': REPLY}]})
+            content_type = "application/json"
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def client():
+    StandIn.prompts = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    client = ApiClient(f"{base}/v1/models", f"{base}/v1/completions", backoff_factor=0)
+    yield client
+    client.close()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_run_task_applies_reply_and_writes_result(client, tmp_path):
+    output = io.StringIO()
+    workspace = Workspace(str(tmp_path / "ws"))
+    runner = BatchRunner(client, [workspace], "model", output=output)
+
+    result = runner.run_task(0, {'request_id': "r-1", 'title': "Greet", 'body': "Say hello"}, workspace)
+
+    assert result['status'] == "ok"
+    assert result['task'] == "r-1" and result['model'] == "model" and result['workspace'] == workspace.path
+    assert result['files'] == [{'path': "hello.py", 'action': "written"}]
+    assert "reply" not in result
+    assert set(result['timings']) == {'prompt', 'first_byte', 'completion', 'apply', 'total'}
+    assert (tmp_path / "ws" / "hello.py").read_text() == "print('hello')\n"
+    assert "Greet\n\nSay hello" in StandIn.prompts[0]
+    assert json.loads(output.getvalue()) == result
+
+
+def test_dry_run_keeps_reply(client, tmp_path):
+    workspace = Workspace(str(tmp_path / "ws"))
+    runner = BatchRunner(client, [workspace], "model", apply=False, stream=True)
+
+    streamed = []
+    result = runner.run_task(0, {'prompt': "Say hello", 'model': "other"}, workspace, on_text=streamed.append)
+
+    assert result['status'] == "ok" and result['model'] == "other"
+    assert result['reply'] == REPLY.strip()
+    assert "".join(streamed) == REPLY
+    assert not (tmp_path / "ws" / "hello.py").exists()
+
+
+def test_cancelled_task_applies_nothing(client, tmp_path):
+    workspace = Workspace(str(tmp_path / "ws"))
+    runner = BatchRunner(client, [workspace], "model", stream=True)
+
+    result = runner.run_task(3, {'prompt': "Say hello"}, workspace, cancelled=lambda: True)
+
+    assert result['status'] == "cancelled"
+    assert result['task'] == 3
+    assert "files" not in result and "error" not in result
+    assert not (tmp_path / "ws" / "hello.py").exists()
+
+
+def test_task_without_text_is_an_error(client, tmp_path):
+    workspace = Workspace(str(tmp_path / "ws"))
+    result = BatchRunner(client, [workspace], "model").run_task(0, {}, workspace)
+    assert result['status'] == "error" and "prompt" in result['error']
+    assert StandIn.prompts == []
@@ -0,0 +1,38 @@
+from context_packer import ContextPacker
+
+
+def test_referenced_workspace_file_is_packed_once(tmp_path):
+    (tmp_path / "app.py").write_text("print(1)\n")
+    (tmp_path / "notes.txt").write_text("notes\n")
+    packed = ContextPacker().pack(str(tmp_path), "fix app.py", 1000, [str(tmp_path / "app.py")])
+    assert packed.count("# Context file: app.py") == 1
+    assert packed.index("# Context file: app.py") < packed.index("# Context file: notes.txt")
+
+
+def test_referenced_file_outside_workspace_is_labelled_by_name(tmp_path):
+    workspace = tmp_path / "ws"
+    workspace.mkdir()
+    (workspace / "app.py").write_text("print(1)\n")
+    (tmp_path / "spec.md").write_text("spec\n")
+    packed = ContextPacker().pack(str(workspace), "implement", 1000, [str(tmp_path / "spec.md")])
+    assert "# Context file: spec.md\nspec" in packed
+    assert "# Context file: app.py" in packed
+
+
+def test_files_already_seen_are_only_named(tmp_path):
+    (tmp_path / "app.py").write_text("print(1)\n")
+    (tmp_path / "lib.py").write_text("x = 2\n")
+    seen = []
+    packed = ContextPacker().pack(str(tmp_path), "task", 1000,
+                                  seen=lambda label, text: seen.append((label, text)) or label == "lib.py")
+    assert ("lib.py", "x = 2") in seen
+    assert "# Context file: app.py\nprint(1)" in packed
+    assert "# Context file: lib.py" not in packed
+    assert packed.endswith("Unchanged files shown earlier in this conversation: lib.py")
+
+
+def test_excerpts_are_not_write_instructions(tmp_path):
+    (tmp_path / "app.py").write_text("print(1)\n" * 200)
+    packed = ContextPacker().pack(str(tmp_path), "task", 100)
+    assert "... (truncated)" in packed
+    assert "# File:" not in packed
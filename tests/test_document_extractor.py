@@ -0,0 +1,13 @@
+from document_extractor import select_chunks
+
+
+def test_select_chunks_keeps_document_order_within_budget():
+    chunks = ["intro text", "the parser reads tokens", "unrelated", "delta encoding in the parser"]
+    assert select_chunks(chunks, "fix the parser delta", 55) == [chunks[1], chunks[3]]
+
+
+def test_window_of_oversized_chunk_counts_against_budget():
+    chunks = ["x" * 50 + " the parser delta " + "y" * 50, "parser delta", "delta"]
+    selected = select_chunks(chunks, "the parser delta", 100)
+    assert sum(len(text) for text in selected) <= 100
+    assert "parser delta" in selected[0]
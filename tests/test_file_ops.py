@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+import file_ops
+from file_ops import (
+    JOURNAL_FILE, FileOperationError, OperationPlan, apply_plan, diff_hunks, recover_journal, verify_unchanged
+)
+
+
+class Crash(BaseException):
+    # Stands in for the process dying; not caught by apply_plan's rollback
+    pass
+
+
+def make_plan():
+    plan = OperationPlan()
+    plan.end_file("app.py", ["new"])
+    plan.end_file("pkg/added.py", ["added"])
+    return plan
+
+
+def listing(workspace):
+    return sorted(os.path.relpath(os.path.join(root, name), workspace)
+                  for root, dirs, names in os.walk(workspace) for name in names)
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    (tmp_path / "app.py").write_text("old\n")
+    return tmp_path
+
+
+def test_apply_plan_writes_all_files(workspace):
+    directories, changes = apply_plan(str(workspace), make_plan())
+    assert directories == [str(workspace / "pkg")]
+    assert [change.action for change in changes] == ["written", "written"]
+    assert (workspace / "app.py").read_text() == "new\n"
+    assert (workspace / "pkg" / "added.py").read_text() == "added\n"
+    assert listing(workspace) == ["app.py", os.path.join("pkg", "added.py")]
+
+
+def test_failed_apply_rolls_back(workspace, monkeypatch):
+    replace = os.replace
+
+    def failing_replace(source, target):
+        if target.endswith("added.py"):
+            raise OSError("disk full")
+        replace(source, target)
+
+    monkeypatch.setattr(file_ops.os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        apply_plan(str(workspace), make_plan())
+    monkeypatch.undo()
+    assert (workspace / "app.py").read_text() == "old\n"
+    assert listing(workspace) == ["app.py"]
+
+
+def test_crash_while_writing_temp_files_is_recovered(workspace, monkeypatch):
+    write_temp = file_ops.write_temp
+
+    def crashing_write_temp(path, temp_path, text):
+        write_temp(path, temp_path, text)
+        raise Crash()
+
+    monkeypatch.setattr(file_ops, "write_temp", crashing_write_temp)
+    with pytest.raises(Crash):
+        apply_plan(str(workspace), make_plan())
+    monkeypatch.undo()
+    assert any(name.endswith(".tmp") for name in listing(workspace))
+
+    assert recover_journal(str(workspace))
+    assert (workspace / "app.py").read_text() == "old\n"
+    assert listing(workspace) == ["app.py"]
+
+
+def test_crash_while_removing_backups_keeps_committed_plan(workspace, monkeypatch):
+    remove_file = file_ops.remove_file
+
+    def crashing_remove_file(path):
+        if path.endswith(".bak"):
+            raise Crash()
+        remove_file(path)
+
+    monkeypatch.setattr(file_ops, "remove_file", crashing_remove_file)
+    with pytest.raises(Crash):
+        apply_plan(str(workspace), make_plan())
+    monkeypatch.undo()
+
+    assert not (workspace / JOURNAL_FILE).exists()
+    assert not recover_journal(str(workspace))
+    assert (workspace / "app.py").read_text() == "new\n"
+    assert (workspace / "pkg" / "added.py").read_text() == "added\n"
+
+
+def test_touch_of_new_file_has_no_hunks(workspace):
+    plan = OperationPlan()
+    plan.touch_file("empty.txt")
+    [change] = plan.resolve(str(workspace))
+    assert (change.action, change.old_text, change.new_text) == ("created", None, "")
+    assert diff_hunks(change) == []
+
+
+def test_verify_unchanged_refuses_edited_files(workspace):
+    changes = make_plan().resolve(str(workspace))
+    verify_unchanged(changes)
+    (workspace / "app.py").write_text("edited\n")
+    with pytest.raises(FileOperationError):
+        verify_unchanged(changes)
+    (workspace / "pkg").mkdir()
+    (workspace / "app.py").write_text("old\n")
+    (workspace / "pkg" / "added.py").write_text("someone else\n")
+    with pytest.raises(FileOperationError):
+        verify_unchanged(changes)
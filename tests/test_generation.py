@@ -0,0 +1,40 @@
+from context_packer import ContextPacker
+from generation import ChatHistory
+
+
+def test_history_is_trimmed_to_half_the_budget():
+    history = ChatHistory(max_tokens=10)
+    for index in range(4):
+        history.add(f"q{index}", "a" * 8)  # 1 + 2 tokens
+    assert [user for user, reply, tokens in history.turns] == ["q3"]
+    history.add("q4", "a" * 8)
+    assert [user for user, reply, tokens in history.turns] == ["q3", "q4"]
+
+
+def test_newest_turn_is_kept_when_over_budget():
+    history = ChatHistory(max_tokens=10)
+    history.add("q0", "a" * 8)
+    history.add("q1", "a" * 80)
+    assert [user for user, reply, tokens in history.turns] == ["q1"]
+    assert history.messages("system", "q2")[1:] == [
+        {"role": "user", "content": "q1"},
+        {"role": "assistant", "content": "a" * 80},
+        {"role": "user", "content": "q2"},
+    ]
+
+
+def test_files_in_history_are_only_named(tmp_path):
+    (tmp_path / "sent.py").write_text("x = 1\n")
+    (tmp_path / "written.py").write_text("y = 2\n")
+    (tmp_path / "changed.py").write_text("z = 4\n")
+    packer = ContextPacker()
+    history = ChatHistory()
+    history.add(packer.pack(str(tmp_path), "task", 4000), "# File: written.py\ny = 2\n")
+    history.turns[0] = (history.turns[0][0].replace("z = 4", "z = 3"),) + history.turns[0][1:]
+
+    text = packer.pack(str(tmp_path), "task", 4000, seen=history.contains_file)
+    assert "# Context file: changed.py\nz = 4" in text
+    assert "# Context file: sent.py" not in text
+    assert "# Context file: written.py" not in text
+    named = text.rpartition("Unchanged files shown earlier in this conversation: ")[2]
+    assert sorted(named.split(", ")) == ["sent.py", "written.py"]
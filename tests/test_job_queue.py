@@ -0,0 +1,49 @@
+import pytest
+
+from file_ops import FileOperationError
+from job_queue import JobService, JobStore
+
+
+class Runner:
+    # Stands in for BatchRunner; reports whether the job was cancelled when it ran
+    def workspace_for(self, task):
+        return task['workspace']
+
+    def run_task(self, task_id, task, workspace, on_text=None, cancelled=None):
+        return {'task': task_id, 'status': "cancelled" if cancelled() else "ok"}
+
+
+def test_cancel_between_claim_and_run_reaches_the_job(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    service = JobService(store, Runner(), str(tmp_path))
+    job = service.submit("alice", "ws", "task")
+
+    claimed = store.claim(service.register)
+    assert claimed['id'] == job['id'] and claimed['status'] == "running"
+    service.cancel(job['id'])
+    service.run(claimed)
+
+    assert store.get(job['id'])['status'] == "cancelled"
+    assert job['id'] not in service.cancel_events
+    store.close()
+
+
+def test_queued_job_is_cancelled_in_the_store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    service = JobService(store, Runner(), str(tmp_path))
+    job = service.submit("alice", "ws", "task")
+    assert service.cancel(job['id'])['status'] == "cancelled"
+    assert store.claim(service.register) is None
+    assert service.cancel_events == {}
+    store.close()
+
+
+def test_workspace_names_are_top_level(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    service = JobService(store, Runner(), str(tmp_path))
+    assert service.workspace_path("ws") == str(tmp_path / "ws")
+    for name in ("a/b", "a\\b", "..", "../ws", ""):
+        with pytest.raises(FileOperationError):
+            service.submit("alice", name, "task")
+    assert store.claim(service.register) is None
+    store.close()
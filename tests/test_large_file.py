@@ -0,0 +1,41 @@
+import pytest
+
+import large_file
+from large_file import FileChangedError, LineIndex
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    # Small blocks, so a few hundred lines span several of them
+    monkeypatch.setattr(large_file, "BLOCK_SIZE", 64)
+    path = tmp_path / "log.txt"
+    path.write_bytes(b"".join(f"line {i}\n".encode() for i in range(300)) + b"last")
+    index = LineIndex(str(path))
+    index.build()
+    yield index
+    index.close()
+
+
+def test_lines_and_positions(index):
+    assert index.line_count() == 301
+    assert index.lines(0, 2) == ["line 0", "line 1"]
+    assert index.lines(299, 5) == ["line 299", "last"]
+    offset = index.find("line 150")
+    assert index.line_at(offset) == 150
+    assert index.text(index.line_start(150), offset) == ""
+    assert index.find("missing") == -1
+
+
+def test_truncated_file_stops_reads(index):
+    with open(index.path, 'r+b') as f:
+        f.truncate(10)
+    for read in (lambda: index.lines(200, 10), index.line_count, lambda: index.find("line 250"),
+                 lambda: index.line_at(2000)):
+        with pytest.raises(FileChangedError):
+            read()
+
+
+def test_growing_file_is_still_readable(index):
+    with open(index.path, 'ab') as f:
+        f.write(b"\nappended\n")
+    assert index.lines(0, 1) == ["line 0"]
@@ -0,0 +1,80 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api_client import ApiClient
+from model_catalog import ModelCatalog
+
+
+class StandIn(BaseHTTPRequestHandler):
+    # Serves `models` with ETag `etag` and answers 304 to a matching If-None-Match
+    models = ["a", "b"]
+    etag = '"1"'
+    conditional = []
+
+    def do_GET(self):
+        StandIn.conditional.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == StandIn.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps({'data': [{'id': model} for model in StandIn.models]}).encode()
+        self.send_response(200)
+        self.send_header("ETag", StandIn.etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint():
+    StandIn.models = ["a", "b"]
+    StandIn.etag = '"1"'
+    StandIn.conditional = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/v1/models"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def client(endpoint):
+    client = ApiClient(endpoint, endpoint.replace("/v1/models", "/v1/completions"))
+    yield client
+    client.close()
+
+
+def test_revalidate_uses_etag_and_persists(tmp_path, endpoint, client):
+    path = str(tmp_path / "models_cache.json")
+    catalog = ModelCatalog(path)
+    assert catalog.is_stale(endpoint)
+    assert catalog.revalidate(client, endpoint) == (["a", "b"], True)
+    assert not catalog.is_stale(endpoint)
+
+    # A new catalog reads the cache from disk and gets a 304 for it
+    catalog = ModelCatalog(path)
+    assert catalog.models(endpoint) == ["a", "b"]
+    assert catalog.revalidate(client, endpoint) == (["a", "b"], False)
+    assert StandIn.conditional == [None, '"1"']
+
+
+def test_changed_catalogue_is_reported(tmp_path, endpoint, client):
+    catalog = ModelCatalog(str(tmp_path / "models_cache.json"))
+    catalog.revalidate(client, endpoint)
+    StandIn.models = ["a", "b", "c"]
+    StandIn.etag = '"2"'
+    assert catalog.revalidate(client, endpoint) == (["a", "b", "c"], True)
+    assert catalog.models("http://other/v1/models") == []
+
+
+def test_entries_expire_after_max_age(tmp_path, endpoint, client):
+    catalog = ModelCatalog(str(tmp_path / "models_cache.json"), max_age=-1)
+    catalog.revalidate(client, endpoint)
+    assert catalog.is_stale(endpoint)
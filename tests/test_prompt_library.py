@@ -0,0 +1,46 @@
+from prompt_library import PromptLibrary
+
+
+def texts(library, parent=None):
+    return [row[1] for row in library.children(parent)]
+
+
+def test_remove_prompt_keeps_same_text_elsewhere(tmp_path):
+    library = PromptLibrary(str(tmp_path / "prompts.sqlite3"))
+    folder = library.add("Folder", is_folder=True)
+    nested = library.add("Refactor", folder)
+    main = library.add("Refactor")
+    library.add("Refactor")
+
+    assert library.remove_prompt(main) is True
+    assert texts(library) == ["Folder", "Refactor"]
+    assert [row[0] for row in library.children(folder)] == [nested]
+
+    # Folders are not removed, and a no-op leaves the revision alone
+    revision = library.revision
+    assert library.remove_prompt(folder) is False
+    assert library.remove_prompt(main) is False
+    assert library.revision == revision
+    assert texts(library) == ["Folder", "Refactor"]
+
+
+def test_prompts_excludes_folders(tmp_path):
+    library = PromptLibrary(str(tmp_path / "prompts.sqlite3"))
+    folder = library.add("Refactor folder", is_folder=True)
+    library.add("Refactor nested", folder)
+    for index in range(5):
+        library.add(f"Prompt {index}")
+
+    assert len(library.prompts(limit=3)) == 3
+    assert "Refactor folder" not in [row[1] for row in library.prompts(limit=10)]
+    assert [row[1] for row in library.prompts("refac")] == ["Refactor nested"]
+
+
+def test_import_json_merges(tmp_path):
+    library = PromptLibrary(str(tmp_path / "prompts.sqlite3"))
+    library.add("Kept")
+    data = [{'text': "Folder", 'children': [{'text': "Nested", 'children': []}]}]
+    library.import_json(data)
+    library.import_json(data)
+    assert texts(library) == ["Kept", "Folder"]
+    assert texts(library, library.children()[1][0]) == ["Nested"]
@@ -0,0 +1,50 @@
+import json
+import os
+import time
+
+from response_cache import ResponseCache
+
+
+def age(cache, key, seconds):
+    # Moves an entry's last use back by `seconds`
+    then = time.time() - seconds
+    os.utime(cache.path_for(key), (then, then))
+
+
+def test_put_and_get_round_trip(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    key = ResponseCache.make_key("model", "prompt", 100, "http://api")
+    assert cache.get(key) is None
+    cache.put(key, "reply")
+    assert cache.get(key) == "reply"
+    assert key != ResponseCache.make_key("model", "prompt", 200, "http://api")
+
+
+def test_expired_entry_is_a_miss_and_removed(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    cache.put("old", "reply")
+    with open(cache.path_for("old"), 'w', encoding='utf-8') as f:
+        json.dump({'created': time.time() - 120, 'reply': "reply"}, f)
+    assert cache.get("old") is None
+    assert not os.path.exists(cache.path_for("old"))
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    age(cache, "a", 30)
+    age(cache, "b", 20)
+    assert cache.get("a") == "1"  # A hit makes "a" the most recently used
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+
+
+def test_size_limit_evicts_oldest(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=150)
+    cache.put("a", "x" * 60)
+    age(cache, "a", 10)
+    cache.put("b", "y" * 60)
+    assert cache.get("a") is None
+    assert cache.get("b") == "y" * 60
@@ -0,0 +1,74 @@
+import pytest
+
+import tracing
+from tracing import Tracer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(tracing.time, "perf_counter", clock)
+    return clock
+
+
+def test_nested_span_time_is_subtracted(clock):
+    trace = Tracer().start("http://api", "model")
+    with trace.span("apply"):
+        clock.now += 1.0
+        with trace.span("editor"):
+            clock.now += 2.0
+            with trace.span("tree_refresh"):
+                clock.now += 4.0
+        clock.now += 0.5
+    assert trace.phases() == {"apply": 1.5, "editor": 2.0, "tree_refresh": 4.0}
+    assert [start for name, start, duration in trace.spans] == [3.0, 1.0, 0.0]
+
+
+def test_repeated_spans_add_up(clock):
+    trace = Tracer().start("http://api", "model")
+    for seconds in (1.0, 2.0):
+        with trace.span("apply"):
+            clock.now += seconds
+    assert trace.phase("apply") == 3.0
+
+
+def test_record_request_and_tokens_per_second(clock):
+    trace = Tracer().start("http://api", "model", stream=True)
+    trace.record_request({
+        'submitted': 100.0, 'started': 100.5, 'connect': 0.25, 'headers': 101.0,
+        'first_text': 101.5, 'finished': 103.5, 'usage': {'prompt_tokens': 10, 'completion_tokens': 40},
+    })
+    assert trace.phases() == {"queue": 0.5, "connect": 0.25, "first_byte": 0.75, "generation": 2.0}
+    assert trace.tokens() == (10, 40, False)
+    assert trace.tokens_per_second() == 20.0
+
+
+def test_prometheus_text(clock, tmp_path):
+    tracer = Tracer(metrics_path=str(tmp_path / "metrics.prom"))
+    for seconds, status in ((1.0, "ok"), (3.0, "ok"), (5.0, "error")):
+        trace = tracer.start("http://api", 'm"1')
+        trace.reply_chars = 8
+        with trace.span("parse"):
+            clock.now += seconds
+        trace.finish(status)
+        tracer.record(trace)
+
+    text = tracer.prometheus_text()
+    series = 'endpoint="http://api",model="m\\"1"'
+    assert f'blackboxai_request_phase_seconds{{{series},phase="parse",quantile="0.5"}} 1.000000' in text
+    assert f'blackboxai_request_phase_seconds{{{series},phase="parse",quantile="0.95"}} 3.000000' in text
+    assert f'blackboxai_request_phase_seconds_sum{{{series},phase="parse"}} 4.000000' in text
+    assert f'blackboxai_request_phase_seconds_count{{{series},phase="parse"}} 2' in text
+    assert f'blackboxai_requests_total{{{series},status="ok"}} 2' in text
+    assert f'blackboxai_requests_total{{{series},status="error"}} 1' in text
+    assert f'blackboxai_tokens_total{{{series},kind="completion"}} 4' in text
+    assert "# TYPE blackboxai_completion_tokens_per_second summary" in text
+    assert (tmp_path / "metrics.prom").read_text(encoding='utf-8') == text
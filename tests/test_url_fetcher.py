@@ -0,0 +1,106 @@
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from url_fetcher import UrlFetcher, extract_text
+
+PAGE = b"<html><head><title>Docs</title><script>var x;</script></head><body><p>Hello</p><p>World</p></body></html>"
+
+
+class StandIn(BaseHTTPRequestHandler):
+    # Serves PAGE with an ETag and answers 304 to a matching If-None-Match
+    requests_seen = []
+
+    def do_GET(self):
+        StandIn.requests_seen.append((self.path, self.headers.get('If-None-Match')))
+        if self.path == "/missing":
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    StandIn.requests_seen = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    fetcher = UrlFetcher(str(tmp_path), max_workers=2, timeout=5)
+    yield fetcher
+    fetcher.close()
+
+
+def test_extract_text_drops_markup():
+    assert extract_text(PAGE.decode()) == "Docs\n\nHello\nWorld"
+
+
+def test_fetch_caches_extracted_text(server, fetcher):
+    entry = fetcher.fetch(f"{server}/page").result(timeout=5)
+    assert entry['text'] == "Docs\n\nHello\nWorld"
+    assert entry['etag'] == '"v1"'
+    assert fetcher.excerpt(f"{server}/page", 8) == "Docs\n\n... (truncated)"
+
+
+def test_stale_entry_is_revalidated(server, tmp_path):
+    fetcher = UrlFetcher(str(tmp_path), timeout=5, max_age=-1)
+    try:
+        fetcher.fetch(f"{server}/page").result(timeout=5)
+        entry = fetcher.fetch(f"{server}/page").result(timeout=5)
+    finally:
+        fetcher.close()
+    assert entry['revalidated'] is True
+    assert entry['text'] == "Docs\n\nHello\nWorld"
+    assert StandIn.requests_seen == [("/page", None), ("/page", '"v1"')]
+
+
+def test_fetch_of_finished_future_does_not_deadlock(server, fetcher, monkeypatch):
+    # A fresh cache hit can finish before fetch() adds its callbacks; submit() here returns
+    # an already finished future to make that deterministic
+    url = f"{server}/page"
+    entry = fetcher.fetch(url).result(timeout=5)
+
+    def submit(fn, *args):
+        future = Future()
+        future.set_result(entry)
+        return future
+
+    monkeypatch.setattr(fetcher.pool, "submit", submit)
+    outcomes = []
+    thread = threading.Thread(target=fetcher.fetch, args=(url, lambda *args: outcomes.append(args)), daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert outcomes[0][1]['text'] == "Docs\n\nHello\nWorld"
+    assert not fetcher.is_pending(url)
+    assert len(StandIn.requests_seen) == 1
+
+
+def test_failed_fetch_is_reported(server, fetcher):
+    outcomes = []
+    future = fetcher.fetch(f"{server}/missing", lambda url, entry, error: outcomes.append((entry, error)))
+    with pytest.raises(Exception):
+        future.result(timeout=5)
+    assert outcomes and outcomes[0][0] is None and "404" in outcomes[0][1]
+    assert not fetcher.needs_fetch(f"{server}/missing")
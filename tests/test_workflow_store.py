@@ -0,0 +1,50 @@
+import json
+import os
+
+from workflow_store import UNCHANGED, WORKFLOW_VERSION, WorkflowWriter, read_workflow
+
+
+def sections(terminal="log\n" * 100, tabs=None):
+    return {
+        'selected_model': (None, "model"),
+        'open_tabs': (None, tabs or [{'title': "app.py", 'path': "/ws/app.py", 'hash': "abc"}]),
+        'terminal_output': (None, terminal),
+    }
+
+
+def test_round_trip_compresses_terminal_output(tmp_path):
+    path = str(tmp_path / "workflow.json")
+    assert WorkflowWriter(path).write(sections())
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    assert raw['version'] == WORKFLOW_VERSION
+    assert raw['terminal_output']['encoding'] == "zlib+base64"
+
+    workflow = read_workflow(path)
+    assert workflow['terminal_output'] == "log\n" * 100
+    assert workflow['open_tabs'] == [{'title': "app.py", 'path': "/ws/app.py", 'hash': "abc"}]
+    assert workflow['selected_model'] == "model"
+
+
+def test_version_1_files_still_read(tmp_path):
+    path = tmp_path / "old.json"
+    path.write_text(json.dumps({
+        'open_tabs': [{'title': "a.py", 'content': "print(1)"}],
+        'terminal_output': "plain text",
+    }))
+    workflow = read_workflow(str(path))
+    assert workflow['terminal_output'] == "plain text"
+    assert workflow['open_tabs'][0]['content'] == "print(1)"
+
+
+def test_unchanged_sections_do_not_rewrite_the_file(tmp_path):
+    path = str(tmp_path / "workflow.json")
+    writer = WorkflowWriter(path)
+    writer.write({'terminal_output': (1, "first"), 'selected_model': (None, "m")})
+    mtime = os.stat(path).st_mtime_ns
+    assert not writer.write({'terminal_output': (1, UNCHANGED), 'selected_model': (None, "m")})
+    assert os.stat(path).st_mtime_ns == mtime
+    assert writer.is_current('terminal_output', 1)
+
+    assert writer.write({'terminal_output': (2, "second"), 'selected_model': (None, "m")})
+    assert read_workflow(path)['terminal_output'] == "second"
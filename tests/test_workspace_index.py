@@ -0,0 +1,29 @@
+from workspace_index import WorkspaceIndex
+
+
+def test_refresh_indexes_files_and_skips_ignored_dirs(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "app.py").write_text("a\nb\n")
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "dep.js").write_text("x")
+    index = WorkspaceIndex(str(tmp_path))
+    assert index.refresh() > 0 and index.is_built()
+    assert [row[0] for row in index.files()] == ["src/app.py"]
+    assert index.lookup(str(tmp_path / "src" / "app.py"))[4] == 2
+    assert index.refresh() == 0
+    index.close()
+
+
+def test_update_paths_heals_a_file_written_in_place(tmp_path):
+    path = tmp_path / "log.txt"
+    path.write_text("one\n")
+    index = WorkspaceIndex(str(tmp_path))
+    index.refresh()
+    old_hash = index.lookup(str(path))[3]
+
+    with open(path, 'a') as f:
+        f.write("two\n")
+    assert index.update_paths([str(path)]) == 1
+    _, size, _, new_hash, lines = index.lookup(str(path))
+    assert (size, lines) == (8, 2) and new_hash != old_hash
+    index.close()
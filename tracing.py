@@ -0,0 +1,256 @@
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from context_packer import CHARS_PER_TOKEN
+from rotating_log import RotatingLog
+
+# Phases of a generation request, in pipeline order. "total" is reported alongside them.
+PHASES = ("prompt", "queue", "connect", "first_byte", "generation", "parse", "apply", "editor", "tree_refresh")
+PHASE_LABELS = {
+    "prompt": "Prompt", "queue": "Queue", "connect": "Connect", "first_byte": "First byte",
+    "generation": "Generation", "parse": "Parse", "apply": "Disk writes", "editor": "Editor",
+    "tree_refresh": "Tree refresh", "total": "Total",
+}
+SAMPLE_WINDOW = 1000  # Recent requests per endpoint and model that percentiles are taken over
+METRIC_PREFIX = "blackboxai"
+
+
+class Trace:
+    # Timing spans of one request, from send_command until its reply is on disk. A span that
+    # encloses other spans is recorded without their time, so phase totals never overlap.
+    def __init__(self, trace_id, endpoint, model, stream=False):
+        self.trace_id = trace_id
+        self.endpoint = endpoint
+        self.model = model
+        self.stream = stream
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.spans = []  # (phase, start, duration), in seconds from the start of the trace
+        self.nested = []
+        self.prompt_chars = 0
+        self.reply_chars = 0
+        self.usage = None
+        self.streamed = False
+        self.status = None
+        self.error = None
+        self.total = None
+
+    @contextmanager
+    def span(self, phase):
+        started = time.perf_counter()
+        self.nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            inner = self.nested.pop()
+            if self.nested:
+                self.nested[-1] += elapsed
+            self.add_span(phase, started, elapsed - inner)
+
+    def add_span(self, phase, start, duration):
+        # start is a time.perf_counter() value
+        self.spans.append((phase, start - self.origin, max(0.0, duration)))
+
+    def record_request(self, timings):
+        # timings: the perf_counter() timestamps a CompletionJob reports. The first byte is the
+        # first streamed text when there is any, otherwise the response headers.
+        self.add_span("queue", timings['submitted'], timings['started'] - timings['submitted'])
+        if 'headers' in timings:
+            connected = timings['started'] + timings['connect']
+            first_byte = timings.get('first_text', timings['headers'])
+            self.add_span("connect", timings['started'], timings['connect'])
+            self.add_span("first_byte", connected, first_byte - connected)
+            self.add_span("generation", first_byte, timings['finished'] - first_byte)
+        self.streamed = 'first_text' in timings
+        self.usage = timings.get('usage')
+
+    def phase(self, phase):
+        # A streamed reply is applied file by file, so a phase can have several spans
+        return sum(duration for name, start, duration in self.spans if name == phase)
+
+    def phases(self):
+        recorded = {name for name, start, duration in self.spans}
+        return {phase: self.phase(phase) for phase in PHASES if phase in recorded}
+
+    def tokens(self):
+        # (prompt tokens, completion tokens, whether they are estimates). The API's usage is
+        # used when the reply had one; otherwise both are estimated from the text lengths.
+        usage = self.usage or {}
+        if 'prompt_tokens' in usage and 'completion_tokens' in usage:
+            return usage['prompt_tokens'], usage['completion_tokens'], False
+        return -(-self.prompt_chars // CHARS_PER_TOKEN), -(-self.reply_chars // CHARS_PER_TOKEN), True
+
+    def tokens_per_second(self):
+        # A buffered reply arrives all at once, so its generation time starts with the request
+        seconds = self.phase("generation")
+        if not self.streamed:
+            seconds += self.phase("first_byte")
+        tokens = self.tokens()[1]
+        return tokens / seconds if seconds > 0 and tokens else None
+
+    def finish(self, status, error=None):
+        self.total = time.perf_counter() - self.origin
+        self.status = status
+        self.error = error
+
+    def to_dict(self):
+        prompt_tokens, completion_tokens, estimated = self.tokens()
+        return {
+            'trace_id': self.trace_id,
+            'started_at': self.started_at,
+            'endpoint': self.endpoint,
+            'model': self.model,
+            'stream': self.stream,
+            'status': self.status,
+            'error': self.error,
+            'total': self.total,
+            'phases': self.phases(),
+            'spans': [{'phase': name, 'start': start, 'duration': duration} for name, start, duration in self.spans],
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'tokens_estimated': estimated,
+            'tokens_per_second': self.tokens_per_second(),
+        }
+
+
+def format_trace(trace):
+    parts = [f"{PHASE_LABELS[phase].lower()} {seconds * 1000:.0f} ms" for phase, seconds in trace['phases'].items()]
+    tokens = f"{trace['prompt_tokens']} -> {trace['completion_tokens']} tokens"
+    if trace['tokens_estimated']:
+        tokens = f"~{tokens}"
+    if trace['tokens_per_second']:
+        tokens += f", {trace['tokens_per_second']:.1f} tokens/s"
+    return f"{trace['total'] * 1000:.0f} ms ({', '.join(parts)}); {tokens}"
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def labels(**values):
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in values.items()) + "}"
+
+
+class Tracer:
+    # Collects finished traces. Each one is appended to a JSONL trace file, the recent ones are
+    # kept for the metrics panel, and per endpoint and model the last SAMPLE_WINDOW durations
+    # of every phase feed p50/p95 summaries, written as a Prometheus textfile (the format the
+    # node_exporter textfile collector reads).
+    def __init__(self, trace_path=None, metrics_path=None, max_bytes=5 * 1024 * 1024, backups=2, recent=200):
+        self.trace_log = RotatingLog(trace_path, max_bytes, backups) if trace_path else None
+        self.metrics_path = metrics_path
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=recent)
+        self.samples = defaultdict(lambda: deque(maxlen=SAMPLE_WINDOW))  # (endpoint, model, phase) -> seconds
+        self.sums = defaultdict(float)  # (endpoint, model, phase) -> seconds since startup
+        self.counts = defaultdict(int)  # (endpoint, model, phase) -> spans since startup
+        self.requests = defaultdict(int)  # (endpoint, model, status) -> requests
+        self.tokens = defaultdict(int)  # (endpoint, model, kind) -> tokens
+        self.session = uuid.uuid4().hex[:8]
+        self.trace_ids = itertools.count(1)
+
+    def start(self, endpoint, model, stream=False):
+        return Trace(f"{self.session}-{next(self.trace_ids)}", endpoint, model, stream)
+
+    def record(self, trace):
+        # Returns the trace as a dict, as it was written to the trace file
+        data = trace.to_dict()
+        series = (trace.endpoint, trace.model)
+        with self.lock:
+            self.recent.append(data)
+            self.requests[series + (trace.status,)] += 1
+            if trace.status == "ok":
+                measured = dict(data['phases'], total=data['total'])
+                if data['tokens_per_second']:
+                    measured['tokens_per_second'] = data['tokens_per_second']
+                for phase, value in measured.items():
+                    self.samples[series + (phase,)].append(value)
+                    self.sums[series + (phase,)] += value
+                    self.counts[series + (phase,)] += 1
+                self.tokens[series + ("prompt",)] += data['prompt_tokens']
+                self.tokens[series + ("completion",)] += data['completion_tokens']
+        if self.trace_log is not None:
+            self.trace_log.write(json.dumps(data) + "\n")
+        if self.metrics_path:
+            self.write_metrics(self.metrics_path)
+        return data
+
+    def recent_traces(self):
+        with self.lock:
+            return list(self.recent)
+
+    def summary(self):
+        # [(endpoint, model, phase, requests in the window, p50, p95)], phases in pipeline order
+        order = {phase: index for index, phase in enumerate(PHASES + ("total", "tokens_per_second"))}
+        with self.lock:
+            rows = [
+                (endpoint, model, phase, len(values), percentile(values, 0.5), percentile(values, 0.95))
+                for (endpoint, model, phase), values in self.samples.items()
+            ]
+        return sorted(rows, key=lambda row: (row[0], row[1], order[row[2]]))
+
+    def prometheus_text(self):
+        with self.lock:
+            samples = {key: list(values) for key, values in self.samples.items()}
+            sums = dict(self.sums)
+            counts = dict(self.counts)
+            requests = dict(self.requests)
+            tokens = dict(self.tokens)
+        lines = [
+            f"# HELP {METRIC_PREFIX}_request_phase_seconds Time spent in each phase of a generation request.",
+            f"# TYPE {METRIC_PREFIX}_request_phase_seconds summary",
+        ]
+        throughput = [
+            f"# HELP {METRIC_PREFIX}_completion_tokens_per_second Completion tokens per second of generation.",
+            f"# TYPE {METRIC_PREFIX}_completion_tokens_per_second summary",
+        ]
+        for (endpoint, model, phase), values in sorted(samples.items()):
+            if phase == "tokens_per_second":
+                name, target, series = f"{METRIC_PREFIX}_completion_tokens_per_second", throughput, {}
+            else:
+                name, target, series = f"{METRIC_PREFIX}_request_phase_seconds", lines, {'phase': phase}
+            for quantile in (0.5, 0.95):
+                target.append(f"{name}{labels(endpoint=endpoint, model=model, **series, quantile=quantile)} "
+                              f"{percentile(values, quantile):.6f}")
+            key = (endpoint, model, phase)
+            target.append(f"{name}_sum{labels(endpoint=endpoint, model=model, **series)} {sums[key]:.6f}")
+            target.append(f"{name}_count{labels(endpoint=endpoint, model=model, **series)} {counts[key]}")
+        lines.extend(throughput)
+        lines.append(f"# HELP {METRIC_PREFIX}_requests_total Generation requests by outcome.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_requests_total counter")
+        for (endpoint, model, status), count in sorted(requests.items()):
+            lines.append(f"{METRIC_PREFIX}_requests_total{labels(endpoint=endpoint, model=model, status=status)} {count}")
+        lines.append(f"# HELP {METRIC_PREFIX}_tokens_total Tokens of successful requests.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_tokens_total counter")
+        for (endpoint, model, kind), count in sorted(tokens.items()):
+            lines.append(f"{METRIC_PREFIX}_tokens_total{labels(endpoint=endpoint, model=model, kind=kind)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path):
+        # Through a temp file, so a collector never reads a half-written file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def export(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for data in self.recent_traces():
+                f.write(json.dumps(data) + "\n")
+
+    def close(self):
+        if self.trace_log is not None:
+            self.trace_log.close()
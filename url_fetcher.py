@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_DELAY = 60  # Seconds before a failed URL is fetched again on its own
+
+# Elements whose text is never readable content
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "head"}
+# Elements that start a new line in the extracted text
+BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "tr", "table", "section", "article", "header", "footer",
+    "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "title", "dt", "dd", "hr",
+}
+
+
+class TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipping = 0
+        self.title = ""
+        self.in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self.in_title = True
+        elif tag in SKIPPED_TAGS:
+            self.skipping += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self.in_title = False
+        elif tag in SKIPPED_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title += data
+        elif not self.skipping:
+            self.parts.append(data)
+
+
+def extract_text(html):
+    # Readable text of an HTML page: scripts, styles and markup dropped, whitespace collapsed
+    parser = TextExtractor()
+    parser.feed(html)
+    parser.close()
+    lines = (re.sub(r"[ \t\r\f\v]+", " ", line).strip() for line in "".join(parser.parts).split("\n"))
+    text = "\n".join(line for line in lines if line)
+    title = " ".join(parser.title.split())
+    return f"{title}\n\n{text}" if title else text
+
+
+class UrlFetcher:
+    # Downloads URL references on a bounded pool of worker threads and keeps their extracted
+    # text in an on-disk cache, one JSON file per URL. Entries older than max_age are
+    # revalidated with If-None-Match / If-Modified-Since, so unchanged pages cost a 304.
+    def __init__(self, directory, max_workers=4, timeout=20, max_bytes=2 * 1024 * 1024, max_age=3600):
+        self.directory = directory
+        self.timeout = (min(timeout, 10), timeout)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.pending = {}
+        self.failed_at = {}
+        self.pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="url-fetch")
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "blackboxai-code-editor/1.0"
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode('utf-8')).hexdigest() + ".json")
+
+    def entry(self, url):
+        # Cached entry, read from disk on first use; None if the URL was never fetched
+        with self.lock:
+            if url in self.entries:
+                return self.entries[url]
+        try:
+            with open(self.path_for(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        with self.lock:
+            return self.entries.setdefault(url, entry)
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry.get('fetched_at', 0) <= self.max_age
+
+    def fetch(self, url, on_done=None):
+        # Starts a background fetch unless the cached entry is still fresh or a fetch for the URL
+        # is already running. on_done(url, entry, error) is called on the worker thread.
+        with self.lock:
+            future = self.pending.get(url)
+            started = future is None
+            if started:
+                future = self.pool.submit(self.download, url)
+                self.pending[url] = future
+        # Callbacks of a future that is already done run right away, so never under the lock
+        if started:
+            future.add_done_callback(lambda done: self.forget(url, done))
+        if on_done is not None:
+            future.add_done_callback(lambda done: on_done(url, *self.outcome(done)))
+        return future
+
+    def fetch_all(self, urls, on_done=None):
+        return [self.fetch(url, on_done) for url in urls]
+
+    @staticmethod
+    def outcome(future):
+        if future.cancelled():
+            return None, "cancelled"
+        error = future.exception()
+        return (None, str(error)) if error else (future.result(), None)
+
+    def forget(self, url, future):
+        with self.lock:
+            self.pending.pop(url, None)
+            if future.cancelled() or future.exception() is not None:
+                self.failed_at[url] = time.time()
+            else:
+                self.failed_at.pop(url, None)
+
+    def needs_fetch(self, url):
+        # Whether the URL is missing or stale, and not being fetched or recently failed
+        with self.lock:
+            if url in self.pending or time.time() - self.failed_at.get(url, 0) < RETRY_DELAY:
+                return False
+        return not self.is_fresh(self.entry(url))
+
+    def download(self, url):
+        # Returns the entry plus 'elapsed', the download time (None when the cache was fresh)
+        cached = self.entry(url)
+        if self.is_fresh(cached):
+            return dict(cached, elapsed=None)
+
+        headers = {}
+        if cached is not None:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        started = time.perf_counter()
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and cached is not None:
+                entry = dict(cached, fetched_at=time.time(), revalidated=True)
+            else:
+                response.raise_for_status()
+                body = bytearray()
+                for chunk in response.iter_content(chunk_size=65536):
+                    body.extend(chunk)
+                    if len(body) >= self.max_bytes:
+                        del body[self.max_bytes:]
+                        break
+                content_type = response.headers.get('Content-Type', "")
+                entry = {
+                    'url': url,
+                    'content_type': content_type,
+                    # Without a declared charset, requests assumes ISO-8859-1 for text; UTF-8 is likelier
+                    'text': self.decode(body, content_type, response.encoding if "charset=" in content_type.lower() else None),
+                    'bytes': len(body),
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'fetched_at': time.time(),
+                    'revalidated': False,
+                }
+        self.store(url, entry)
+        return dict(entry, elapsed=time.perf_counter() - started)
+
+    @staticmethod
+    def decode(body, content_type, encoding):
+        media_type = content_type.split(";", 1)[0].strip().lower()
+        if media_type and not (media_type.startswith("text/") or media_type.endswith(("json", "xml", "javascript"))):
+            return None  # Binary content has no text excerpt
+        text = bytes(body).decode(encoding or 'utf-8', errors='replace')
+        if media_type in ("text/html", "application/xhtml+xml") or (not media_type and "<html" in text[:1000].lower()):
+            return extract_text(text)
+        return text
+
+    def store(self, url, entry):
+        with self.lock:
+            self.entries[url] = entry
+        temp_path = f"{self.path_for(url)}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(temp_path, self.path_for(url))
+
+    def excerpt(self, url, max_chars):
+        # Cached text of the URL cut to max_chars, or None if it has not been fetched
+        entry = self.entry(url)
+        if entry is None or not entry.get('text'):
+            return None
+        text = entry['text']
+        if len(text) > max_chars:
+            text = text[:text.rfind("\n", 0, max_chars) + 1 or max_chars] + "... (truncated)"
+        return text
+
+    def is_pending(self, url):
+        with self.lock:
+            return url in self.pending
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
@@ -0,0 +1,76 @@
+import base64
+import json
+import os
+import threading
+import zlib
+
+WORKFLOW_VERSION = 2
+UNCHANGED = object()  # Section value meaning "keep what the previous write stored"
+
+# Version 1 files are plain JSON with every value inline: the full text of each open tab
+# under 'content' and the terminal output as one string. Version 2 adds a 'version' field,
+# stores file-backed tabs as path + content hash (content only for unsaved buffers) and
+# compresses the terminal output.
+
+
+def encode_text(text):
+    data = base64.b64encode(zlib.compress(text.encode('utf-8'))).decode('ascii')
+    return {'encoding': 'zlib+base64', 'data': data}
+
+
+def decode_text(value):
+    # Accepts both the plain strings of version 1 files and encoded version 2 values
+    if isinstance(value, dict) and value.get('encoding') == 'zlib+base64':
+        return zlib.decompress(base64.b64decode(value['data'])).decode('utf-8')
+    return value or ""
+
+
+def read_workflow(path):
+    # Parsed workflow with encoded values decoded; safe to run on a worker thread
+    with open(path, 'r', encoding='utf-8') as f:
+        workflow = json.load(f)
+    workflow['terminal_output'] = decode_text(workflow.get('terminal_output'))
+    return workflow
+
+
+class WorkflowWriter:
+    # Writes a workflow file section by section (a section is a top-level key). Each section
+    # is encoded only when its change marker differs from the last write, and the file is left
+    # alone when nothing changed. Writes go through a temp file, so a crash mid-write never
+    # leaves a truncated workflow behind.
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.encoded = {}  # section -> (change marker, encoded JSON text)
+
+    def is_current(self, name, marker):
+        with self.lock:
+            cached = self.encoded.get(name)
+            return cached is not None and cached[0] == marker
+
+    def write(self, sections):
+        # sections: {name: (change marker, value)}. With a marker of None the section is
+        # encoded and compared by its JSON text. A value of UNCHANGED keeps the section from
+        # the previous write, so callers can skip gathering data whose marker did not change.
+        # Returns whether the file was written.
+        with self.lock:
+            changed = not os.path.exists(self.path)
+            for name, (marker, value) in sections.items():
+                cached = self.encoded.get(name)
+                if cached is not None and (value is UNCHANGED or (marker is not None and cached[0] == marker)):
+                    continue
+                if name == 'terminal_output':
+                    value = encode_text(value)
+                encoded = json.dumps(value)
+                if cached is None or cached[1] != encoded:
+                    self.encoded[name] = (marker, encoded)
+                    changed = True
+            if not changed:
+                return False
+
+            body = ", ".join(f"{json.dumps(name)}: {self.encoded[name][1]}" for name in sections if name in self.encoded)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(f'{{"version": {WORKFLOW_VERSION}, {body}}}')
+            os.replace(temp_path, self.path)
+            return True
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+INDEX_DIR = ".workspace_index"
+
+# Directories that are never indexed, shown to the model or watched
+IGNORED_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", "env",
+    ".mypy_cache", ".pytest_cache", ".ruff_cache", ".tox", ".nox", ".idea", ".vscode",
+    ".response_cache", INDEX_DIR,
+}
+
+
+def join_path(parent, name):
+    return f"{parent}/{name}" if parent else name
+
+
+def parent_path(path):
+    return path.rpartition("/")[0]
+
+
+def file_record(path, stat):
+    # Content hash and line count, read in blocks so large files are not loaded at once
+    digest = hashlib.sha1()
+    lines = 0
+    last_byte = b"\n"
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+            lines += block.count(b"\n")
+            last_byte = block[-1:]
+    if last_byte != b"\n":
+        lines += 1
+    return (stat.st_size, stat.st_mtime_ns, digest.hexdigest(), lines)
+
+
+class WorkspaceIndex:
+    # Path, size, mtime, content hash and line count of every workspace file, kept in SQLite
+    # under .workspace_index. Paths are relative with "/" separators. Updates are incremental:
+    # only files whose size or mtime changed are hashed again. Safe to use from worker threads.
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        index_dir = os.path.join(self.root, INDEX_DIR)
+        os.makedirs(index_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(index_dir, "index.sqlite3"), check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, parent TEXT, "
+                "size INTEGER, mtime_ns INTEGER, hash TEXT, lines INTEGER)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS files_parent ON files (parent)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def is_built(self):
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM meta WHERE key = 'built'").fetchone() is not None
+
+    def files(self):
+        # [(path, size, mtime_ns, hash, lines)] ordered by path
+        with self.lock:
+            return self.db.execute("SELECT path, size, mtime_ns, hash, lines FROM files ORDER BY path").fetchall()
+
+    def directories(self):
+        with self.lock:
+            return [row[0] for row in self.db.execute("SELECT path FROM dirs ORDER BY path")]
+
+    def lookup(self, path):
+        with self.lock:
+            return self.db.execute(
+                "SELECT path, size, mtime_ns, hash, lines FROM files WHERE path = ?", (self.relative(path),)
+            ).fetchone()
+
+    def relative(self, path):
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.root)
+        path = os.path.normpath(path).replace(os.sep, "/")
+        return "" if path == "." else path
+
+    def walk(self, rel_dir):
+        # Stats every file below rel_dir, skipping ignored directories
+        files = {}
+        dirs = {rel_dir}
+        pending = [rel_dir]
+        while pending:
+            current = pending.pop()
+            try:
+                entries = list(os.scandir(os.path.join(self.root, current)))
+            except OSError:
+                continue
+            for entry in entries:
+                rel_path = join_path(current, entry.name)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in IGNORED_DIRS:
+                            dirs.add(rel_path)
+                            pending.append(rel_path)
+                    elif entry.is_file(follow_symlinks=False):
+                        files[rel_path] = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+        return files, dirs
+
+    def refresh(self):
+        # Full reconcile with the disk; returns the number of changed entries
+        files, dirs = self.walk("")
+        with self.lock:
+            known_files = {path: (size, mtime_ns) for path, size, mtime_ns
+                           in self.db.execute("SELECT path, size, mtime_ns FROM files")}
+            known_dirs = {path for (path,) in self.db.execute("SELECT path FROM dirs")}
+        return self.apply(files, dirs, known_files, known_dirs, built=True)
+
+    def refresh_directory(self, rel_dir):
+        # Reconcile the direct children of one directory; new subdirectories are walked whole
+        rel_dir = self.relative(rel_dir)
+        full_path = os.path.join(self.root, rel_dir)
+        if not os.path.isdir(full_path):
+            with self.lock:
+                known_dirs = {rel_dir} if self.db.execute(
+                    "SELECT 1 FROM dirs WHERE path = ?", (rel_dir,)).fetchone() else set()
+            return self.apply({}, set(), {}, known_dirs)
+
+        files = {}
+        dirs = {rel_dir}
+        try:
+            entries = list(os.scandir(full_path))
+        except OSError:
+            return 0
+        for entry in entries:
+            rel_path = join_path(rel_dir, entry.name)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in IGNORED_DIRS:
+                        dirs.add(rel_path)
+                elif entry.is_file(follow_symlinks=False):
+                    files[rel_path] = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+
+        with self.lock:
+            known_files = {path: (size, mtime_ns) for path, size, mtime_ns in self.db.execute(
+                "SELECT path, size, mtime_ns FROM files WHERE parent = ?", (rel_dir,))}
+            known_dirs = {path for (path,) in self.db.execute(
+                "SELECT path FROM dirs WHERE parent = ? OR path = ?", (rel_dir, rel_dir))}
+
+        for new_dir in dirs - known_dirs:
+            if new_dir != rel_dir:
+                sub_files, sub_dirs = self.walk(new_dir)
+                files.update(sub_files)
+                dirs.update(sub_dirs)
+        return self.apply(files, dirs, known_files, known_dirs)
+
+    def apply(self, files, dirs, known_files, known_dirs, built=False):
+        changes = []
+        for rel_path, stat in files.items():
+            if known_files.get(rel_path) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            try:
+                record = file_record(os.path.join(self.root, rel_path), stat)
+            except OSError:
+                continue
+            changes.append((rel_path, parent_path(rel_path)) + record)
+        removed_files = [(path,) for path in known_files if path not in files]
+        removed_dirs = [path for path in known_dirs if path not in dirs]
+        added_dirs = [(path, parent_path(path)) for path in dirs if path not in known_dirs]
+
+        with self.lock, self.db:
+            self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", changes)
+            self.db.executemany("DELETE FROM files WHERE path = ?", removed_files)
+            for path in removed_dirs:
+                # A vanished directory takes its whole subtree with it
+                prefix = self.like_prefix(path)
+                self.db.execute("DELETE FROM dirs WHERE path = ? OR path LIKE ? ESCAPE '\\'", (path, prefix))
+                self.db.execute("DELETE FROM files WHERE path LIKE ? ESCAPE '\\'", (prefix,))
+            self.db.executemany("INSERT OR IGNORE INTO dirs VALUES (?, ?)", added_dirs)
+            if built:
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('built', '1')")
+        return len(changes) + len(removed_files) + len(removed_dirs) + len(added_dirs)
+
+    @staticmethod
+    def like_prefix(rel_dir):
+        escaped = rel_dir.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return f"{escaped}/%"
+
+    def update_paths(self, paths):
+        # Re-index the directories that contain (or are) the given paths after they changed on disk
+        directories = set()
+        for path in paths:
+            rel_path = self.relative(path)
+            if os.path.isdir(os.path.join(self.root, rel_path)):
+                directories.add(rel_path)
+            else:
+                directories.add(parent_path(rel_path))
+        return sum(self.refresh_directory(rel_dir) for rel_dir in sorted(directories))
+
+    def close(self):
+        with self.lock:
+            self.db.close()